@@ -0,0 +1,171 @@
+"""
+Benchmarks for the scrape -> transform -> upload path, using synthetic the-cocktail-db payloads.
+
+For each payload size, the following are timed, with throughput in records/s and peak memory from tracemalloc:
+- parse: json.loads of the whole payload, and streaming with iter_json_records
+- transform: RecordManager.iter_transformed_records
+- batch: RecordManager.get_record_batches and get_batch_item_group
+- upload: RecordManager.execute against a moto DynamoDB table
+- orchestrator: Orchestrator.execute end to end, with SSM and DynamoDB in moto and the api served by a local HTTP stub
+
+Run from the src directory e.g.
+python -m benchmarks.bench_pipeline --sizes 1000 10000 100000 --upload-max-records 100000 --json bench_output.json
+"""
+import io
+import os
+import time
+import argparse
+import threading
+import tracemalloc
+from contextlib import redirect_stdout
+import simplejson as json
+from moto import mock_aws
+from copy import deepcopy
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from modules.utils.json_stream import iter_json_records
+from modules.utils.http_session import reset_http_session
+from modules.utils.ssm_config_cache import reset_ssm_config_cache
+from modules.utils.aws_clients import get_aws_client, get_aws_resource, reset_aws_clients
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from benchmarks.synthetic_payloads import get_synthetic_api_records, get_synthetic_payload, get_synthetic_payloads_by_letter
+
+APP = "fruit-project-api-scraper"
+TARGET_API = "the-cocktail-db"
+REGION = "eu-west-2"
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_UPLOAD_MAX_RECORDS = 10000
+STREAM_CHUNK_SIZE = 65536
+
+
+def measure(function, memory=True):
+  """
+  Times function, then runs it again under tracemalloc if memory is set, as tracing slows it down.
+  -> tuple : (seconds, peak bytes or None)
+  """
+  start = time.perf_counter()
+  function()
+  seconds = time.perf_counter() - start
+  if not memory:
+    return seconds, None
+  tracemalloc.start()
+  function()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return seconds, peak
+
+
+class LetterAPIHandler(BaseHTTPRequestHandler):
+  """
+  Serves server.payloads_by_letter for <endpoint>?f=<letter>
+  """
+  def do_GET(self):
+    letter = parse_qs(urlsplit(self.path).query).get("f", [""])[0]
+    body = self.server.payloads_by_letter.get(letter, self.server.empty_payload)
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class PipelineBenchmark:
+  def __init__(self, sizes, memory, upload_max_records):
+    self.sizes = sizes
+    self.memory = memory
+    self.upload_max_records = upload_max_records
+    self.ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API])
+    self.results = []
+
+  def execute(self):
+    os.environ.setdefault("AWS_DEFAULT_REGION", REGION)
+    for size in self.sizes:
+      api_records = get_synthetic_api_records(TARGET_API, size)
+      payload = get_synthetic_payload(TARGET_API, api_records)
+      print(f"\n{TARGET_API}: {size} records, payload {len(payload) / 1e6:.1f} MB")
+      self.run_stage("parse (json.loads)", size, lambda: json.loads(payload))
+      self.run_stage("parse (streaming)", size, lambda: sum(1 for _ in iter_json_records(self.iter_chunks(payload), self.ssm_value_dict["source_api_records_key"])))
+      record_manager = RecordManager([], self.ssm_value_dict)
+      self.run_stage("transform", size, lambda: sum(1 for _ in record_manager.iter_transformed_records(api_records)))
+      transformed_records = list(record_manager.iter_transformed_records(api_records))
+      self.run_stage("batch", size, lambda: sum(1 for record_batch in record_manager.get_record_batches(transformed_records, RecordManager.dynamo_db_batch_size)
+                                                for _ in record_manager.get_batch_item_group(record_batch)))
+      if size > self.upload_max_records:
+        print(f"Skipping upload and orchestrator for more than {self.upload_max_records} records")
+        continue
+      self.run_stage("upload (moto)", size, lambda: self.upload_records(api_records))
+      self.run_stage("orchestrator (moto + http stub)", size, lambda: self.execute_orchestrator(api_records))
+    return self.results
+
+  def run_stage(self, stage, size, function):
+    """
+    Output printed by the modules is discarded while the stage runs
+    """
+    with redirect_stdout(io.StringIO()):
+      seconds, peak = measure(function, self.memory)
+    result = {"stage": stage, "records": size, "seconds": round(seconds, 4),
+              "records_per_second": round(size / seconds), "peak_memory_mb": round(peak / 1e6, 2) if peak is not None else None}
+    self.results.append(result)
+    peak_memory = f"{result['peak_memory_mb']:10.2f} MB peak" if peak is not None else ""
+    print(f"{stage:>32}: {seconds:8.3f} s {result['records_per_second']:12,} records/s {peak_memory}")
+
+  def iter_chunks(self, payload):
+    for i in range(0, len(payload), STREAM_CHUNK_SIZE):
+      yield payload[i:i + STREAM_CHUNK_SIZE]
+
+  def create_table(self):
+    get_aws_resource("dynamodb").create_table(TableName=self.ssm_value_dict["dynamo_db_config"]["table"],
+                                              KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                                              AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                                              BillingMode="PAY_PER_REQUEST")
+
+  def upload_records(self, api_records):
+    with mock_aws():
+      reset_aws_clients()
+      self.create_table()
+      RecordManager(api_records, self.ssm_value_dict).execute()
+      reset_aws_clients()
+
+  def execute_orchestrator(self, api_records):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LetterAPIHandler)
+    server.payloads_by_letter = get_synthetic_payloads_by_letter(TARGET_API, api_records)
+    server.empty_payload = get_synthetic_payload(TARGET_API, [])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ssm_value_dict = dict(self.ssm_value_dict, source_api_endpoint=f"http://127.0.0.1:{server.server_port}/api/json/v1/1/search.php")
+    try:
+      with mock_aws():
+        reset_aws_clients()
+        reset_http_session()
+        reset_ssm_config_cache()
+        get_aws_client("ssm").put_parameter(Name=f"{APP}--{TARGET_API}-config", Value=json.dumps(ssm_value_dict), Type="String")
+        self.create_table()
+        Orchestrator(APP, TARGET_API).execute()
+        reset_aws_clients()
+    finally:
+      server.shutdown()
+      server.server_close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+  parser.add_argument("--upload-max-records", type=int, default=DEFAULT_UPLOAD_MAX_RECORDS,
+                      help="Larger sizes skip the upload and orchestrator stages, which are slow against moto")
+  parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass for peak memory")
+  parser.add_argument("--json", help="Path to write results to as JSON, to compare between branches")
+  args = parser.parse_args()
+
+  results = PipelineBenchmark(args.sizes, not args.no_memory, args.upload_max_records).execute()
+  if args.json:
+    with open(args.json, "w") as results_file:
+      json.dump(results, results_file, indent=2)
+
+if __name__ == "__main__":
+  main()
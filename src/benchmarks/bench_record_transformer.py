@@ -0,0 +1,63 @@
+"""
+Microbenchmark comparing the compiled record transformer with the remove / rename / ingredients doc
+stages it replaced in RecordManager, for the-cocktail-db sample records. Memory held per transformed record
+is compared too, for the item dicts made by the stages and the CompactRecords made by the compiled transformer.
+
+Run from the src directory: python -m benchmarks.bench_record_transformer --records 10000
+"""
+import timeit
+import argparse
+import tracemalloc
+
+from modules.record_manager import RecordManager
+from modules.utils.record_transformer import compile_record_transformer
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from benchmarks.synthetic_payloads import get_synthetic_api_records
+
+TARGET_API = "the-cocktail-db"
+
+def transform_with_stages(record_manager, api_records, ssm_value_dict):
+  field_mapping = ssm_value_dict["field_mapping"]
+  keys_to_remove = record_manager.get_keys_to_remove(api_records[0], field_mapping)
+  ingredient_max_count = ssm_value_dict["custom_field_info"]["ingredient_max_count"]
+  transformed_records = []
+  for api_record in api_records:
+    api_record = record_manager.remove_record_fields_not_needed(dict(api_record), keys_to_remove)
+    api_record = record_manager.rename_record_fields(api_record, field_mapping)
+    transformed_records.append(record_manager.prepare_record_ingredients_doc(api_record, ingredient_max_count))
+  return transformed_records
+
+def transform_with_compiled_transformer(record_manager, api_records, ssm_value_dict):
+  transform_record = compile_record_transformer(ssm_value_dict["field_mapping"], ssm_value_dict["custom_field_info"], record_manager.timestamp)
+  return [transform_record(dict(api_record)) for api_record in api_records]
+
+def get_bytes_per_record(transform, record_manager, api_records, ssm_value_dict):
+  """
+  -> float : bytes still allocated per record once api_records have been transformed, leaving out the api_records
+  """
+  tracemalloc.start()
+  transformed_records = transform(record_manager, api_records, ssm_value_dict)
+  allocated_bytes, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return allocated_bytes / len(transformed_records)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--records", type=int, default=10000)
+  parser.add_argument("--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  ssm_value_dict = sample_ssm_value_dicts[TARGET_API]
+  record_manager = RecordManager([], ssm_value_dict)
+  api_records = get_synthetic_api_records(TARGET_API, args.records)
+  print(f"{TARGET_API}: {args.records} records with {len(ssm_value_dict['field_mapping'])} mapped fields, best of {args.repeat}")
+  results = {}
+  for name, transform in [("stages", transform_with_stages), ("compiled", transform_with_compiled_transformer)]:
+    seconds = min(timeit.repeat(lambda: transform(record_manager, api_records, ssm_value_dict), number=1, repeat=args.repeat))
+    results[name] = seconds
+    bytes_per_record = get_bytes_per_record(transform, record_manager, api_records, ssm_value_dict)
+    print(f"{name:>10}: {seconds * 1e6 / args.records:8.2f} us/record  {args.records / seconds:12,.0f} records/s  {bytes_per_record:8,.0f} bytes/record")
+  print(f"   speedup: {results['stages'] / results['compiled']:.2f}x")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,49 @@
+"""
+Synthetic api records in the shape of test_sample_records.sample_api_records, for benchmarks.
+Hash keys are made unique, and names start with a letter of the alphabet in turn, so that records
+can be split by letter for the alphabetical scraping rule.
+"""
+import simplejson as json
+from copy import deepcopy
+from string import ascii_lowercase as alphabet
+
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from test_sample_records.sample_api_records import sample_api_response_dicts
+
+SYNTHETIC_RECORD_FIELDS = {"fruity-vice": ("id", "name"),
+                           "the-cocktail-db": ("idDrink", "strDrink")}
+
+def get_sample_api_records(target_api):
+  api_records = sample_api_response_dicts[target_api]
+  return api_records["drinks"] if isinstance(api_records, dict) else api_records
+
+def get_synthetic_api_records(target_api, record_count):
+  """
+  -> list : record_count api_records, copied from the sample records for target_api
+  """
+  id_field, name_field = SYNTHETIC_RECORD_FIELDS[target_api]
+  sample_api_records = get_sample_api_records(target_api)
+  api_records = []
+  for i in range(record_count):
+    api_record = deepcopy(sample_api_records[i % len(sample_api_records)])
+    api_record[id_field] = str(i) if isinstance(api_record[id_field], str) else i
+    api_record[name_field] = f"{alphabet[i % len(alphabet)]}-{api_record[name_field]}-{i}"
+    api_records.append(api_record)
+  return api_records
+
+def get_synthetic_payload(target_api, api_records):
+  """
+  -> bytes : JSON response body, with api_records under the source_api_records_key for target_api, if it has one
+  """
+  records_key = sample_ssm_value_dicts[target_api]["source_api_records_key"]
+  if records_key:
+    return json.dumps({records_key: api_records}).encode("utf-8")
+  return json.dumps(api_records).encode("utf-8")
+
+def get_synthetic_payloads_by_letter(target_api, api_records):
+  """
+  -> dict : Letters mapped to JSON response bodies, with the api_records whose name starts with the letter
+  """
+  _, name_field = SYNTHETIC_RECORD_FIELDS[target_api]
+  return {letter: get_synthetic_payload(target_api, [api_record for api_record in api_records if api_record[name_field].startswith(letter)])
+          for letter in alphabet}
@@ -1,17 +1,60 @@
 import logging
-from modules.orchestrator import Orchestrator
+from modules.orchestrator import Orchestrator, MultiSourceOrchestrator
+from modules.utils.ssm_config_cache import DEFAULT_CONFIG_CACHE_TTL
+from modules.utils.snapshot import DEFAULT_SNAPSHOT_DIR
 
 # testing locally
 
 # event = {"app": "fruit-project-api-scraper",
 #          "sourceApiName": "fruity-vice"}
+#
+# "sourceApiNames" can be used instead of "sourceApiName", so that several apis are scraped at the same time
+# in one invocation e.g. "sourceApiNames": ["fruity-vice", "the-cocktail-db", "the-meal-db"]
+#
+# "maxWorkers" can optionally be added, so that letters are scraped concurrently
+# for apis with an alphabetical scraping rule e.g. "maxWorkers": 4
+#
+# "shard" can be set to scrape a share of the letters for apis with an alphabetical scraping rule, so that
+# letters can be split across several invocations e.g. "shard": "3/8" or "shard": "a-f". See shard_planner.
+#
+# ssm parameters for every api in APIMapping are cached for "configCacheTtl" seconds (300 by default)
+# across warm invocations. "configVersion" can be set to refetch the parameter if the cached version is older.
+#
+# Metrics are logged for each letter and for each run as JSON lines. "metricsFormat" can be set to "emf", so that
+# CloudWatch picks them up as metrics from the logs, or to "none". See metrics.
+#
+# "engine" can be set to "asyncio", so that letters are scraped as tasks on an event loop with aiohttp, rather than
+# in a pool of "maxWorkers" threads e.g. "engine": "asyncio". See async_engine.
+#
+# "snapshotMode" can be set to "record", so that records scraped for each letter are written to gzipped JSON Lines
+# files under "snapshotDir" (/tmp/snapshots by default), or to "replay", so that records are read from those files
+# rather than the source api e.g. "snapshotMode": "replay", "snapshotDir": "/mnt/snapshots". See snapshot.
 
 def main(event, context):
+  """
+  -> dict : source api names mapped to a summary of records uploaded
+  """
   try:
     app = event["app"]
+    max_workers = event.get('maxWorkers', 1)
+    config_cache_ttl = event.get('configCacheTtl', DEFAULT_CONFIG_CACHE_TTL)
+    config_version = event.get('configVersion')
+    shard = event.get('shard')
+    metrics_format = event.get('metricsFormat', "json")
+    engine = event.get('engine', "threads")
+    snapshot_mode = event.get('snapshotMode')
+    snapshot_dir = event.get('snapshotDir', DEFAULT_SNAPSHOT_DIR)
+    if "sourceApiNames" in event:
+      results = MultiSourceOrchestrator(app, event["sourceApiNames"], max_workers, config_cache_ttl, config_version, shard, metrics_format, engine,
+                                        snapshot_mode, snapshot_dir).execute()
+      failed_source_api_names = [source_api_name for source_api_name, result in results.items() if result["status"] == "failed"]
+      if failed_source_api_names:
+        raise Exception(f"Scraping failed for {failed_source_api_names} - {results}")
+      return results
     source_api_name = event['sourceApiName']
-    orchestrator = Orchestrator(app, source_api_name)
-    orchestrator.execute()
+    orchestrator = Orchestrator(app, source_api_name, max_workers, config_cache_ttl, config_version, shard, metrics_format, engine,
+                                snapshot_mode, snapshot_dir)
+    return {source_api_name: dict(status="succeeded", **orchestrator.execute())}
   except Exception as e:
     logging.exception(e)
     exit(1)
@@ -19,4 +62,4 @@ def main(event, context):
 if __name__ == '__main__':
   #uncomment to test event payload locally
   # main(event, '')
-  main('', '')
\ No newline at end of file
+  main('', '')
@@ -0,0 +1,64 @@
+"""
+The asyncio engine, selected with engine="asyncio" for the Orchestrator. Units e.g. letters, are scraped as tasks on
+one event loop, with requests sent by a shared aiohttp session rather than a thread per request. boto3 is blocking, so
+batch_write_item requests, and transforming records, run in a small thread pool instead.
+
+AsyncEngine holds the state for a run: the aiohttp session, the thread pool, and semaphores which bound the requests
+in flight to each host and to each DynamoDB table, across every unit scraped at the same time.
+"""
+import asyncio
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from modules.utils.http_session import get_endpoint_prefix
+
+ENGINES = ["threads", "asyncio"]
+
+def validate_engine(engine):
+  if engine not in ENGINES:
+    raise ValueError(f"engine should be one of {ENGINES}. engine is {engine}")
+  return engine
+
+
+class AsyncEngine:
+  """
+  Used as an async context manager, within a running event loop, e.g.
+  async with AsyncEngine(max_in_flight) as async_engine:
+  """
+  def __init__(self, executor_max_workers):
+    """
+    executor_max_workers: (int) : threads for blocking calls e.g. batch_write_item requests
+    """
+    self.executor_max_workers = executor_max_workers
+    self.session = None
+    self.executor = None
+    self.host_semaphores = {}
+    self.table_semaphores = {}
+
+  async def __aenter__(self):
+    self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    self.executor = ThreadPoolExecutor(max_workers=self.executor_max_workers)
+    return self
+
+  async def __aexit__(self, *exc_info):
+    await self.session.close()
+    self.executor.shutdown(wait=True)
+
+  def get_host_semaphore(self, endpoint, max_requests):
+    """
+    -> asyncio.Semaphore : for the scheme and host of endpoint, allowing max_requests at a time
+    """
+    prefix = get_endpoint_prefix(endpoint)
+    if prefix not in self.host_semaphores:
+      self.host_semaphores[prefix] = asyncio.Semaphore(max_requests)
+    return self.host_semaphores[prefix]
+
+  def get_table_semaphore(self, dynamo_db_table, max_requests):
+    """
+    -> asyncio.Semaphore : for dynamo_db_table, allowing max_requests at a time
+    """
+    if dynamo_db_table not in self.table_semaphores:
+      self.table_semaphores[dynamo_db_table] = asyncio.Semaphore(max_requests)
+    return self.table_semaphores[dynamo_db_table]
+
+  async def run_in_executor(self, function, *args):
+    return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
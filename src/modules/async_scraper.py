@@ -0,0 +1,142 @@
+import time
+import random
+import asyncio
+import aiohttp
+import simplejson as json
+from urllib3.exceptions import InvalidHeader
+from modules.scraper import Scraper
+from modules.utils.http_session import get_http_config, get_retry
+from modules.utils.rate_limiter import THROTTLE_STATUS_CODES, get_rate_limiter
+
+RETRY_AFTER_STATUS_CODES = [413, 429, 503]
+
+
+class AsyncResponse:
+  """
+  A response read by aiohttp, with the attributes of requests.Response used by Scraper, so get_cached_response and
+  check_response_modified can be shared by both engines.
+  status_codes: (list) : status codes of responses which were retried, followed by status_code
+  retry_count: (int) : requests retried before this response, for retried statuses and for connection errors or timeouts
+  """
+  def __init__(self, status_code, headers, content, status_codes, retry_count=0):
+    self.status_code = status_code
+    self.headers = headers
+    self.content = content
+    self.status_codes = status_codes
+    self.retry_count = retry_count
+
+  @property
+  def text(self):
+    return self.content.decode("utf-8", errors="replace")
+
+  def json(self):
+    return json.loads(self.content)
+
+
+class AsyncScraper(Scraper):
+  """
+  Scraper for the asyncio engine. Requests are sent with the aiohttp session of an AsyncEngine, and retried with the
+  http_config settings used for the HTTPAdapter of the threads engine. Requests to a host are limited to pool_maxsize
+  at a time across every unit being scraped. Records are not streamed, so "stream_records" in http_config is ignored.
+  """
+  async def get_api_records_from_endpoint_async(self, async_engine, ssm_value_dict, metrics=None):
+    """
+    As get_api_records_from_endpoint. The response is parsed in the executor of async_engine, so a large response
+    doesn't hold up other units.
+    -> list : List of records scraped from api_endpoint
+    """
+    endpoint = ssm_value_dict["source_api_endpoint"]
+    http_config = get_http_config(ssm_value_dict)
+    cached_response = self.get_cached_response(ssm_value_dict, http_config)
+    headers = self.get_request_headers(ssm_value_dict, cached_response)
+    try:
+      r = await self.get_response_async(async_engine, ssm_value_dict, http_config, headers, metrics)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+      raise Exception(f'Error: {type(e).__name__} {e}')
+    if metrics is not None:
+      metrics.add("payload_bytes", len(r.content))
+    self.check_response_modified(ssm_value_dict, http_config, r, cached_response)
+    if r.status_code != 200:
+      raise Exception(f'Error- status code: {r.status_code} - error message: {r.text}. Was unable to scrape api_records from endpoint - {endpoint}')
+    start = time.perf_counter()
+    api_records = await async_engine.run_in_executor(r.json)
+    if metrics is not None:
+      metrics.add("parse_seconds", time.perf_counter() - start)
+    return api_records
+
+  async def get_response_async(self, async_engine, ssm_value_dict, http_config, headers, metrics=None):
+    """
+    As get_response, waiting for the rate limiter on the event loop
+    -> AsyncResponse
+    """
+    endpoint = ssm_value_dict["source_api_endpoint"]
+    rate_limiter = get_rate_limiter(ssm_value_dict["source_api"], http_config)
+    if rate_limiter is not None:
+      wait_seconds = rate_limiter.reserve()
+      if wait_seconds > 0:
+        await asyncio.sleep(wait_seconds)
+      sent_at = rate_limiter.clock()
+      if metrics is not None:
+        metrics.add("rate_limit_wait_seconds", wait_seconds)
+    start = time.perf_counter()
+    try:
+      async with async_engine.get_host_semaphore(endpoint, http_config["pool_maxsize"]):
+        r = await self.send_request_async(async_engine, endpoint, http_config, headers)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+      if rate_limiter is not None:
+        rate_limiter.record_response(sent_at, None, time.perf_counter() - start)
+      raise
+    latency = time.perf_counter() - start
+    if metrics is not None:
+      metrics.add("fetch_seconds", latency)
+      metrics.add("http_retry_count", r.retry_count)
+    if rate_limiter is not None:
+      rate_limiter.record_response(sent_at, r.status_codes, latency)
+      if metrics is not None:
+        metrics.add("throttled_count", sum(status_code in THROTTLE_STATUS_CODES for status_code in r.status_codes))
+    return r
+
+  async def send_request_async(self, async_engine, endpoint, http_config, headers):
+    """
+    Retries connection errors, timeouts and statuses in status_forcelist up to max_retries times, as get_retry does
+    for the threads engine. The last response is returned once retries run out.
+    -> AsyncResponse
+    """
+    timeout = aiohttp.ClientTimeout(sock_connect=http_config["connect_timeout"], sock_read=http_config["read_timeout"])
+    status_codes = []
+    for retry in range(http_config["max_retries"] + 1):
+      last_attempt = retry == http_config["max_retries"]
+      retry_after = None
+      try:
+        async with async_engine.session.get(endpoint, headers=headers, timeout=timeout) as response:
+          content = await response.read()
+          status_codes.append(response.status)
+          if response.status not in http_config["status_forcelist"] or last_attempt:
+            return AsyncResponse(response.status, response.headers, content, status_codes, retry)
+          if response.status in RETRY_AFTER_STATUS_CODES:
+            retry_after = self.get_retry_after(response.headers, http_config)
+      except (aiohttp.ClientError, asyncio.TimeoutError):
+        if last_attempt:
+          raise
+      await asyncio.sleep(retry_after if retry_after is not None else self.get_backoff_seconds(http_config, retry + 1))
+
+  def get_retry_after(self, headers, http_config):
+    """
+    -> float : seconds from the Retry-After header, capped at retry_after_max, or None if there isn't a valid one
+    """
+    if headers.get("Retry-After") is None:
+      return None
+    try:
+      return min(get_retry(http_config).parse_retry_after(headers["Retry-After"]), http_config["retry_after_max"])
+    except InvalidHeader:
+      return None
+
+  def get_backoff_seconds(self, http_config, retry_count):
+    """
+    -> float : 0 for the first retry, then backoff_factor * 2 ** (retry_count - 1) with up to backoff_jitter
+    seconds of jitter, capped at backoff_max, as for urllib3
+    """
+    if retry_count <= 1:
+      return 0
+    backoff_seconds = http_config["backoff_factor"] * 2 ** (retry_count - 1) + random.random() * http_config["backoff_jitter"]
+    return min(http_config["backoff_max"], backoff_seconds)
@@ -0,0 +1,222 @@
+import time
+import random
+import asyncio
+import threading
+import botocore.exceptions
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from modules.utils.write_scheduler import THROTTLING_ERROR_CODES
+
+WRITE_MODES = ["delete_put", "upsert"]
+
+DEFAULT_UPLOAD_CONFIG = {
+  "write_mode": "delete_put",
+  "incremental": False,
+  "deduplicate": True,
+  "hash_store": "dynamo_db",
+  "hash_manifest_dir": "/tmp/content-hashes",
+  "max_in_flight": 4,
+  "max_retries": 5,
+  "backoff_base": 0.1,
+  "backoff_max": 2,
+  "checkpoint": False,
+  "checkpoint_store": "manifest",
+  "checkpoint_dir": "/tmp/checkpoints",
+  "checkpoint_table": "",
+  "adaptive_writes": False,
+  "write_capacity_units": 0,
+  "write_capacity_utilisation": 0.9,
+  "sinks": [],
+  "parquet_path": "",
+  "parquet_endpoint_url": ""
+}
+
+def get_upload_config(ssm_value_dict):
+  """
+  -> dict : DEFAULT_UPLOAD_CONFIG, updated with any values from the "upload_config" in ssm_value_dict
+  """
+  upload_config = dict(DEFAULT_UPLOAD_CONFIG)
+  upload_config.update(ssm_value_dict.get("upload_config", {}))
+  return upload_config
+
+
+class BatchUploader:
+  """
+  Sends batch_items to a DynamoDB table with up to max_in_flight batch_write_item requests at a time.
+  UnprocessedItems returned by DynamoDB, or every item for a throttled request, are sent again with jittered
+  exponential backoff, and ConsumedCapacity is totalled for all requests.
+  """
+  def __init__(self, upload_batch, dynamo_db_table, upload_config, write_scheduler=None):
+    """
+    upload_batch: (callable) : Sends a list of batch_items and returns the batch_write_item response
+    dynamo_db_table: (string) : Used to find UnprocessedItems and ConsumedCapacity for the table in responses
+    upload_config: (dict) : See DEFAULT_UPLOAD_CONFIG
+    write_scheduler: (WriteScheduler) : If set, paces requests to stay under the write capacity of the table
+    """
+    self.upload_batch = upload_batch
+    self.dynamo_db_table = dynamo_db_table
+    self.max_in_flight = upload_config["max_in_flight"]
+    self.max_retries = upload_config["max_retries"]
+    self.backoff_base = upload_config["backoff_base"]
+    self.backoff_max = upload_config["backoff_max"]
+    self.batch_count = 0
+    self.request_count = 0
+    self.retry_count = 0
+    self.consumed_capacity_units = 0.0
+    self.throttle_count = 0
+    self.write_scheduler = write_scheduler
+    self.lock = threading.Lock()
+
+  def execute(self, batch_item_groups, on_group_uploaded=None):
+    """
+    batch_item_groups: (iterable) : Each group is a list of batch_items lists, which are sent in order
+    e.g. [delete_batch_items, put_batch_items] for one batch of records. Groups are sent concurrently.
+    Groups are only taken from batch_item_groups as capacity frees up, so a generator is not read ahead.
+    on_group_uploaded: (callable) : Called with the position of each group in batch_item_groups, once it has been uploaded
+    -> dict : Summary of the upload
+    """
+    with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+      in_flight = set()
+      for i, batch_item_group in enumerate(batch_item_groups):
+        if len(in_flight) >= self.max_in_flight:
+          done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+          self.raise_for_failed_uploads(done)
+        in_flight.add(executor.submit(self.write_batch_item_group, batch_item_group, i, on_group_uploaded))
+      done, _ = wait(in_flight)
+      self.raise_for_failed_uploads(done)
+    return self.get_summary()
+
+  def raise_for_failed_uploads(self, futures):
+    for future in futures:
+      if future.exception() is not None:
+        raise future.exception()
+
+  def write_batch_item_group(self, batch_item_group, i=None, on_group_uploaded=None):
+    for batch_items in batch_item_group:
+      self.write_batch_items(batch_items)
+    if on_group_uploaded is not None:
+      on_group_uploaded(i)
+
+  def write_batch_items(self, batch_items):
+    """
+    Sends batch_items, then sends any UnprocessedItems again until none are left.
+    Raises an exception if items are still unprocessed after max_retries.
+    """
+    for attempt in range(self.max_retries + 1):
+      if attempt > 0:
+        self.increment("retry_count")
+        time.sleep(self.get_backoff(attempt))
+      batch_items = self.send_batch_items(batch_items)
+      if not batch_items:
+        self.increment("batch_count")
+        return
+    raise Exception(f"Error - {len(batch_items)} items are still unprocessed for DynamoDB table - {self.dynamo_db_table}, after {self.max_retries} retries")
+
+  def send_batch_items(self, batch_items):
+    """
+    Sends batch_items once, waiting for the write_scheduler first if there is one.
+    -> list : batch_items which were not processed, which is every item if the request was throttled
+    """
+    if self.write_scheduler is not None:
+      sent_at, estimated_units = self.write_scheduler.acquire(len(batch_items))
+    try:
+      response = self.upload_batch(batch_items)
+    except botocore.exceptions.ClientError as e:
+      if e.response["Error"]["Code"] not in THROTTLING_ERROR_CODES:
+        if self.write_scheduler is not None:
+          self.write_scheduler.cancel()
+        raise e
+      response = {"UnprocessedItems": {self.dynamo_db_table: batch_items}}
+    except BaseException:
+      #e.g. EndpointConnectionError or ReadTimeoutError. The request's slot is given back, as the scheduler is shared by later runs
+      if self.write_scheduler is not None:
+        self.write_scheduler.cancel()
+      raise
+    self.increment("request_count")
+    consumed_capacity_units = self.add_consumed_capacity(response)
+    unprocessed_batch_items = response.get("UnprocessedItems", {}).get(self.dynamo_db_table, [])
+    if unprocessed_batch_items:
+      self.increment("throttle_count")
+    if self.write_scheduler is not None:
+      self.write_scheduler.record_response(sent_at, estimated_units, len(batch_items), consumed_capacity_units, bool(unprocessed_batch_items))
+    return unprocessed_batch_items
+
+  def get_backoff(self, attempt):
+    """
+    -> float : Seconds to sleep for, using full jitter
+    """
+    return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+  def add_consumed_capacity(self, response):
+    capacity_units = sum(consumed_capacity.get("CapacityUnits", 0)
+                         for consumed_capacity in response.get("ConsumedCapacity", [])
+                         if consumed_capacity.get("TableName") == self.dynamo_db_table)
+    with self.lock:
+      self.consumed_capacity_units += capacity_units
+    return capacity_units
+
+  def increment(self, counter):
+    with self.lock:
+      setattr(self, counter, getattr(self, counter) + 1)
+
+  def get_summary(self):
+    return {"batch_count": self.batch_count,
+            "request_count": self.request_count,
+            "retry_count": self.retry_count,
+            "consumed_capacity_units": self.consumed_capacity_units,
+            "throttle_count": self.throttle_count}
+
+
+class AsyncBatchUploader(BatchUploader):
+  """
+  BatchUploader for the asyncio engine. Groups are written by tasks on the event loop, while each batch_write_item
+  request is sent from the executor of the AsyncEngine, as boto3 is blocking. Requests to the table are limited to
+  max_in_flight at a time by a semaphore from the AsyncEngine, which is shared by every upload to the table in the run.
+  """
+  async def execute_async(self, async_engine, batch_item_groups, on_group_uploaded=None):
+    """
+    As BatchUploader.execute. Groups are taken from batch_item_groups in the executor, as making them may transform
+    records, or look up content hashes.
+    -> dict : Summary of the upload
+    """
+    batch_item_groups = iter(batch_item_groups)
+    in_flight = set()
+    i = 0
+    try:
+      while True:
+        batch_item_group = await async_engine.run_in_executor(next, batch_item_groups, None)
+        if batch_item_group is None:
+          break
+        if len(in_flight) >= self.max_in_flight:
+          done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+          self.raise_for_failed_uploads(done)
+        in_flight.add(asyncio.create_task(self.write_batch_item_group_async(async_engine, batch_item_group, i, on_group_uploaded)))
+        i += 1
+      if in_flight:
+        done, in_flight = await asyncio.wait(in_flight)
+        self.raise_for_failed_uploads(done)
+    finally:
+      for task in in_flight:
+        task.cancel()
+    return self.get_summary()
+
+  async def write_batch_item_group_async(self, async_engine, batch_item_group, i=None, on_group_uploaded=None):
+    for batch_items in batch_item_group:
+      await self.write_batch_items_async(async_engine, batch_items)
+    if on_group_uploaded is not None:
+      await async_engine.run_in_executor(on_group_uploaded, i)
+
+  async def write_batch_items_async(self, async_engine, batch_items):
+    """
+    As BatchUploader.write_batch_items, sleeping on the event loop between retries
+    """
+    table_semaphore = async_engine.get_table_semaphore(self.dynamo_db_table, self.max_in_flight)
+    for attempt in range(self.max_retries + 1):
+      if attempt > 0:
+        self.increment("retry_count")
+        await asyncio.sleep(self.get_backoff(attempt))
+      async with table_semaphore:
+        batch_items = await async_engine.run_in_executor(self.send_batch_items, batch_items)
+      if not batch_items:
+        self.increment("batch_count")
+        return
+    raise Exception(f"Error - {len(batch_items)} items are still unprocessed for DynamoDB table - {self.dynamo_db_table}, after {self.max_retries} retries")
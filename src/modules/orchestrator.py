@@ -1,57 +1,461 @@
 from modules.scraper import Scraper
+from modules.async_scraper import AsyncScraper
 from config.api_mapping import APIMapping
-from string import ascii_lowercase as alphabet
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from modules.record_manager import RecordManager
+from modules.batch_uploader import get_upload_config
+from modules.utils.http_session import get_http_config
 from modules.utils.api_mapping_manager import APIMappingManager
 from modules.utils.validator import validate_api_records_exist
+from modules.utils.response_cache import NOT_MODIFIED_MESSAGE
+from modules.utils.ssm_config_cache import DEFAULT_CONFIG_CACHE_TTL
+from modules.utils.shard_planner import parse_shard
+from modules.utils.aws_clients import get_aws_resource
+from modules.utils.checkpoint import DEFAULT_UNIT, get_checkpoint_id, load_checkpoint
+from modules.utils.metrics import RunMetrics
+from modules.utils.dedup_index import DedupIndex
+from modules.utils.sinks import get_sinks
+from modules.utils.snapshot import DEFAULT_SNAPSHOT_DIR, get_snapshot_path, iter_records_writing_snapshot, iter_snapshot_records, validate_snapshot_mode, write_snapshot
+from modules.async_engine import AsyncEngine, validate_engine
 
 class Orchestrator:
-  def __init__(self, app, source_api_name):
+  def __init__(self, app, source_api_name, max_workers=1, config_cache_ttl=DEFAULT_CONFIG_CACHE_TTL, config_version=None, shard=None,
+               metrics_format="json", engine="threads", snapshot_mode=None, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """
+    max_workers: (int) : Number of letters which can be scraped and uploaded at the same time,
+    when the alphabetical scraping rule applies. The default of 1 scrapes letters one after another.
+    config_cache_ttl, config_version: (int) : Passed to Scraper, for caching ssm parameters
+    shard: (string) : e.g. "3/8" or "a-f", so only a share of the letters is scraped for the alphabetical scraping rule.
+    See shard_planner. Other scraping rules are only applied by the first shard.
+    metrics_format: (string) : "json", "emf" or "none", for the metrics logged for each letter and the run. See metrics.
+    engine: (string) : "threads" scrapes letters in a pool of max_workers threads. "asyncio" scrapes them as tasks
+    on an event loop, with aiohttp. See async_engine.
+    snapshot_mode: (string) : "record" writes the records scraped for each letter to snapshot_dir. "replay" reads them from
+    snapshot_dir instead of the source api. See snapshot.
+    """
     self.app = app
     self.source_api_name = source_api_name
+    self.max_workers = self.validate_max_workers(max_workers)
+    self.config_cache_ttl = config_cache_ttl
+    self.config_version = config_version
+    parse_shard(shard)
+    self.shard = shard
+    self.engine = validate_engine(engine)
+    self.snapshot_mode = validate_snapshot_mode(snapshot_mode)
+    self.snapshot_dir = snapshot_dir
+    self.checkpoint = None
+    self.dedup_index = None
+    self.sinks = []
+    self.scraping_rule = None
+    self.metrics = RunMetrics(app, source_api_name, metrics_format)
+    self.scraped_hash_keys = set()
+    self.scraped_hash_keys_lock = threading.Lock()
+    self.summary = {"record_count": 0, "batch_count": 0, "request_count": 0, "retry_count": 0, "consumed_capacity_units": 0, "throttle_count": 0,
+                    "duplicate_record_count": 0, "letter_record_counts": {}}
+
+  def validate_max_workers(self, max_workers):
+    if not isinstance(max_workers, int) or isinstance(max_workers, bool) or max_workers < 1:
+      raise ValueError(f"max_workers should be an integer greater than 0. max_workers is {max_workers}")
+    return max_workers
 
   def execute(self):
+    """
+    Run metrics are logged once the run has finished, or has failed.
+    -> dict : self.summary, with records and batches uploaded for self.source_api_name
+    """
+    try:
+      with self.metrics.time("total_seconds"):
+        return self.scrape_and_upload_records()
+    finally:
+      self.metrics.emit_run_metrics()
+
+  def scrape_and_upload_records(self):
     print(f"Starting Orchestrator for source_api_name - {self.source_api_name}")
-    scraper = Scraper(self.app, self.source_api_name)
+    scraper_class = AsyncScraper if self.engine == "asyncio" else Scraper
+    scraper = scraper_class(self.app, self.source_api_name, config_cache_ttl=self.config_cache_ttl, config_version=self.config_version)
     api_mapping_manager = APIMappingManager(self.source_api_name, APIMapping)
     api_mapping_manager.execute()
 
-    ssm_value_dict = scraper.get_validated_ssm_value_dict()
+    with self.metrics.time("config_seconds"):
+      scraper.prefetch_ssm_value_dicts(api_group_mapping["api_name"] for api_group_mapping in APIMapping["api_group_mappings"])
+      ssm_value_dict = scraper.get_validated_ssm_value_dict()
+    scraper.mount_http_adapter(ssm_value_dict)
+    upload_config = get_upload_config(ssm_value_dict)
+    if upload_config["checkpoint"]:
+      self.checkpoint = load_checkpoint(upload_config, get_aws_resource('dynamodb'), get_checkpoint_id(self.app, self.source_api_name, self.shard))
+    if upload_config["deduplicate"] and self.checkpoint is None:
+      self.dedup_index = DedupIndex()
+    self.sinks = get_sinks(upload_config, ssm_value_dict, self.source_api_name)
+
+    with self.metrics.time("scrape_seconds"):
+      scraping_rule = api_mapping_manager.get_scraping_rule(ssm_value_dict, self.shard)
+      if self.engine == "asyncio":
+        asyncio.run(self.scrape_and_upload_records_for_scraping_rule_async(scraper, scraping_rule, upload_config))
+      else:
+        self.scrape_and_upload_records_for_scraping_rule(scraper, scraping_rule)
 
-    if api_mapping_manager.scraping_rule_dict["type"] == "default":
-      self.scrape_and_upload_records_to_dynamo_db(scraper, ssm_value_dict)
-    else:
-      if api_mapping_manager.scraping_rule_dict["type"] == "alphabetical":
-        self.scrape_and_upload_records_for_alphabetical_scraping_rule(scraper, ssm_value_dict, api_mapping_manager)
+    self.close_sinks()
+
+    if upload_config["write_mode"] == "upsert":
+      with self.metrics.time("prune_seconds"):
+        self.delete_stale_records(ssm_value_dict)
+    if self.checkpoint is not None:
+      self.checkpoint.clear()
+    if self.summary["duplicate_record_count"]:
+      print(f"Collapsed {self.summary['duplicate_record_count']} duplicate records across the run")
     print("Finished executing Orchestrator")
+    return self.summary
+
+  def close_sinks(self):
+      """
+      Sinks write the records for each letter as it is uploaded, so they are only closed once every letter has been scraped
+      """
+      for sink in self.sinks:
+        print(f"Exported {sink.close()} records to the {sink.type} sink")
+
+  def delete_stale_records(self, ssm_value_dict):
+      """
+      With the "upsert" write_mode, records are not deleted before they are put. Instead, once every endpoint
+      has been scraped, items whose hash_key was not scraped in this run are deleted from the DynamoDB table.
+      This is skipped if no records were scraped at all, to avoid emptying the table, or for a shard, as
+      records scraped by other shards would be deleted. It is also skipped for a run resumed from a checkpoint,
+      as records uploaded by the previous run are not scraped again.
+      """
+      if self.shard is not None:
+        print(f"Stale records are not deleted for shard {self.shard}")
+        return
+      if self.checkpoint is not None and self.checkpoint.resumed:
+        print("Stale records are not deleted for a run resumed from a checkpoint")
+        return
+      if not self.scraped_hash_keys:
+        print("No records were scraped, so stale records will not be deleted")
+        return
+      record_manager = RecordManager([], ssm_value_dict)
+      record_manager.delete_stale_records(self.scraped_hash_keys)
 
-  def scrape_and_upload_records_for_alphabetical_scraping_rule(self, scraper, ssm_value_dict, api_mapping_manager):
+  def scrape_and_upload_records_for_scraping_rule(self, scraper, scraping_rule):
+      """
+      Units from the scraping_rule e.g. letters for the alphabetical scraping rule, are scraped and uploaded one after another,
+      or self.max_workers at a time if the scraping_rule allows it. If no api_records are found for a unit, the behaviour is
+      to continue to scrape records for other units. This means, care should be taken with handling exceptions
       """
-      If no api_records are found for a letter in the alphabet, the behaviour is to continue to scrape records for other letters.
-      This means, care should be taken with handling exceptions 
+      units = self.get_units_to_scrape(scraping_rule)
+      if self.max_workers > 1 and scraping_rule.concurrent:
+        self.scrape_and_upload_units_concurrently(scraper, units)
+      else:
+        for unit, unit_ssm_value_dict in units:
+          self.scrape_and_upload_records_for_rule_unit(scraper, unit_ssm_value_dict, unit)
+      self.print_record_counts()
+
+  async def scrape_and_upload_records_for_scraping_rule_async(self, scraper, scraping_rule, upload_config):
       """
-      print("Enacting alphabetical scraping rule")    
-      base_endpoint = ssm_value_dict["source_api_endpoint"]
-      for i in alphabet:
-         print(f'Scraping records for {ssm_value_dict["source_api"]}')
-         print(f"Letter - {i}")
-         ssm_value_dict["source_api_endpoint"] = base_endpoint + api_mapping_manager.scraping_rule_dict["query"] + i
-         self.scrape_and_upload_records_to_dynamo_db(scraper, ssm_value_dict)
+      As scrape_and_upload_records_for_scraping_rule, for the asyncio engine. Units are scraped as tasks on the event loop,
+      self.max_workers at a time if the scraping_rule allows it. The executor of the AsyncEngine has a thread for each
+      batch_write_item request allowed in flight by upload_config, and one for each unit to make batches in.
+      """
+      units = self.get_units_to_scrape(scraping_rule)
+      async with AsyncEngine(upload_config["max_in_flight"] + self.max_workers) as async_engine:
+        if self.max_workers > 1 and scraping_rule.concurrent:
+          await self.scrape_and_upload_units_concurrently_async(async_engine, scraper, units)
+        else:
+          for unit, unit_ssm_value_dict in units:
+            await self.scrape_and_upload_records_for_rule_unit_async(async_engine, scraper, unit_ssm_value_dict, unit)
+      self.print_record_counts()
+
+  def get_units_to_scrape(self, scraping_rule):
+      """
+      -> generator : Yields (unit, unit_ssm_value_dict) from scraping_rule, leaving out units completed by a previous run
+      """
+      print(f"Enacting {scraping_rule.type} scraping rule")
+      if self.snapshot_mode == "replay":
+        if not scraping_rule.replayable:
+          raise ValueError(f"The {scraping_rule.type} scraping rule can't be replayed from snapshots")
+        print(f"Replaying records from snapshots in {self.snapshot_dir}")
+      self.scraping_rule = scraping_rule
+      units = scraping_rule.iter_units()
+      if self.checkpoint is not None and scraping_rule.resumable:
+        units = ((unit, unit_ssm_value_dict) for unit, unit_ssm_value_dict in units if not self.checkpoint.is_unit_completed(unit))
+      return units
+
+  def print_record_counts(self):
+      if self.scraping_rule.record_counts_key is not None:
+        print(f"{self.scraping_rule.record_counts_key} - {self.summary[self.scraping_rule.record_counts_key]}")
+
+  def scrape_and_upload_units_concurrently(self, scraper, units):
+      """
+      Units are shared out to a pool of self.max_workers threads. Each thread fetches, transforms and uploads
+      records for a unit, so fetching for some units overlaps with uploading for others. Units are only taken
+      from units as threads free up, so they are not read ahead.
+      If a unit raises (e.g. a mismatch between api_record_keys and field_mapping_keys), no more units
+      are started and the exception is raised.
+      """
+      print(f"Scraping units concurrently with max_workers - {self.max_workers}")
+      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        in_flight = set()
+        for unit, unit_ssm_value_dict in units:
+          if len(in_flight) >= self.max_workers:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            self.raise_for_failed_units(done)
+          in_flight.add(executor.submit(self.scrape_and_upload_records_for_rule_unit, scraper, unit_ssm_value_dict, unit))
+        done, _ = wait(in_flight)
+        self.raise_for_failed_units(done)
+
+  async def scrape_and_upload_units_concurrently_async(self, async_engine, scraper, units):
+      """
+      As scrape_and_upload_units_concurrently, with up to self.max_workers tasks at a time. If a unit raises,
+      tasks for other units are cancelled and the exception is raised.
+      """
+      print(f"Scraping units concurrently on the event loop with max_workers - {self.max_workers}")
+      in_flight = set()
+      try:
+        for unit, unit_ssm_value_dict in units:
+          if len(in_flight) >= self.max_workers:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            self.raise_for_failed_units(done)
+          in_flight.add(asyncio.create_task(self.scrape_and_upload_records_for_rule_unit_async(async_engine, scraper, unit_ssm_value_dict, unit)))
+        if in_flight:
+          done, in_flight = await asyncio.wait(in_flight)
+          self.raise_for_failed_units(done)
+      finally:
+        for task in in_flight:
+          task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+  def raise_for_failed_units(self, futures):
+      for future in futures:
+        if future.exception() is not None:
+          raise future.exception()
+
+  def scrape_and_upload_records_for_rule_unit(self, scraper, unit_ssm_value_dict, unit):
+      print(f'Scraping records for {unit_ssm_value_dict["source_api"]}')
+      print(f"Unit - {unit}")
+      record_count = self.scrape_and_upload_records_for_unit(scraper, unit_ssm_value_dict, unit) or 0
+      self.record_unit(unit, record_count)
+
+  async def scrape_and_upload_records_for_rule_unit_async(self, async_engine, scraper, unit_ssm_value_dict, unit):
+      """
+      As scrape_and_upload_records_for_rule_unit and scrape_and_upload_records_for_unit, for the asyncio engine
+      """
+      print(f'Scraping records for {unit_ssm_value_dict["source_api"]}')
+      print(f"Unit - {unit}")
+      try:
+        with self.metrics.get_unit_metrics(unit).time("unit_seconds"):
+          record_count = await self.scrape_and_upload_records_to_dynamo_db_async(async_engine, scraper, unit_ssm_value_dict, unit)
+      finally:
+        self.metrics.emit_unit_metrics(unit)
+      if self.checkpoint is not None:
+        await async_engine.run_in_executor(self.checkpoint.complete_unit, unit)
+      self.record_unit(unit, record_count or 0)
+
+  def record_unit(self, unit, record_count):
+      self.scraping_rule.record_unit(unit, record_count)
+      if self.scraping_rule.record_counts_key is not None:
+        with self.scraped_hash_keys_lock:
+          self.summary[self.scraping_rule.record_counts_key][unit] = record_count
+
+  def scrape_and_upload_records_for_unit(self, scraper, ssm_value_dict, unit):
+      """
+      unit: (string) : e.g. the letter, or DEFAULT_UNIT for the default scraping rule, which is recorded in any checkpoint once it has finished
+      -> int : Number of records scraped
+      """
+      try:
+        with self.metrics.get_unit_metrics(unit).time("unit_seconds"):
+          record_count = self.scrape_and_upload_records_to_dynamo_db(scraper, ssm_value_dict, unit)
+      finally:
+        self.metrics.emit_unit_metrics(unit)
+      if self.checkpoint is not None:
+        self.checkpoint.complete_unit(unit)
+      return record_count
 
-  def scrape_and_upload_records_to_dynamo_db(self, scraper, ssm_value_dict):
+  def scrape_and_upload_records_to_dynamo_db(self, scraper, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      -> int : Number of records scraped, or 0 if none were found
+      """
+      unit_metrics = self.metrics.get_unit_metrics(unit)
       try:
         print(f'Scraping records for {ssm_value_dict["source_api"]}')
-        api_records = scraper.get_api_records_from_endpoint(ssm_value_dict)
-        api_records = validate_api_records_exist(api_records, ssm_value_dict)
-        record_manager = RecordManager(api_records, ssm_value_dict)
-        record_manager.execute()
+        if self.snapshot_mode == "replay":
+          record_manager = self.replay_and_upload_records_to_dynamo_db(ssm_value_dict, unit)
+        elif get_http_config(ssm_value_dict)["stream_records"]:
+          record_manager = self.stream_and_upload_records_to_dynamo_db(scraper, ssm_value_dict, unit)
+        else:
+          api_records = scraper.get_api_records_from_endpoint(ssm_value_dict, unit_metrics)
+          if self.scraping_rule is not None:
+            self.scraping_rule.record_api_response(unit, api_records)
+          api_records = self.get_api_records_to_upload(validate_api_records_exist(api_records, ssm_value_dict), ssm_value_dict, unit)
+          record_manager = self.upload_records_to_dynamo_db(api_records, ssm_value_dict, unit)
+        scraper.save_cached_response(ssm_value_dict, record_manager.hash_keys, record_manager.record_count)
+        return record_manager.record_count
       except ValueError as e:
-        message_1="No api_records have been found"
-        message_2="There's a mismatch between api_record_keys and field_mapping_keys"
-        if str(e) == message_1:
-          print(message_1)
-        elif str(e) == message_2:
-          print(message_2)
-          raise e
+        return self.handle_scrape_value_error(scraper, ssm_value_dict, unit, unit_metrics, e)
       except Exception as e:
          raise e
+
+  async def scrape_and_upload_records_to_dynamo_db_async(self, async_engine, scraper, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      As scrape_and_upload_records_to_dynamo_db, for the asyncio engine
+      -> int : Number of records scraped, or 0 if none were found
+      """
+      unit_metrics = self.metrics.get_unit_metrics(unit)
+      try:
+        print(f'Scraping records for {ssm_value_dict["source_api"]}')
+        if self.snapshot_mode == "replay":
+          api_records = iter_snapshot_records(get_snapshot_path(self.snapshot_dir, ssm_value_dict["source_api"], unit))
+        else:
+          api_records = await scraper.get_api_records_from_endpoint_async(async_engine, ssm_value_dict, unit_metrics)
+          if self.scraping_rule is not None:
+            self.scraping_rule.record_api_response(unit, api_records)
+          api_records = self.get_api_records_to_upload(validate_api_records_exist(api_records, ssm_value_dict), ssm_value_dict, unit)
+        record_manager = await self.upload_records_to_dynamo_db_async(async_engine, api_records, ssm_value_dict, unit)
+        if self.snapshot_mode == "replay" and record_manager.record_count == 0:
+          raise ValueError("No api_records have been found")
+        await async_engine.run_in_executor(scraper.save_cached_response, ssm_value_dict, record_manager.hash_keys, record_manager.record_count)
+        return record_manager.record_count
+      except ValueError as e:
+        return self.handle_scrape_value_error(scraper, ssm_value_dict, unit, unit_metrics, e)
+
+  def handle_scrape_value_error(self, scraper, ssm_value_dict, unit, unit_metrics, e):
+      message_1="No api_records have been found"
+      message_2="There's a mismatch between api_record_keys and field_mapping_keys"
+      if str(e) == message_1:
+        print(message_1)
+        scraper.save_cached_response(ssm_value_dict, set(), 0)
+        for sink in self.sinks:
+          sink.add_records(unit, [])
+        if self.snapshot_mode == "record":
+          write_snapshot([], get_snapshot_path(self.snapshot_dir, ssm_value_dict["source_api"], unit))
+        return 0
+      elif str(e) == NOT_MODIFIED_MESSAGE:
+        print(NOT_MODIFIED_MESSAGE)
+        unit_metrics.add("not_modified_count", 1)
+        return self.add_unchanged_response_hash_keys(scraper, ssm_value_dict)
+      elif str(e) == message_2:
+        print(message_2)
+        raise e
+
+  def add_unchanged_response_hash_keys(self, scraper, ssm_value_dict):
+      """
+      Records for an endpoint whose response has not changed are not uploaded again, but their hash_keys
+      from the response cache are added to self.scraped_hash_keys, so they are not deleted as stale records.
+      -> int : Number of records uploaded for the endpoint when it was last changed
+      """
+      cached_response = scraper.get_unchanged_response(ssm_value_dict)
+      with self.scraped_hash_keys_lock:
+        self.scraped_hash_keys.update(cached_response["hash_keys"])
+      return cached_response["record_count"]
+
+  def stream_and_upload_records_to_dynamo_db(self, scraper, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      Records are parsed from the response as it is read and passed straight into the RecordManager pipeline,
+      so peak memory depends on the number of batches in flight rather than the response size.
+      """
+      api_records = scraper.iter_api_records_from_endpoint(ssm_value_dict, self.metrics.get_unit_metrics(unit))
+      record_manager = self.upload_records_to_dynamo_db(self.get_api_records_to_upload(api_records, ssm_value_dict, unit), ssm_value_dict, unit)
+      if record_manager.record_count == 0:
+        raise ValueError("No api_records have been found")
+      return record_manager
+
+  def replay_and_upload_records_to_dynamo_db(self, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      Records are read from the snapshot for the unit as they are uploaded, as for streamed records
+      """
+      api_records = iter_snapshot_records(get_snapshot_path(self.snapshot_dir, ssm_value_dict["source_api"], unit))
+      record_manager = self.upload_records_to_dynamo_db(api_records, ssm_value_dict, unit)
+      if record_manager.record_count == 0:
+        raise ValueError("No api_records have been found")
+      return record_manager
+
+  def get_api_records_to_upload(self, api_records, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      -> iterable : api_records, written to the snapshot for the unit as they are uploaded with the "record" snapshot_mode
+      """
+      if self.snapshot_mode != "record":
+        return api_records
+      return iter_records_writing_snapshot(api_records, get_snapshot_path(self.snapshot_dir, ssm_value_dict["source_api"], unit))
+
+  def upload_records_to_dynamo_db(self, api_records, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      -> RecordManager : after it has been executed
+      """
+      record_manager = RecordManager(api_records, ssm_value_dict, self.checkpoint, unit, self.metrics.get_unit_metrics(unit), self.dedup_index,
+                                     self.sinks)
+      record_manager.execute()
+      self.add_upload_summary(record_manager)
+      return record_manager
+
+  async def upload_records_to_dynamo_db_async(self, async_engine, api_records, ssm_value_dict, unit=DEFAULT_UNIT):
+      """
+      -> RecordManager : after it has been executed on the event loop
+      """
+      record_manager = RecordManager(api_records, ssm_value_dict, self.checkpoint, unit, self.metrics.get_unit_metrics(unit), self.dedup_index,
+                                     self.sinks)
+      await record_manager.execute_async(async_engine)
+      self.add_upload_summary(record_manager)
+      return record_manager
+
+  def add_upload_summary(self, record_manager):
+      with self.scraped_hash_keys_lock:
+        self.scraped_hash_keys.update(record_manager.hash_keys)
+        self.summary["record_count"] += record_manager.record_count
+        self.summary["duplicate_record_count"] += record_manager.duplicate_record_count
+        for k, v in record_manager.upload_summary.items():
+          self.summary[k] += v
+
+
+class MultiSourceOrchestrator:
+  """
+  Runs an Orchestrator for each of several source apis at the same time, in one invocation.
+  The pooled HTTP session, boto3 clients and ssm config cache are module level, so they are shared by every source.
+  """
+  def __init__(self, app, source_api_names, max_workers=1, config_cache_ttl=DEFAULT_CONFIG_CACHE_TTL, config_version=None, shard=None,
+               metrics_format="json", engine="threads", snapshot_mode=None, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """
+    source_api_names: (list) : Source apis to scrape. Each is scraped in its own thread, with its own event loop for the asyncio engine.
+    max_workers, config_cache_ttl, config_version, shard, metrics_format, engine, snapshot_mode, snapshot_dir: Passed to the
+    Orchestrator for each source api
+    """
+    self.app = app
+    self.source_api_names = self.validate_source_api_names(source_api_names)
+    self.config_cache_ttl = config_cache_ttl
+    self.config_version = config_version
+    self.orchestrators = {source_api_name: Orchestrator(app, source_api_name, max_workers, config_cache_ttl, config_version, shard, metrics_format,
+                                                               engine, snapshot_mode, snapshot_dir)
+                          for source_api_name in self.source_api_names}
+
+  def validate_source_api_names(self, source_api_names):
+    if (not isinstance(source_api_names, list) or not source_api_names
+        or not all(isinstance(source_api_name, str) for source_api_name in source_api_names)):
+      raise ValueError(f"source_api_names should be a list of source api names. source_api_names is {source_api_names}")
+    if len(set(source_api_names)) != len(source_api_names):
+      raise ValueError(f"source_api_names should not have duplicates. source_api_names is {source_api_names}")
+    return source_api_names
+
+  def execute(self):
+    """
+    A failure for one source api does not stop the others.
+    -> dict : source api names mapped to a result, with "status" of "succeeded" and the Orchestrator summary,
+    or "failed" and the "error"
+    """
+    print(f"Starting MultiSourceOrchestrator for source_api_names - {self.source_api_names}")
+    Scraper(self.app, self.source_api_names[0], config_cache_ttl=self.config_cache_ttl).prefetch_ssm_value_dicts(self.source_api_names)
+    with ThreadPoolExecutor(max_workers=len(self.source_api_names)) as executor:
+      futures = {source_api_name: executor.submit(self.execute_orchestrator, orchestrator)
+                 for source_api_name, orchestrator in self.orchestrators.items()}
+      results = {source_api_name: future.result() for source_api_name, future in futures.items()}
+    print(f"Finished executing MultiSourceOrchestrator - {results}")
+    return results
+
+  def execute_orchestrator(self, orchestrator):
+    start = time.perf_counter()
+    try:
+      summary = orchestrator.execute()
+      result = dict(status="succeeded", **summary)
+    except Exception as e:
+      logging.exception(e)
+      result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
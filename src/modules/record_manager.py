@@ -1,59 +1,255 @@
-import boto3
+import time
 import pytz
 import botocore
 from datetime import datetime
-from modules.utils.validator import validate_timestamp, validate_api_record_keys
+from functools import partial
+from itertools import chain, islice
+from modules.utils.aws_clients import get_aws_resource
+from modules.batch_uploader import AsyncBatchUploader, BatchUploader, get_upload_config
+from modules.utils.content_hash import BATCH_GET_ITEM_SIZE, CONTENT_HASH_FIELD, get_content_hash_store, get_record_content_hash
+from modules.utils.record_transformer import compile_record_transformer
+from modules.utils.compact_record import CompactRecord
+from modules.utils.checkpoint import DEFAULT_UNIT
+from modules.utils.write_scheduler import get_write_scheduler
+from modules.utils.validator import APIRecordValidator, validate_timestamp, validate_api_record_keys
 
 class RecordManager:
   """
   Adds fields scraped api record documents and sends them to a specific DynamoDB table 
   """
-  def __init__(self, api_records, ssm_value_dict):
+  #https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchWriteItem.html
+  dynamo_db_batch_size = 25
+
+  def __init__(self, api_records, ssm_value_dict, checkpoint=None, checkpoint_unit=DEFAULT_UNIT, metrics=None, dedup_index=None, sinks=None):
+    """
+    checkpoint: (Checkpoint) : If set, batches uploaded for checkpoint_unit (e.g. a letter) are recorded,
+    and batches recorded by a previous run are not uploaded again
+    metrics: (UnitMetrics) : If set, records, batches, consumed capacity and time spent transforming and uploading are added
+    dedup_index: (DedupIndex) : If set, records already uploaded in the run with the same content are dropped. See dedup_index.
+    sinks: (list) : RecordSinks, which are given the transformed records once they have been uploaded. See sinks.
+    """
     self.api_records = api_records
     self.ssm_value_dict = ssm_value_dict
     self.dynamo_db_table = ssm_value_dict["dynamo_db_config"]["table"]
     self.dynamo_db_table_hash_key = ssm_value_dict["dynamo_db_config"]["hash_key"]
     self.field_mapping = ssm_value_dict["field_mapping"]
-    #https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchWriteItem.html
-    self.dynamo_db_batch_size = 25
+    self.upload_config = get_upload_config(ssm_value_dict)
+    self.hash_keys = set()
+    self.record_count = 0
+    self.changed_record_count = 0
+    self.upload_summary = {}
+    self.checkpoint = checkpoint
+    self.checkpoint_unit = checkpoint_unit
+    self.skipped_batch_count = 0
+    self.duplicate_record_count = 0
+    self.dedup_index = dedup_index
+    self.sinks = sinks or []
+    self.sink_records = []
+    self.metrics = metrics
+    self.api_record_validator = APIRecordValidator(self.field_mapping, self.dynamo_db_table_hash_key)
     self.timestamp = validate_timestamp(str(datetime.now(pytz.timezone('Europe/London'))))
     
 
   def execute(self):
-    
+    """
+    Records flow through a lazy pipeline of generators, so each record is transformed in a single pass and
+    batches are uploaded while later records are still being transformed (or scraped, if self.api_records is a generator).
+    -> dict : Summary of the upload
+    """
     print("Starting executing RecordManager")
-    
-    self.api_records = self.transform_data_for_upload(self.api_records)
+    record_batches = self.get_record_batches_for_upload()
+    upload_start = time.perf_counter()
+    self.upload_summary = self.upload_batches_to_dynamo_db(record_batches)
+    self.finish_upload(time.perf_counter() - upload_start)
+    return self.upload_summary
+
+  async def execute_async(self, async_engine):
+    """
+    Used by the asyncio engine. Batches are made in the executor of async_engine, so transforming records and any
+    lookups of content hashes don't block the event loop, and are sent with an AsyncBatchUploader.
+    -> dict : Summary of the upload
+    """
+    print("Starting executing RecordManager")
+    record_batches = await async_engine.run_in_executor(self.get_record_batches_for_upload)
+    upload_start = time.perf_counter()
+    self.upload_summary = await self.upload_batches_to_dynamo_db_async(record_batches, async_engine)
+    await async_engine.run_in_executor(self.finish_upload, time.perf_counter() - upload_start)
+    return self.upload_summary
 
-    record_batches = self.get_record_batches(self.api_records, self.dynamo_db_batch_size)
-    self.upload_batches_to_dynamo_db(record_batches)
+  def get_record_batches_for_upload(self):
+    """
+    -> generator : Yields batches of transformed records, leaving out unchanged records for incremental uploads
+    """
+    api_records = self.iter_transformed_records(self.api_records)
+    api_records = self.iter_records_collecting_hash_keys(api_records)
+    if self.sinks:
+      api_records = self.iter_records_collecting_sink_records(api_records)
+    if self.dedup_index is not None:
+      api_records = self.iter_records_not_duplicated(api_records)
+    if self.upload_config["incremental"]:
+      self.content_hash_store = get_content_hash_store(self.upload_config, get_aws_resource('dynamodb'), self.dynamo_db_table, self.dynamo_db_table_hash_key)
+      self.changed_content_hashes = {}
+      api_records = self.iter_changed_records(api_records, self.content_hash_store, self.changed_content_hashes)
+    record_batches = self.get_record_batches(api_records, self.dynamo_db_batch_size)
+    return (self.collapse_duplicate_hash_keys(record_batch) for record_batch in record_batches)
+
+  def finish_upload(self, upload_seconds):
+    if self.metrics is not None:
+      self.metrics.add("upload_seconds", upload_seconds)
+      self.metrics.add("record_count", self.record_count)
+      self.metrics.add("skipped_batch_count", self.skipped_batch_count)
+      self.metrics.add("invalid_record_count", self.api_record_validator.invalid_record_count)
+      self.metrics.add("duplicate_record_count", self.duplicate_record_count)
+      self.metrics.add_upload_summary(self.upload_summary)
+    self.report_invalid_records()
+    self.add_records_to_sinks()
+    if self.duplicate_record_count:
+      print(f"Collapsed {self.duplicate_record_count} duplicate records")
+
+    if self.upload_config["incremental"]:
+      self.content_hash_store.save_content_hashes(self.changed_content_hashes)
+      print(f"{self.changed_record_count} of {self.record_count} records are new or have changed")
     print("Finished executing RecordManager")
 
+  def iter_transformed_records(self, api_records):
+    """
+    Records are checked by self.api_record_validator on the way in, so records which can't be transformed are left out,
+    wherever they come in the response. A mismatch with the field_mapping is only raised if no record has its keys.
+    -> generator : Yields api_records, each transformed by all stages from get_transform_stages
+    """
+    api_records = self.api_record_validator.iter_valid_records(api_records)
+    first_api_record = next(api_records, None)
+    if first_api_record is None:
+      self.validate_some_record_keys()
+      return
+    transform_stages = self.get_transform_stages()
+    api_records = chain([first_api_record], api_records)
+    if self.metrics is None:
+      for api_record in api_records:
+        for transform_stage in transform_stages:
+          api_record = transform_stage(api_record)
+        yield api_record
+      return
+    transform_seconds = 0.0
+    try:
+      for api_record in api_records:
+        start = time.perf_counter()
+        for transform_stage in transform_stages:
+          api_record = transform_stage(api_record)
+        transform_seconds += time.perf_counter() - start
+        yield api_record
+    finally:
+      self.metrics.add("transform_seconds", transform_seconds)
+
+  def report_invalid_records(self):
+    """
+    Prints a report if records had different key sets, or were left out. hash_keys of records left out are added to
+    self.hash_keys, so items already uploaded for them are not deleted as stale records.
+    """
+    report = self.api_record_validator.get_report()
+    if report["heterogeneous_record_count"] or report["invalid_record_count"]:
+      print(f"Validated records for DynamoDB table - {self.dynamo_db_table} - {report}")
+    self.hash_keys.update(self.api_record_validator.invalid_hash_keys)
+
+  def get_transform_stages(self):
+    """
+    The field_mapping and custom_field_info are compiled into a single stage, which removes, renames and nests fields
+    with one dict build per record.
+    -> list : Functions, which each take a single api_record and return it transformed
+    """
+    return [compile_record_transformer(self.field_mapping, self.ssm_value_dict["custom_field_info"], self.timestamp)]
+
+  def validate_some_record_keys(self):
+    """
+    Used once every record has been left out by self.api_record_validator. If none of them had every key in the
+    field_mapping, the most common key set is checked against the field_mapping, which raises a ValueError for the
+    mismatch, as the field_mapping is likely out of date with the source api.
+    """
+    if not self.api_record_validator.record_count or any(self.api_record_validator.valid_shapes.values()):
+      return
+    shape_counts = self.api_record_validator.shape_counts
+    api_record_keys = shape_counts.most_common(1)[0][0] if shape_counts else ()
+    validate_api_record_keys([dict.fromkeys(api_record_keys)], self.field_mapping)
+
+  def iter_records_collecting_hash_keys(self, api_records):
+    """
+    -> generator : Yields api_records unchanged, adding their hash_key values to self.hash_keys
+    """
+    for api_record in api_records:
+      self.hash_keys.add(api_record[self.dynamo_db_table_hash_key])
+      self.record_count += 1
+      yield api_record
+
+  def iter_records_not_duplicated(self, api_records):
+    """
+    -> generator : Yields api_records, leaving out records which self.dedup_index has seen with the same content
+    """
+    for api_record in api_records:
+      if self.dedup_index.is_duplicate(api_record[self.dynamo_db_table_hash_key], api_record):
+        self.duplicate_record_count += 1
+        continue
+      yield api_record
+
+  def add_records_to_sinks(self):
+    """
+    Sinks replace the records they have for checkpoint_unit with the records uploaded for it
+    """
+    start = time.perf_counter()
+    for sink in self.sinks:
+      exported_record_count = sink.add_records(self.checkpoint_unit, self.sink_records)
+      if self.metrics is not None:
+        self.metrics.add("exported_record_count", exported_record_count)
+    if self.metrics is not None and self.sinks:
+      self.metrics.add("export_seconds", time.perf_counter() - start)
+    self.sink_records = []
+
+  def iter_records_collecting_sink_records(self, api_records):
+    """
+    Records are collected before records repeated across letters are dropped, so what sinks get for a letter doesn't
+    depend on other letters, and before unchanged records are left out for incremental uploads, so sinks get every record.
+    -> generator : Yields api_records unchanged, adding them to self.sink_records
+    """
+    for api_record in api_records:
+      self.sink_records.append(api_record)
+      yield api_record
+
+  def collapse_duplicate_hash_keys(self, record_batch):
+    """
+    batch_write_item rejects a batch with more than one request for the same key, so only the last record for each
+    hash_key is kept, in the position of the first.
+    -> list : record_batch
+    """
+    records_by_hash_key = {api_record[self.dynamo_db_table_hash_key]: api_record for api_record in record_batch}
+    if len(records_by_hash_key) == len(record_batch):
+      return record_batch
+    self.duplicate_record_count += len(record_batch) - len(records_by_hash_key)
+    return list(records_by_hash_key.values())
+
   def transform_data_for_upload(self, api_records):
     """
-    -> dict : api_records with fields removed which are not needed. 
+    -> list : api_records with fields removed which are not needed, fields renamed and any ingredients doc prepared. 
     Assumption is made that all fields are the same for all scraped records
     """
-    api_records = self.remove_fields_not_needed(api_records, self.field_mapping)
-    api_records = validate_api_record_keys(api_records, self.field_mapping)
-    api_records = self.rename_fields(api_records, self.field_mapping)
+    return list(self.iter_transformed_records(api_records))
 
-    if "ingredient_max_count" in list(self.ssm_value_dict["custom_field_info"].keys()):
-      api_records = self.prepare_ingredients_doc(api_records, self.ssm_value_dict)
-    return api_records
+  def get_keys_to_remove(self, api_record, field_mapping):
+    """
+    -> list : keys in api_record, which are not in field_mapping
+    """
+    return [key for key in api_record.keys() if key not in field_mapping]
 
   def remove_fields_not_needed(self, api_records, field_mapping):
     """
     -> dict : api_records, with fields removed which are not needed for when
     records are uploaded to Dynamo DB 
     """
-    keys_to_keep = sorted(list((field_mapping.keys())))
-    api_record_keys = sorted(list((api_records[0].keys()))) 
-    keys_to_remove =  list(filter(lambda x: x not in keys_to_keep, api_record_keys))
-    for record in api_records:
-      for key in keys_to_remove:
-          record.pop(key, None)
-    return api_records
+    keys_to_remove = self.get_keys_to_remove(api_records[0], field_mapping)
+    return [self.remove_record_fields_not_needed(api_record, keys_to_remove) for api_record in api_records]
+
+  def remove_record_fields_not_needed(self, api_record, keys_to_remove):
+    for key in keys_to_remove:
+      api_record.pop(key, None)
+    return api_record
   
   def rename_fields(self, api_records, field_mapping):
     """
@@ -61,11 +257,13 @@ class RecordManager:
     A timestamp is also added for records
     -> dict : api_records
     """
-    for record in api_records:
-       for k, v in field_mapping.items():
-         record[v] = record.pop(k)
-         record['timestamp'] = self.timestamp
-    return api_records
+    return [self.rename_record_fields(api_record, field_mapping) for api_record in api_records]
+
+  def rename_record_fields(self, api_record, field_mapping):
+    for k, v in field_mapping.items():
+      api_record[v] = api_record.pop(k)
+    api_record['timestamp'] = self.timestamp
+    return api_record
     
   def prepare_ingredients_doc(self, api_records, ssm_value_dict):
     """
@@ -77,32 +275,73 @@ class RecordManager:
     -> dict : api_records  
     """
     ingredient_max_count = ssm_value_dict["custom_field_info"]["ingredient_max_count"]
+    return [self.prepare_record_ingredients_doc(api_record, ingredient_max_count) for api_record in api_records]
+
+  def prepare_record_ingredients_doc(self, api_record, ingredient_max_count):
+    api_record["ingredients"] = []
+    for x in range(1,ingredient_max_count+1):
+      ingredient_key=f"ingredient_{x}"
+      measure_key=f"measure_{x}"
+      if api_record[ingredient_key] is None or api_record[ingredient_key] == '':
+          api_record.pop(ingredient_key)
+          api_record.pop(measure_key)
+      else:
+          ingredients_dict = {ingredient_key: api_record[ingredient_key],
+                              measure_key: api_record[measure_key]}
+        
+          api_record["ingredients"].append(ingredients_dict)
+          api_record.pop(ingredient_key)
+          api_record.pop(measure_key)
+    return api_record
+
+  def iter_changed_records(self, api_records, content_hash_store, changed_content_hashes):
+    """
+    Stored content hashes are looked up for BATCH_GET_ITEM_SIZE records at a time.
+    params:
+    changed_content_hashes: (dict) : Updated with content hashes for changed records, to be saved after upload
+    -> generator : Yields new or changed api_records
+    """
+    api_records = iter(api_records)
+    while True:
+      api_record_chunk = list(islice(api_records, BATCH_GET_ITEM_SIZE))
+      if not api_record_chunk:
+        return
+      changed_records, content_hashes = self.get_changed_records(api_record_chunk, content_hash_store)
+      changed_content_hashes.update(content_hashes)
+      self.changed_record_count += len(changed_records)
+      yield from changed_records
+
+  def get_changed_records(self, api_records, content_hash_store):
+    """
+    Used when "incremental" is set in upload_config. The content hash for each transformed record is compared 
+    with the hash stored from a previous run, so that only new or changed records are uploaded.
+    -> tuple : (list of new or changed api_records, dict of their hash_key values mapped to content hashes)
+    """
+    content_hashes = {api_record[self.dynamo_db_table_hash_key]: get_record_content_hash(api_record) for api_record in api_records}
+    stored_content_hashes = content_hash_store.get_content_hashes(content_hashes.keys())
+    changed_records = []
     for api_record in api_records:
-      api_record["ingredients"] = []
-      for x in range(1,ingredient_max_count+1):
-        ingredient_key=f"ingredient_{x}"
-        measure_key=f"measure_{x}"
-        if api_record[ingredient_key] is None or api_record[ingredient_key] == '':
-            api_record.pop(ingredient_key)
-            api_record.pop(measure_key)
-        else:
-            ingredients_dict = {ingredient_key: api_record[ingredient_key],
-                                measure_key: api_record[measure_key]}
-          
-            api_record["ingredients"].append(ingredients_dict)
-            api_record.pop(ingredient_key)
-            api_record.pop(measure_key)
-    return api_records
-  
+      hash_key = api_record[self.dynamo_db_table_hash_key]
+      if stored_content_hashes.get(hash_key) != content_hashes[hash_key]:
+        if content_hash_store.adds_content_hash_field:
+          api_record[CONTENT_HASH_FIELD] = content_hashes[hash_key]
+        changed_records.append(api_record)
+    changed_content_hashes = {api_record[self.dynamo_db_table_hash_key]: content_hashes[api_record[self.dynamo_db_table_hash_key]] for api_record in changed_records}
+    return changed_records, changed_content_hashes
+
   def get_record_batches(self, api_records, batch_size):
     """
+    api_records: list or generator of api_records
     batch_size: This is the number of records which will be extracted for batches.
     Only 25 DynamoDB requests can be handled at a time.  
     -> generator : Yields generator object, with batches of api_records 
     """
-    records_length = len(api_records)
-    for i in range(0, records_length, batch_size):
-        yield api_records[i:i + batch_size]
+    api_records = iter(api_records)
+    while True:
+      record_batch = list(islice(api_records, batch_size))
+      if not record_batch:
+        return
+      yield record_batch
 
     
   def get_dynamo_db_delete_request_dict(self, api_record):
@@ -119,11 +358,11 @@ class RecordManager:
   
   def get_dynamo_db_put_request_dict(self, api_record):
     """
-    Constructs a DynamoDB PutRequest.
+    Constructs a DynamoDB PutRequest. Transformed records are CompactRecords until here, where they become item dicts.
     """
     return {
         'PutRequest': {
-            'Item': api_record
+            'Item': api_record.to_dict() if isinstance(api_record, CompactRecord) else api_record
         }
     }
   
@@ -153,20 +392,107 @@ class RecordManager:
       except botocore.exceptions.ClientError as e:
          raise e.with_traceback(e.__traceback__)
 
+  def get_batch_item_group(self, record_batch):
+      """
+      -> list : For the "delete_put" write_mode, DeleteRequests followed by PutRequests for the record_batch,
+      to be sent in that order. For the "upsert" write_mode, only PutRequests are needed, as a PutRequest
+      replaces any item with the same hash_key.
+      """
+      if self.upload_config["write_mode"] == "upsert":
+        return [self.get_batch_items(record_batch, "put")]
+      return [self.get_batch_items(record_batch, "delete"), self.get_batch_items(record_batch, "put")]
+
+  def get_batch_uploader(self, dynamo_db_resource, batch_uploader_class=BatchUploader):
+    return batch_uploader_class(partial(self.upload_batch_to_dynamo_db, dynamo_db_resource),
+                                self.dynamo_db_table,
+                                self.upload_config,
+                                get_write_scheduler(dynamo_db_resource, self.dynamo_db_table, self.upload_config))
+
+  def get_table_hash_keys(self, dynamo_db_resource):
+    """
+    Scans the DynamoDB table, only projecting the hash_key.
+    -> set : hash_key values for all items in the table
+    """
+    table = dynamo_db_resource.Table(self.dynamo_db_table)
+    scan_kwargs = {"ProjectionExpression": "#hash_key",
+                   "ExpressionAttributeNames": {"#hash_key": self.dynamo_db_table_hash_key}}
+    table_hash_keys = set()
+    while True:
+      response = table.scan(**scan_kwargs)
+      table_hash_keys.update(item[self.dynamo_db_table_hash_key] for item in response["Items"])
+      if "LastEvaluatedKey" not in response:
+        return table_hash_keys
+      scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+  def delete_stale_records(self, scraped_hash_keys):
+    """
+    Used with the "upsert" write_mode, once all records for a source api have been uploaded.
+    Items in the DynamoDB table with a hash_key not found in scraped_hash_keys are no longer 
+    available from the source api, so are deleted. 
+    params:
+    scraped_hash_keys: (set) : hash_key values for all records scraped in the run
+    -> dict : Summary of the upload for DeleteRequests
+    """
+    dynamo_db_resource = get_aws_resource('dynamodb')
+    stale_hash_keys = sorted(self.get_table_hash_keys(dynamo_db_resource) - scraped_hash_keys)
+    print(f"Deleting {len(stale_hash_keys)} stale records from DynamoDB table - {self.dynamo_db_table}")
+    stale_records = [{self.dynamo_db_table_hash_key: hash_key} for hash_key in stale_hash_keys]
+    record_batches = self.get_record_batches(stale_records, self.dynamo_db_batch_size)
+    return self.get_batch_uploader(dynamo_db_resource).execute([self.get_batch_items(record_batch, "delete")] for record_batch in record_batches)
+
   def upload_batches_to_dynamo_db(self, record_batches):
     """
     params:
     record_batch: batch of transformed api_records
+    Batches are sent with a BatchUploader, so several batches can be in flight at once.
+    With a checkpoint, batches are numbered in the order they are made, and batches uploaded by a previous run are skipped.
+    This isn't done for incremental uploads, as records uploaded by a previous run are no longer changed, so batches
+    are made up differently, and are skipped by change detection anyway.
+    -> dict : Summary of the upload, including consumed capacity units
+    """
+    batch_uploader = self.get_batch_uploader(get_aws_resource('dynamodb'))
+    print("Starting batch uploads to DynamoDB")
+    upload_summary = batch_uploader.execute(*self.get_batch_item_groups(record_batches))
+    self.report_uploaded_batches(upload_summary)
+    return upload_summary
+
+  async def upload_batches_to_dynamo_db_async(self, record_batches, async_engine):
+    """
+    As upload_batches_to_dynamo_db, with batch_write_item requests sent from the executor of async_engine,
+    no more than max_in_flight at a time for the table across all uploads in the run.
+    -> dict : Summary of the upload, including consumed capacity units
     """
-    dynamo_db_resource = boto3.resource('dynamodb')
-    #dynamo_db_table_resource = dynamo_db_resource.Table(self.dynamo_db_table)
+    batch_uploader = await async_engine.run_in_executor(self.get_batch_uploader, get_aws_resource('dynamodb'), AsyncBatchUploader)
     print("Starting batch uploads to DynamoDB")
-    counter = 1
-    for record_batch in record_batches:
-      print(f'Batch: {counter}')
-      batch_items = self.get_batch_items(record_batch, "delete")
-      self.upload_batch_to_dynamo_db(dynamo_db_resource, batch_items)
-      batch_items = self.get_batch_items(record_batch, "put")
-      self.upload_batch_to_dynamo_db(dynamo_db_resource, batch_items)
-      counter += 1
-      print({"Batch uploaded"})
+    upload_summary = await batch_uploader.execute_async(async_engine, *self.get_batch_item_groups(record_batches))
+    self.report_uploaded_batches(upload_summary)
+    return upload_summary
+
+  def get_batch_item_groups(self, record_batches):
+    """
+    -> tuple : (batch_item_groups, on_group_uploaded), to pass to a BatchUploader. on_group_uploaded records batches
+    in the checkpoint, or is None without one.
+    """
+    if self.checkpoint is None or self.upload_config["incremental"]:
+      return (self.get_batch_item_group(record_batch) for record_batch in record_batches), None
+    batch_indexes = []
+    completed_batches = self.checkpoint.get_completed_batches(self.checkpoint_unit)
+    batch_item_groups = self.iter_batch_item_groups_not_completed(record_batches, completed_batches, batch_indexes)
+    return batch_item_groups, lambda i: self.checkpoint.complete_batch(self.checkpoint_unit, batch_indexes[i])
+
+  def report_uploaded_batches(self, upload_summary):
+    if self.skipped_batch_count:
+      print(f"Skipped {self.skipped_batch_count} batches uploaded by a previous run")
+    print(f"Batches uploaded: {upload_summary}")
+
+  def iter_batch_item_groups_not_completed(self, record_batches, completed_batches, batch_indexes):
+    """
+    -> generator : Yields batch item groups for record_batches whose index is not in completed_batches.
+    The index of each batch yielded is appended to batch_indexes.
+    """
+    for batch_index, record_batch in enumerate(record_batches):
+      if batch_index in completed_batches:
+        self.skipped_batch_count += 1
+        continue
+      batch_indexes.append(batch_index)
+      yield self.get_batch_item_group(record_batch)
@@ -1,10 +1,17 @@
-import boto3
+import time
 import requests
+import threading
 import simplejson as json
 import botocore.exceptions
 import botocore.errorfactory
 
 from modules.utils.validator import SSMValueDictValidator
+from modules.utils.aws_clients import get_aws_client
+from modules.utils.json_stream import iter_json_records
+from modules.utils.rate_limiter import THROTTLE_STATUS_CODES, get_rate_limiter, get_status_codes, get_http_retry_count
+from modules.utils.response_cache import NOT_MODIFIED_MESSAGE, get_body_hash, get_config_hash, get_response_cache
+from modules.utils.ssm_config_cache import DEFAULT_CONFIG_CACHE_TTL, get_ssm_config_cache, validate_config_cache_ttl
+from modules.utils.http_session import get_http_session, get_http_config, get_timeout, mount_http_adapter
 
 
 class Scraper:
@@ -13,9 +20,20 @@ class Scraper:
   There are two major functions that can be executed in succession:
   - get_validated_ssm_value_dict
   """
-  def __init__(self, app, source_api_name):
+  def __init__(self, app, source_api_name, session=None, config_cache_ttl=DEFAULT_CONFIG_CACHE_TTL, config_version=None):
+    """
+    session: (requests.Session) : Defaults to the shared, pooled session from http_session
+    config_cache_ttl: (int) : Seconds ssm parameter values are cached for, across warm invocations. 0 turns caching off.
+    config_version: (int) : If set, a cached ssm parameter older than this version is fetched again
+    """
     self.app = app
     self.source_api_name = source_api_name
+    self.session = session if session is not None else get_http_session()
+    self.config_cache_ttl = validate_config_cache_ttl(config_cache_ttl)
+    self.config_version = config_version
+    self.pending_cached_responses = {}
+    self.unchanged_cached_responses = {}
+    self.pending_cached_responses_lock = threading.Lock()
 
   def get_validated_ssm_value_dict(self):
     """
@@ -27,15 +45,29 @@ class Scraper:
     print(self.source_api_name)
 
     ssm_param = self.get_ssm_parameter_name()
-    ssm_client = boto3.client('ssm')
+    ssm_client = get_aws_client('ssm')
     ssm_value_dict = self.get_ssm_value_dict(ssm_client, ssm_param)
     ssm_value_dict_validator = SSMValueDictValidator(self.source_api_name, ssm_value_dict)
     ssm_value_dict_validator.execute()
     return ssm_value_dict
 
-  def get_ssm_parameter_name(self):
-    ssm_parameter = f"{self.app}--{self.source_api_name}-config"
+  def get_ssm_parameter_name(self, source_api_name=None):
+    ssm_parameter = f"{self.app}--{source_api_name or self.source_api_name}-config"
     return ssm_parameter
+
+  def prefetch_ssm_value_dicts(self, source_api_names):
+    """
+    Fetches ssm parameters for source_api_names into the config cache with get_parameters, so later
+    invocations for those source apis don't need a round trip to SSM. If this fails e.g. because
+    ssm:GetParameters is not allowed, parameters are still fetched one at a time with get_parameter.
+    """
+    ssm_params = [self.get_ssm_parameter_name(source_api_name) for source_api_name in source_api_names]
+    try:
+      fetched_ssm_params = get_ssm_config_cache().prefetch(get_aws_client('ssm'), ssm_params, self.config_cache_ttl)
+      if fetched_ssm_params:
+        print(f"Prefetched ssm parameters - {fetched_ssm_params}")
+    except botocore.exceptions.ClientError as e:
+      print(f"Unable to prefetch ssm parameters, Error - {e}")
   
   def get_ssm_value_dict(self, ssm_client, ssm_param):
     """
@@ -45,9 +77,7 @@ class Scraper:
     -> dict : ssm_value_dict
     """
     try: 
-      response = ssm_client.get_parameter(Name=ssm_param, WithDecryption=True)
-      ssm_value_dict = response["Parameter"]["Value"]
-      ssm_value_dict = json.loads(ssm_value_dict.strip())
+      ssm_value_dict = get_ssm_config_cache().get(ssm_client, ssm_param, self.config_cache_ttl, self.config_version)
       #print(ssm_value_dict)
       return ssm_value_dict
     except botocore.exceptions.ClientError as e:
@@ -59,21 +89,160 @@ class Scraper:
     except json.decoder.JSONDecodeError as e:
       raise ValueError(f'Check JSON format is valid for ssm_param - {ssm_param}, Error - {e}')
     
-  def get_api_records_from_endpoint(self, ssm_value_dict):
+  def mount_http_adapter(self, ssm_value_dict):
+    """
+    Mounts the HTTPAdapter for the host of source_api_endpoint, with the retries and pool size from http_config.
+    Called once, before the endpoints for the source api are scraped, as requests to the host use whichever adapter is mounted.
+    -> HTTPAdapter
+    """
+    return mount_http_adapter(self.session, ssm_value_dict["source_api_endpoint"], get_http_config(ssm_value_dict))
+
+  def get_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
     """
     params:
     ssm_value_dict: (dict) : Has values fetched from AWS parameter store
+    metrics: (UnitMetrics) : If set, fetch_seconds, payload_bytes and parse_seconds are added
     -> list : List of records scraped from api_endpoint
     """
     endpoint = ssm_value_dict["source_api_endpoint"]
-    headers = ssm_value_dict["auth_header"]
+    http_config = get_http_config(ssm_value_dict)
+    cached_response = self.get_cached_response(ssm_value_dict, http_config)
+    headers = self.get_request_headers(ssm_value_dict, cached_response)
     try:
-      r = requests.get(endpoint, headers=headers)
+      r = self.get_response(ssm_value_dict, http_config, headers, metrics)
+      if metrics is not None:
+        metrics.add("payload_bytes", len(r.content))
+      self.check_response_modified(ssm_value_dict, http_config, r, cached_response)
       if r.status_code == 200:
+        start = time.perf_counter()
         api_records = r.json()
+        if metrics is not None:
+          metrics.add("parse_seconds", time.perf_counter() - start)
         return api_records
         # return validate_api_records_exist(api_records,ssm_value_dict)
       else:
         raise Exception(f'Error- status code: {r.status_code} - error message: {r.text}. Was unable to scrape api_records from endpoint - {endpoint}')
     except requests.exceptions.RequestException as e:
-      raise Exception(f'Error: {e}')
\ No newline at end of file
+      raise Exception(f'Error: {e}')
+
+  def iter_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
+    """
+    Used when "stream_records" is set in http_config. The response body is read in chunks of stream_chunk_size bytes
+    and records are parsed one at a time, from the list found under source_api_records_key (or the top level list).
+    With the response cache, only a 304 response can be skipped, as the body is parsed while it is read.
+    params:
+    ssm_value_dict: (dict) : Has values fetched from AWS parameter store
+    metrics: (UnitMetrics) : If set, fetch_seconds (until the response headers are read) and payload_bytes are added
+    -> generator : Yields records scraped from api_endpoint
+    """
+    endpoint = ssm_value_dict["source_api_endpoint"]
+    http_config = get_http_config(ssm_value_dict)
+    cached_response = self.get_cached_response(ssm_value_dict, http_config)
+    headers = self.get_request_headers(ssm_value_dict, cached_response)
+    try:
+      with self.get_response(ssm_value_dict, http_config, headers, metrics, stream=True) as r:
+        self.check_response_modified(ssm_value_dict, http_config, r, cached_response)
+        if r.status_code != 200:
+          raise Exception(f'Error- status code: {r.status_code} - error message: {r.text}. Was unable to scrape api_records from endpoint - {endpoint}')
+        chunks = r.iter_content(chunk_size=http_config["stream_chunk_size"])
+        if metrics is not None:
+          chunks = self.iter_chunks_counting_bytes(chunks, metrics)
+        yield from iter_json_records(chunks, ssm_value_dict["source_api_records_key"])
+    except requests.exceptions.RequestException as e:
+      raise Exception(f'Error: {e}')
+
+  def get_response(self, ssm_value_dict, http_config, headers, metrics=None, stream=False):
+    """
+    Sends a GET request to the endpoint. If "rate_limit" is set in http_config, the request waits for the rate limiter
+    for the source api first, and the status codes and latency are passed back to it, so it can adjust its rate.
+    -> requests.Response
+    """
+    rate_limiter = get_rate_limiter(ssm_value_dict["source_api"], http_config)
+    if rate_limiter is not None:
+      sent_at, wait_seconds = rate_limiter.acquire()
+      if metrics is not None:
+        metrics.add("rate_limit_wait_seconds", wait_seconds)
+    start = time.perf_counter()
+    try:
+      r = self.session.get(ssm_value_dict["source_api_endpoint"], headers=headers, timeout=get_timeout(http_config), stream=stream)
+    except requests.exceptions.RequestException:
+      if rate_limiter is not None:
+        rate_limiter.record_response(sent_at, None, time.perf_counter() - start)
+      raise
+    latency = time.perf_counter() - start
+    if metrics is not None:
+      metrics.add("fetch_seconds", latency)
+      metrics.add("http_retry_count", get_http_retry_count(r))
+    if rate_limiter is not None:
+      status_codes = get_status_codes(r)
+      rate_limiter.record_response(sent_at, status_codes, latency)
+      if metrics is not None:
+        metrics.add("throttled_count", sum(status_code in THROTTLE_STATUS_CODES for status_code in status_codes))
+    return r
+
+  def iter_chunks_counting_bytes(self, chunks, metrics):
+    for chunk in chunks:
+      metrics.add("payload_bytes", len(chunk))
+      yield chunk
+
+  def get_cached_response(self, ssm_value_dict, http_config):
+    """
+    -> dict : response cache entry for the endpoint, or None if there isn't one or the response cache is not used
+    """
+    response_cache = get_response_cache(http_config)
+    if response_cache is None:
+      return None
+    return response_cache.get(ssm_value_dict["source_api_endpoint"], get_config_hash(ssm_value_dict))
+
+  def get_request_headers(self, ssm_value_dict, cached_response):
+    """
+    -> dict : auth_header, with If-None-Match and If-Modified-Since headers from cached_response
+    """
+    headers = dict(ssm_value_dict["auth_header"])
+    if cached_response is not None:
+      if cached_response.get("etag"):
+        headers["If-None-Match"] = cached_response["etag"]
+      if cached_response.get("last_modified"):
+        headers["If-Modified-Since"] = cached_response["last_modified"]
+    return headers
+
+  def check_response_modified(self, ssm_value_dict, http_config, r, cached_response):
+    """
+    Raises a ValueError with NOT_MODIFIED_MESSAGE if the response is a 304, or has the same body as cached_response.
+    Otherwise, a 200 response is kept as pending, until save_cached_response is called once its records are uploaded.
+    The body is only hashed if records are not being streamed.
+    """
+    if get_response_cache(http_config) is None:
+      return
+    endpoint = ssm_value_dict["source_api_endpoint"]
+    body_hash = None if http_config["stream_records"] or r.status_code != 200 else get_body_hash(r.content)
+    if cached_response is not None and (r.status_code == 304 or (body_hash is not None and body_hash == cached_response.get("body_hash"))):
+      with self.pending_cached_responses_lock:
+        self.unchanged_cached_responses[endpoint] = cached_response
+      raise ValueError(NOT_MODIFIED_MESSAGE)
+    if r.status_code != 200:
+      return
+    with self.pending_cached_responses_lock:
+      self.pending_cached_responses[endpoint] = {"etag": r.headers.get("ETag"),
+                                                   "last_modified": r.headers.get("Last-Modified"),
+                                                   "body_hash": body_hash,
+                                                   "config_hash": get_config_hash(ssm_value_dict)}
+
+  def save_cached_response(self, ssm_value_dict, hash_keys, record_count):
+    """
+    Saves the pending response for the endpoint to the response cache, with the hash_keys and record_count uploaded for it.
+    Nothing is saved if there's no pending response e.g. if the response cache is not used.
+    """
+    with self.pending_cached_responses_lock:
+      cached_response = self.pending_cached_responses.pop(ssm_value_dict["source_api_endpoint"], None)
+    if cached_response is None:
+      return
+    cached_response.update({"hash_keys": sorted(hash_keys, key=str), "record_count": record_count})
+    get_response_cache(get_http_config(ssm_value_dict)).put(ssm_value_dict["source_api_endpoint"], cached_response)
+
+  def get_unchanged_response(self, ssm_value_dict):
+    """
+    -> dict : response cache entry for an endpoint which has not changed, with its "hash_keys" and "record_count"
+    """
+    with self.pending_cached_responses_lock:
+      return self.unchanged_cached_responses.pop(ssm_value_dict["source_api_endpoint"])
@@ -1,4 +1,23 @@
 
+import threading
+from modules.utils.scraping_rules import get_scraping_rule
+
+_api_group_indexes = {}
+_api_group_indexes_lock = threading.Lock()
+
+def get_api_group_index(api_mapping):
+  """
+  Built once for each api_mapping, so api groups are found without scanning api_group_mappings each time.
+  -> dict : api_name mapped to api_group
+  """
+  with _api_group_indexes_lock:
+    api_mapping_and_index = _api_group_indexes.get(id(api_mapping))
+    if api_mapping_and_index is None or api_mapping_and_index[0] is not api_mapping:
+      api_group_index = {api_group_mapping["api_name"]: api_group_mapping["api_group"] for api_group_mapping in api_mapping["api_group_mappings"]}
+      api_mapping_and_index = (api_mapping, api_group_index)
+      _api_group_indexes[id(api_mapping)] = api_mapping_and_index
+    return api_mapping_and_index[1]
+
 
 class APIMappingManager:
   """
@@ -17,14 +36,10 @@ class APIMappingManager:
     """
     -> string : Obatining api_group for self.source_api_name can help determine any scraping rules.
     """
-    try:
-      for api_group_mapping in api_mapping["api_group_mappings"]:
-        if api_group_mapping["api_name"] == source_api_name:
-          return api_group_mapping["api_group"]
-
+    api_group_index = get_api_group_index(api_mapping)
+    if source_api_name not in api_group_index:
       raise ValueError(f"api_name not found for source_api_name - {source_api_name}")
-    except KeyError as e:
-      raise e
+    return api_group_index[source_api_name]
     
   def get_api_scraping_rule_dict(self, api_group, api_mapping):
     """
@@ -39,3 +54,9 @@ class APIMappingManager:
       return scraping_rule_dict
     except KeyError as e:
       raise KeyError(f"Error - {e}  - There's no scraping_rule_dict for {api_group}")
+
+  def get_scraping_rule(self, ssm_value_dict, shard=None):
+    """
+    -> ScrapingRule : for self.scraping_rule_dict, from the registry in scraping_rules
+    """
+    return get_scraping_rule(self.scraping_rule_dict, ssm_value_dict, shard)
@@ -0,0 +1,63 @@
+"""
+Registry of boto3 clients and resources. These are created lazily from a single boto3 session,
+and kept at module level so that they are shared by Scraper and RecordManager and survive
+warm Lambda invocations.
+
+In tests, call reset_aws_clients() within a moto mock, so that new clients are created against it,
+or register_aws_client() to swap in a stubbed client.
+"""
+import boto3
+import threading
+
+_boto3_session = None
+_aws_clients = {}
+_lock = threading.Lock()
+
+def get_boto3_session():
+  """
+  -> boto3.session.Session : Created on first use
+  """
+  global _boto3_session
+  with _lock:
+    if _boto3_session is None:
+      _boto3_session = boto3.session.Session()
+    return _boto3_session
+
+def get_aws_client(service_name):
+  """
+  -> botocore client e.g. for "ssm". Clients are thread safe, so can be shared by worker threads.
+  """
+  return _get_or_create(("client", service_name), lambda session: session.client(service_name))
+
+def get_aws_resource(service_name):
+  """
+  -> boto3 service resource e.g. for "dynamodb". Only service level actions e.g. batch_write_item
+  should be called on the shared resource, as these are passed to its thread safe client.
+  """
+  return _get_or_create(("resource", service_name), lambda session: session.resource(service_name))
+
+def register_aws_client(service_name, client, kind="client"):
+  """
+  Replaces the client (or resource where kind is "resource") held for service_name e.g. with a stubbed client in tests.
+  """
+  with _lock:
+    _aws_clients[(kind, service_name)] = client
+
+def reset_aws_clients():
+  """
+  Drops the session and all clients, so they are created again on next use.
+  """
+  global _boto3_session
+  with _lock:
+    _boto3_session = None
+    _aws_clients.clear()
+
+def _get_or_create(key, create):
+  with _lock:
+    if key in _aws_clients:
+      return _aws_clients[key]
+  session = get_boto3_session()
+  with _lock:
+    if key not in _aws_clients:
+      _aws_clients[key] = create(session)
+    return _aws_clients[key]
@@ -0,0 +1,148 @@
+"""
+Checkpoints let a run which stopped part way through e.g. because the lambda timed out, be resumed by the next run,
+when the "checkpoint" option is set in upload_config. Letters for the alphabetical scraping rule (or the single endpoint
+for the default rule), and batches uploaded for each, are recorded as they finish, either in a local JSON file or in an
+item in a DynamoDB table. The checkpoint is cleared once a run finishes, so the following run starts from the beginning.
+"""
+import os
+import threading
+import simplejson as json
+
+CHECKPOINT_STORES = ["manifest", "dynamo_db"]
+CHECKPOINT_ID_FIELD = "checkpoint_id"
+CHECKPOINT_FIELD = "checkpoint"
+# Unit name for the single endpoint scraped with the default scraping rule
+DEFAULT_UNIT = "*"
+
+def get_checkpoint_id(app, source_api_name, shard=None):
+  """
+  -> string : e.g. "fruit-project-api-scraper--the-cocktail-db" or with a shard, "fruit-project-api-scraper--the-cocktail-db--3/8"
+  """
+  checkpoint_id = f"{app}--{source_api_name}"
+  return f"{checkpoint_id}--{shard}" if shard is not None else checkpoint_id
+
+def get_checkpoint_store(upload_config, dynamo_db_resource):
+  """
+  -> ManifestCheckpointStore or DynamoDBCheckpointStore, as per upload_config["checkpoint_store"]
+  """
+  if upload_config["checkpoint_store"] == "dynamo_db":
+    return DynamoDBCheckpointStore(dynamo_db_resource, upload_config["checkpoint_table"])
+  return ManifestCheckpointStore(upload_config["checkpoint_dir"])
+
+def load_checkpoint(upload_config, dynamo_db_resource, checkpoint_id):
+  """
+  -> Checkpoint : with units and batches finished by a previous run which did not finish
+  """
+  checkpoint_store = get_checkpoint_store(upload_config, dynamo_db_resource)
+  checkpoint = Checkpoint(checkpoint_store, checkpoint_id, checkpoint_store.load(checkpoint_id))
+  if checkpoint.completed_units or checkpoint.completed_batches:
+    print(f"Resuming from checkpoint - {checkpoint_id}, with {sorted(checkpoint.completed_units)} finished")
+  return checkpoint
+
+
+class Checkpoint:
+  """
+  Units (letters, or DEFAULT_UNIT) which have finished, and indexes of batches uploaded for units which have not
+  finished yet. Changes are saved straight away, as the run could be stopped at any point.
+  """
+  def __init__(self, checkpoint_store, checkpoint_id, state=None):
+    state = state or {}
+    self.checkpoint_store = checkpoint_store
+    self.checkpoint_id = checkpoint_id
+    self.completed_units = set(state.get("completed_units", []))
+    self.completed_batches = {unit: set(batch_indexes) for unit, batch_indexes in state.get("completed_batches", {}).items()}
+    self.resumed = False
+    self.lock = threading.Lock()
+
+  def is_unit_completed(self, unit):
+    with self.lock:
+      if unit in self.completed_units:
+        self.resumed = True
+        return True
+      return False
+
+  def get_completed_batches(self, unit):
+    """
+    -> set : indexes of batches uploaded for unit
+    """
+    with self.lock:
+      completed_batches = set(self.completed_batches.get(unit, set()))
+      if completed_batches:
+        self.resumed = True
+      return completed_batches
+
+  def complete_batch(self, unit, batch_index):
+    with self.lock:
+      self.completed_batches.setdefault(unit, set()).add(batch_index)
+      self.save()
+
+  def complete_unit(self, unit):
+    with self.lock:
+      self.completed_units.add(unit)
+      self.completed_batches.pop(unit, None)
+      self.save()
+
+  def clear(self):
+    with self.lock:
+      self.completed_units.clear()
+      self.completed_batches.clear()
+      self.checkpoint_store.delete(self.checkpoint_id)
+
+  def save(self):
+    self.checkpoint_store.save(self.checkpoint_id, {"completed_units": sorted(self.completed_units),
+                                                    "completed_batches": {unit: sorted(batch_indexes) for unit, batch_indexes in self.completed_batches.items()}})
+
+
+class ManifestCheckpointStore:
+  """
+  Keeps each checkpoint in a local JSON file e.g. under /tmp in the lambda, or in a directory for local runs
+  """
+  def __init__(self, checkpoint_dir):
+    self.checkpoint_dir = checkpoint_dir
+
+  def get_checkpoint_path(self, checkpoint_id):
+    return os.path.join(self.checkpoint_dir, f"{checkpoint_id.replace('/', '-of-')}.json")
+
+  def load(self, checkpoint_id):
+    checkpoint_path = self.get_checkpoint_path(checkpoint_id)
+    try:
+      with open(checkpoint_path) as checkpoint_file:
+        return json.load(checkpoint_file)
+    except FileNotFoundError:
+      return {}
+    except json.JSONDecodeError:
+      print(f"Checkpoint - {checkpoint_path} is not valid JSON, so the run will start from the beginning")
+      return {}
+
+  def save(self, checkpoint_id, state):
+    checkpoint_path = self.get_checkpoint_path(checkpoint_id)
+    os.makedirs(self.checkpoint_dir, exist_ok=True)
+    temp_checkpoint_path = f"{checkpoint_path}.tmp"
+    with open(temp_checkpoint_path, "w") as checkpoint_file:
+      json.dump(state, checkpoint_file)
+    os.replace(temp_checkpoint_path, checkpoint_path)
+
+  def delete(self, checkpoint_id):
+    try:
+      os.remove(self.get_checkpoint_path(checkpoint_id))
+    except FileNotFoundError:
+      pass
+
+
+class DynamoDBCheckpointStore:
+  """
+  Keeps each checkpoint as an item in checkpoint_table, which has CHECKPOINT_ID_FIELD as its hash key.
+  The state is stored as a JSON string, so batch indexes don't come back as Decimals.
+  """
+  def __init__(self, dynamo_db_resource, checkpoint_table):
+    self.table = dynamo_db_resource.Table(checkpoint_table)
+
+  def load(self, checkpoint_id):
+    item = self.table.get_item(Key={CHECKPOINT_ID_FIELD: checkpoint_id}, ConsistentRead=True).get("Item")
+    return json.loads(item[CHECKPOINT_FIELD]) if item else {}
+
+  def save(self, checkpoint_id, state):
+    self.table.put_item(Item={CHECKPOINT_ID_FIELD: checkpoint_id, CHECKPOINT_FIELD: json.dumps(state)})
+
+  def delete(self, checkpoint_id):
+    self.table.delete_item(Key={CHECKPOINT_ID_FIELD: checkpoint_id})
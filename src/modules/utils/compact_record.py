@@ -0,0 +1,81 @@
+"""
+Compact records, made by the compiled record transformer in place of a dict for each transformed record. A class
+with __slots__ is generated for the keys of the field_mapping, so a record holds one pointer per field, rather than a
+dict with its own hash table. With the ingredient fields of the cocktail and meal schemas, the nested ingredients are
+kept as one flat tuple, and are only built into a list of dicts when they are read.
+
+Records can be read like a dict, so the rest of the RecordManager pipeline e.g. hash keys, content hashes and batching,
+works on them unchanged. They are turned into dicts with to_dict at the write boundary, when PutRequests are made.
+"""
+from operator import attrgetter
+from collections.abc import Mapping
+
+
+def make_compact_record_class(record_keys, expanders=None):
+  """
+  Slots are named _0, _1... so keys don't need to be valid identifiers.
+  params:
+  record_keys: (tuple) : keys of the record, in order. The record is made with a value for each key.
+  expanders: (dict) : keys mapped to functions, which turn the value kept for the key into the value read
+  -> type : subclass of CompactRecord
+  """
+  slots = tuple(f"_{i}" for i in range(len(record_keys)))
+  namespace = {"__slots__": slots,
+               "__module__": __name__,
+               "record_keys": tuple(record_keys),
+               "slot_by_key": dict(zip(record_keys, slots)),
+               "expanders": dict(expanders or {}),
+               "get_values": staticmethod(attrgetter(*slots)) if len(slots) > 1 else staticmethod(lambda record: tuple(getattr(record, slot) for slot in slots))}
+  init_source = f"def __init__(self, {', '.join(slots)}):\n" + "".join(f"  self.{slot} = {slot}\n" for slot in slots) + "  self._extra = None\n"
+  exec(init_source, namespace)
+  return type("CompactRecord", (CompactRecord,), namespace)
+
+
+class CompactRecord(Mapping):
+  """
+  Base for generated record classes. Keys set which are not in record_keys, or which have an expander, are kept in
+  _extra e.g. the content_hash field added for incremental uploads.
+  """
+  __slots__ = ("_extra",)
+  record_keys = ()
+  slot_by_key = {}
+  expanders = {}
+
+  def __getitem__(self, key):
+    if self._extra is not None and key in self._extra:
+      return self._extra[key]
+    slot = self.slot_by_key.get(key)
+    if slot is None:
+      raise KeyError(key)
+    expander = self.expanders.get(key)
+    return getattr(self, slot) if expander is None else expander(getattr(self, slot))
+
+  def __setitem__(self, key, value):
+    if key in self.slot_by_key and key not in self.expanders:
+      setattr(self, self.slot_by_key[key], value)
+      return
+    if self._extra is None:
+      self._extra = {}
+    self._extra[key] = value
+
+  def __iter__(self):
+    yield from self.record_keys
+    if self._extra is not None:
+      yield from (key for key in self._extra if key not in self.slot_by_key)
+
+  def __len__(self):
+    return sum(1 for _ in self)
+
+  def __repr__(self):
+    return f"CompactRecord({self.to_dict()!r})"
+
+  def to_dict(self):
+    """
+    -> dict : the record as a DynamoDB item
+    """
+    item = dict(zip(self.record_keys, self.get_values(self)))
+    for key, expander in self.expanders.items():
+      item[key] = expander(item[key])
+    if self._extra is not None:
+      item.update(self._extra)
+    return item
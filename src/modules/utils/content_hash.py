@@ -0,0 +1,126 @@
+"""
+Content hashes let RecordManager skip uploading records which have not changed since the last run,
+when the "incremental" option is set in upload_config. Hashes are calculated for transformed records,
+leaving out the timestamp, and are either stored on the DynamoDB item as CONTENT_HASH_FIELD,
+or in a local JSON manifest.
+"""
+import os
+import hashlib
+import threading
+import simplejson as json
+
+CONTENT_HASH_FIELD = "content_hash"
+HASH_STORES = ["dynamo_db", "manifest"]
+FIELDS_NOT_HASHED = {"timestamp", CONTENT_HASH_FIELD}
+#https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchGetItem.html
+BATCH_GET_ITEM_SIZE = 100
+
+_manifest_content_hash_stores = {}
+_manifest_content_hash_stores_lock = threading.Lock()
+
+def get_record_content_hash(api_record):
+  """
+  -> string : Hash of the record, which is the same regardless of key order
+  """
+  return get_record_content_digest(api_record).hex()
+
+def get_record_content_digest(api_record, digest_size=16):
+  """
+  -> bytes : digest_size bytes of the hash of the record, leaving out FIELDS_NOT_HASHED
+  """
+  hashed_fields = {k: v for k, v in api_record.items() if k not in FIELDS_NOT_HASHED}
+  serialised_record = json.dumps(hashed_fields, sort_keys=True, separators=(",", ":"), default=str)
+  return hashlib.blake2b(serialised_record.encode("utf-8"), digest_size=digest_size).digest()
+
+def get_content_hash_store(upload_config, dynamo_db_resource, dynamo_db_table, hash_key):
+  """
+  -> DynamoDBContentHashStore or ManifestContentHashStore, as per upload_config["hash_store"]
+  """
+  if upload_config["hash_store"] == "manifest":
+    return get_manifest_content_hash_store(upload_config["hash_manifest_dir"], dynamo_db_table)
+  return DynamoDBContentHashStore(dynamo_db_resource, dynamo_db_table, hash_key)
+
+def get_manifest_content_hash_store(manifest_dir, dynamo_db_table):
+  """
+  A single store is kept per manifest file, so that concurrent letters update the same manifest.
+  """
+  manifest_path = os.path.join(manifest_dir, f"{dynamo_db_table}-content-hashes.json")
+  with _manifest_content_hash_stores_lock:
+    if manifest_path not in _manifest_content_hash_stores:
+      _manifest_content_hash_stores[manifest_path] = ManifestContentHashStore(manifest_path)
+    return _manifest_content_hash_stores[manifest_path]
+
+
+class DynamoDBContentHashStore:
+  """
+  Reads content hashes stored on items in the DynamoDB table. Hashes are saved when records are put,
+  as CONTENT_HASH_FIELD is added to each record.
+  """
+  adds_content_hash_field = True
+
+  def __init__(self, dynamo_db_resource, dynamo_db_table, hash_key):
+    self.dynamo_db_resource = dynamo_db_resource
+    self.dynamo_db_table = dynamo_db_table
+    self.hash_key = hash_key
+
+  def get_content_hashes(self, hash_keys):
+    """
+    -> dict : hash_key values mapped to stored content hashes, for items which exist in the table
+    """
+    hash_keys = list(hash_keys)
+    content_hashes = {}
+    for i in range(0, len(hash_keys), BATCH_GET_ITEM_SIZE):
+      request_items = {self.dynamo_db_table: {
+                        "Keys": [{self.hash_key: hash_key} for hash_key in hash_keys[i:i + BATCH_GET_ITEM_SIZE]],
+                        "ProjectionExpression": "#hash_key, #content_hash",
+                        "ExpressionAttributeNames": {"#hash_key": self.hash_key, "#content_hash": CONTENT_HASH_FIELD}}}
+      while request_items:
+        response = self.dynamo_db_resource.batch_get_item(RequestItems=request_items)
+        for item in response["Responses"].get(self.dynamo_db_table, []):
+          content_hashes[item[self.hash_key]] = item.get(CONTENT_HASH_FIELD)
+        request_items = response.get("UnprocessedKeys", {})
+    return content_hashes
+
+  def save_content_hashes(self, content_hashes):
+    """
+    Nothing to do, as content hashes are uploaded with the records.
+    """
+
+
+class ManifestContentHashStore:
+  """
+  Keeps content hashes in a local JSON file e.g. under /tmp in the lambda, which lasts for as long as the
+  lambda stays warm. Hashes are only saved once records have been uploaded.
+  """
+  adds_content_hash_field = False
+
+  def __init__(self, manifest_path):
+    self.manifest_path = manifest_path
+    self.lock = threading.Lock()
+    self.content_hashes = self.load_manifest()
+
+  def load_manifest(self):
+    try:
+      with open(self.manifest_path) as manifest_file:
+        return json.load(manifest_file)
+    except FileNotFoundError:
+      return {}
+    except json.JSONDecodeError:
+      print(f"Content hash manifest - {self.manifest_path} is not valid JSON, so it will be replaced")
+      return {}
+
+  def get_content_hashes(self, hash_keys):
+    """
+    Keys in JSON are always strings, so hash_key values are looked up as strings.
+    """
+    with self.lock:
+      return {hash_key: self.content_hashes[str(hash_key)] for hash_key in hash_keys if str(hash_key) in self.content_hashes}
+
+  def save_content_hashes(self, content_hashes):
+    with self.lock:
+      self.content_hashes.update({str(hash_key): content_hash for hash_key, content_hash in content_hashes.items()})
+      os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+      temp_manifest_path = f"{self.manifest_path}.tmp"
+      with open(temp_manifest_path, "w") as manifest_file:
+        json.dump(self.content_hashes, manifest_file)
+      os.replace(temp_manifest_path, self.manifest_path)
@@ -0,0 +1,43 @@
+"""
+Run-wide deduplication of records by hash_key, used unless "deduplicate" is turned off in upload_config. With the
+alphabetical scraping rule, the same record can turn up under more than one letter, and each copy would otherwise be
+deleted and put again.
+
+The index is shared by every letter in a run, and keeps a short digest of the content of the last record seen for each
+hash_key, rather than the record. A repeat with the same content is dropped before batching, as the copy already
+uploaded is the same. A repeat with different content is kept, and its digest replaces the one in the index. Each copy
+with different content is uploaded, so with letters uploaded one after another, and max_in_flight of 1, the last
+occurrence is the one left in the table. When letters, or batches in a letter, are uploaded concurrently, the writes
+race, so which of those copies is left in the table is not deterministic.
+"""
+import threading
+from modules.utils.content_hash import get_record_content_digest
+
+DEDUP_DIGEST_SIZE = 8
+
+
+class DedupIndex:
+  """
+  Thread safe, as letters are uploaded concurrently. duplicate_count is the number of records dropped as repeats.
+  """
+  def __init__(self):
+    self.digests = {}
+    self.duplicate_count = 0
+    self.lock = threading.Lock()
+
+  def is_duplicate(self, hash_key, api_record):
+    """
+    -> bool : True if the last record seen for hash_key has the same content as api_record. Otherwise, api_record is
+    recorded as the last record seen for hash_key. With concurrent letters, "last" is the order records reach the index.
+    """
+    digest = get_record_content_digest(api_record, DEDUP_DIGEST_SIZE)
+    with self.lock:
+      if self.digests.get(hash_key) == digest:
+        self.duplicate_count += 1
+        return True
+      self.digests[hash_key] = digest
+      return False
+
+  def __len__(self):
+    with self.lock:
+      return len(self.digests)
@@ -0,0 +1,143 @@
+"""
+A single requests.Session is kept at module level, so that pooled keep-alive connections
+are reused across scrapes and across warm Lambda invocations. Each source api gets its own
+HTTPAdapter, mounted for the scheme and host of its endpoint, with retry and pool settings
+taken from the optional "http_config" in the ssm_value_dict.
+"""
+import threading
+import requests
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HTTP_CONFIG = {
+  "connect_timeout": 3.05,
+  "read_timeout": 10,
+  "max_retries": 3,
+  "backoff_factor": 0.5,
+  "backoff_max": 4,
+  "backoff_jitter": 0.5,
+  "retry_after_max": 5,
+  "pool_maxsize": 10,
+  "status_forcelist": [429, 500, 502, 503, 504],
+  "stream_records": False,
+  "stream_chunk_size": 65536,
+  "response_cache": False,
+  "response_cache_dir": "/tmp/response-cache",
+  "response_cache_max_bytes": 10485760,
+  "rate_limit": False,
+  "rate_limit_initial_rate": 5,
+  "rate_limit_min_rate": 0.5,
+  "rate_limit_max_rate": 20,
+  "rate_limit_burst": 5,
+  "rate_limit_increase": 0.5,
+  "rate_limit_decrease_factor": 0.5,
+  "rate_limit_latency_target": 2
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class CappedRetry(Retry):
+  """
+  Retry which honours the Retry-After header, but never sleeps for longer than retry_after_max seconds,
+  as the lambda would otherwise time out waiting on a source api.
+  """
+  def __init__(self, *args, retry_after_max=DEFAULT_HTTP_CONFIG["retry_after_max"], **kwargs):
+    super().__init__(*args, **kwargs)
+    self.retry_after_max = retry_after_max
+
+  def new(self, **kwargs):
+    retry = super().new(**kwargs)
+    retry.retry_after_max = self.retry_after_max
+    return retry
+
+  def get_retry_after(self, response):
+    retry_after = super().get_retry_after(response)
+    if retry_after is None:
+      return None
+    return min(retry_after, self.retry_after_max)
+
+
+def get_http_session():
+  """
+  -> requests.Session : Shared session, created on first use.
+  """
+  global _session
+  with _session_lock:
+    if _session is None:
+      _session = requests.Session()
+    return _session
+
+def reset_http_session():
+  """
+  Closes and drops the shared session e.g. between tests.
+  """
+  global _session
+  with _session_lock:
+    if _session is not None:
+      _session.close()
+    _session = None
+
+def get_http_config(ssm_value_dict):
+  """
+  -> dict : DEFAULT_HTTP_CONFIG, updated with any values from the "http_config" in ssm_value_dict
+  """
+  http_config = dict(DEFAULT_HTTP_CONFIG)
+  http_config.update(ssm_value_dict.get("http_config", {}))
+  return http_config
+
+def get_timeout(http_config):
+  """
+  -> tuple : (connect_timeout, read_timeout), as expected by requests
+  """
+  return (http_config["connect_timeout"], http_config["read_timeout"])
+
+def get_retry(http_config):
+  """
+  -> CappedRetry : Retries GET requests for connection errors, read errors and statuses in status_forcelist,
+  with jittered exponential backoff. The last response is returned once retries run out, so the status
+  code can be reported by the scraper.
+  """
+  return CappedRetry(total=http_config["max_retries"],
+                     backoff_factor=http_config["backoff_factor"],
+                     backoff_max=http_config["backoff_max"],
+                     backoff_jitter=http_config["backoff_jitter"],
+                     status_forcelist=http_config["status_forcelist"],
+                     allowed_methods=["GET"],
+                     respect_retry_after_header=True,
+                     raise_on_status=False,
+                     retry_after_max=http_config["retry_after_max"])
+
+def get_endpoint_prefix(endpoint):
+  """
+  -> string : e.g. "https://www.thecocktaildb.com/" for "https://www.thecocktaildb.com/api/json/v1/1/search.php?f=a"
+  """
+  split_endpoint = urlsplit(endpoint)
+  return f"{split_endpoint.scheme}://{split_endpoint.netloc}/"
+
+def mount_http_adapter(session, endpoint, http_config):
+  """
+  Mounts an HTTPAdapter for the host of the endpoint, unless one has already been mounted with the same http_config.
+  Adapters are mounted once for each source api before its endpoints are scraped, not for each request. session.adapters
+  is replaced rather than changed in place, as requests for other source apis may be reading it at the same time.
+  -> HTTPAdapter
+  """
+  prefix = get_endpoint_prefix(endpoint)
+  with _session_lock:
+    adapter = session.adapters.get(prefix)
+    if adapter is not None and getattr(adapter, "http_config", None) == http_config:
+      return adapter
+    adapter = HTTPAdapter(pool_connections=1,
+                          pool_maxsize=http_config["pool_maxsize"],
+                          max_retries=get_retry(http_config))
+    adapter.http_config = http_config
+    adapters = OrderedDict(session.adapters)
+    adapters[prefix] = adapter
+    #As requests.Session.mount, longer prefixes are kept first, so they are matched first
+    for shorter_prefix in [key for key in adapters if len(key) < len(prefix)]:
+      adapters[shorter_prefix] = adapters.pop(shorter_prefix)
+    session.adapters = adapters
+    return adapter
@@ -0,0 +1,116 @@
+"""
+Incremental parsing of api responses, so that records can be yielded one at a time while the
+response body is still being read, instead of holding the whole body and the parsed object in memory.
+Records are expected either in a top level list, or in a list under a top level records key e.g. {"drinks": [...]}.
+"""
+import codecs
+import simplejson as json
+
+WHITESPACE = " \t\n\r"
+
+
+class JSONStreamReader:
+  """
+  Reads JSON values from an iterable of byte chunks. Only the text which has not been parsed yet is buffered.
+  """
+  def __init__(self, chunks):
+    self.chunks = iter(chunks)
+    self.decoder = json.JSONDecoder()
+    self.utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    self.buffer = ""
+    self.pos = 0
+    self.exhausted = False
+
+  def fill(self):
+    """
+    -> bool : False once there are no more chunks to read
+    """
+    if self.exhausted:
+      return False
+    self.buffer = self.buffer[self.pos:]
+    self.pos = 0
+    try:
+      chunk = next(self.chunks)
+      self.buffer += self.utf8_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    except StopIteration:
+      self.buffer += self.utf8_decoder.decode(b"", final=True)
+      self.exhausted = True
+    return True
+
+  def peek(self):
+    """
+    -> string : Next character which is not whitespace, or "" at the end of the stream
+    """
+    while True:
+      while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+        self.pos += 1
+      if self.pos < len(self.buffer):
+        return self.buffer[self.pos]
+      if not self.fill():
+        return ""
+
+  def expect(self, characters):
+    character = self.peek()
+    if character == "" or character not in characters:
+      raise json.JSONDecodeError(f"Expecting one of {characters!r}", self.buffer, self.pos)
+    self.pos += 1
+    return character
+
+  def read_value(self):
+    """
+    -> Next complete JSON value. A value is only accepted once the character after it has been read,
+    as a number at the end of the buffer could otherwise be cut short.
+    """
+    self.peek()
+    while True:
+      try:
+        value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        if end < len(self.buffer) or self.exhausted:
+          self.pos = end
+          return value
+      except json.JSONDecodeError:
+        if self.exhausted:
+          raise
+      self.fill()
+
+
+def iter_json_records(chunks, records_key=""):
+  """
+  params:
+  chunks: (iterable) : bytes or strings making up a JSON document
+  records_key: (string) : Top level key for the list of records. If empty, the document should be a list.
+  -> generator : Yields each record. Nothing is yielded if the list is empty or the records_key is null.
+  """
+  reader = JSONStreamReader(chunks)
+  if records_key:
+    if not seek_records_key(reader, records_key):
+      return
+  elif reader.peek() == "n":
+    reader.read_value()
+    return
+  reader.expect("[")
+  if reader.peek() == "]":
+    return
+  while True:
+    yield reader.read_value()
+    if reader.expect(",]") == "]":
+      return
+
+def seek_records_key(reader, records_key):
+  """
+  Moves the reader to the value for records_key in the top level object, skipping values for other keys.
+  -> bool : False if the value for records_key is null
+  """
+  reader.expect("{")
+  while reader.peek() != "}":
+    key = reader.read_value()
+    reader.expect(":")
+    if key == records_key:
+      if reader.peek() == "n":
+        reader.read_value()
+        return False
+      return True
+    reader.read_value()
+    if reader.expect(",}") == "}":
+      break
+  raise KeyError(records_key)
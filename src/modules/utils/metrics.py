@@ -0,0 +1,142 @@
+"""
+Structured metrics for a run, emitted as one log line per unit (a letter for the alphabetical scraping rule, or
+the single endpoint for the default rule) and one for the whole run. Lines are either plain JSON, or CloudWatch
+Embedded Metric Format (EMF), which CloudWatch turns into metrics from the lambda's logs without any API calls.
+
+With EMF, source_api and scope ("unit" or "run") are the only dimensions, so the number of custom metrics does not
+grow with the letters. The unit and app are included in each line as properties, so they can still be queried with Logs Insights.
+"""
+import time
+import threading
+import simplejson as json
+from contextlib import contextmanager
+
+METRICS_FORMATS = ["json", "emf", "none"]
+METRICS_NAMESPACE = "fruit-project-api-scraper"
+METRIC_UNITS = {
+  "fetch_seconds": "Seconds",
+  "parse_seconds": "Seconds",
+  "transform_seconds": "Seconds",
+  "upload_seconds": "Seconds",
+  "unit_seconds": "Seconds",
+  "config_seconds": "Seconds",
+  "scrape_seconds": "Seconds",
+  "prune_seconds": "Seconds",
+  "total_seconds": "Seconds",
+  "rate_limit_wait_seconds": "Seconds",
+  "payload_bytes": "Bytes",
+  "record_count": "Count",
+  "batch_count": "Count",
+  "request_count": "Count",
+  "retry_count": "Count",
+  "http_retry_count": "Count",
+  "consumed_capacity_units": "None",
+  "skipped_batch_count": "Count",
+  "not_modified_count": "Count",
+  "throttled_count": "Count",
+  "throttle_count": "Count",
+  "invalid_record_count": "Count",
+  "duplicate_record_count": "Count",
+  "exported_record_count": "Count",
+  "export_seconds": "Seconds",
+  "unit_count": "Count"
+}
+UPLOAD_SUMMARY_METRICS = ["batch_count", "request_count", "retry_count", "consumed_capacity_units", "throttle_count"]
+
+def validate_metrics_format(metrics_format):
+  if metrics_format not in METRICS_FORMATS:
+    raise ValueError(f"metrics_format should be one of {METRICS_FORMATS}. metrics_format is {metrics_format}")
+  return metrics_format
+
+
+class UnitMetrics:
+  """
+  Metrics added up for one unit. Adding is thread safe, as records for a unit are uploaded by several threads.
+  """
+  def __init__(self):
+    self.values = {}
+    self.lock = threading.Lock()
+
+  def add(self, name, value):
+    with self.lock:
+      self.values[name] = self.values.get(name, 0) + value
+
+  @contextmanager
+  def time(self, name):
+    """
+    Adds the seconds spent in the with block to the metric name
+    """
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add(name, time.perf_counter() - start)
+
+  def add_upload_summary(self, upload_summary):
+    for name in UPLOAD_SUMMARY_METRICS:
+      if name in upload_summary:
+        self.add(name, upload_summary[name])
+
+  def get_values(self):
+    with self.lock:
+      return dict(self.values)
+
+
+class RunMetrics:
+  """
+  Holds UnitMetrics for each unit, and run level metrics e.g. total_seconds, for a source api
+  """
+  def __init__(self, app, source_api_name, metrics_format="json", emit=print):
+    """
+    emit: (callable) : Called with each log line, print by default so lines end up in CloudWatch Logs
+    """
+    self.app = app
+    self.source_api_name = source_api_name
+    self.metrics_format = validate_metrics_format(metrics_format)
+    self.emit = emit
+    self.run_metrics = UnitMetrics()
+    self.unit_metrics = {}
+    self.lock = threading.Lock()
+
+  def get_unit_metrics(self, unit):
+    with self.lock:
+      if unit not in self.unit_metrics:
+        self.unit_metrics[unit] = UnitMetrics()
+      return self.unit_metrics[unit]
+
+  def time(self, name):
+    return self.run_metrics.time(name)
+
+  def add(self, name, value):
+    self.run_metrics.add(name, value)
+
+  def emit_unit_metrics(self, unit):
+    self.emit_metrics(self.get_unit_metrics(unit).get_values(), {"scope": "unit", "unit": unit})
+
+  def emit_run_metrics(self):
+    """
+    Run metrics include totals of unit metrics other than timings, which overlap when units run concurrently
+    """
+    values = {}
+    with self.lock:
+      unit_metrics = list(self.unit_metrics.values())
+    for metrics in unit_metrics:
+      for name, value in metrics.get_values().items():
+        if not name.endswith("_seconds"):
+          values[name] = values.get(name, 0) + value
+    values["unit_count"] = len(unit_metrics)
+    values.update(self.run_metrics.get_values())
+    self.emit_metrics(values, {"scope": "run"})
+    return values
+
+  def emit_metrics(self, values, properties):
+    if self.metrics_format == "none":
+      return
+    line = dict({"app": self.app, "source_api": self.source_api_name}, **properties)
+    line.update({name: round(value, 6) if isinstance(value, float) else value for name, value in values.items()})
+    if self.metrics_format == "emf":
+      line["_aws"] = {"Timestamp": int(time.time() * 1000),
+                      "CloudWatchMetrics": [{"Namespace": METRICS_NAMESPACE,
+                                             "Dimensions": [["source_api", "scope"]],
+                                             "Metrics": [{"Name": name, "Unit": METRIC_UNITS.get(name, "None")} for name in values]}]}
+    self.emit(json.dumps(line))
@@ -0,0 +1,125 @@
+"""
+Client side rate limiting for source apis, used when "rate_limit" is set in http_config. Each source api gets a
+token bucket, shared by every thread scraping it e.g. letters scraped concurrently, and kept across warm invocations.
+
+The rate adapts to how the source api is coping (additive increase, multiplicative decrease). Every healthy response
+raises the rate by rate_limit_increase requests per second, up to rate_limit_max_rate. A 429 or 503, including one
+retried by the HTTP adapter, a connection error, or a response slower than rate_limit_latency_target, cuts the rate by
+rate_limit_decrease_factor, down to rate_limit_min_rate. Responses to requests sent before the last cut don't cut the
+rate again, so a burst of throttled requests in flight at the same time only backs off once.
+"""
+import time
+import threading
+
+THROTTLE_STATUS_CODES = [429, 503]
+RATE_LIMIT_CONFIG_KEYS = ["rate_limit_initial_rate", "rate_limit_min_rate", "rate_limit_max_rate", "rate_limit_burst",
+                          "rate_limit_increase", "rate_limit_decrease_factor", "rate_limit_latency_target"]
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(source_api_name, http_config):
+  """
+  A rate limiter is created again if the rate_limit settings in http_config change.
+  -> AdaptiveRateLimiter : for source_api_name, or None if "rate_limit" is not set in http_config
+  """
+  if not http_config["rate_limit"]:
+    return None
+  rate_limit_config = {key: http_config[key] for key in RATE_LIMIT_CONFIG_KEYS}
+  with _rate_limiters_lock:
+    rate_limiter = _rate_limiters.get(source_api_name)
+    if rate_limiter is None or rate_limiter.rate_limit_config != rate_limit_config:
+      rate_limiter = AdaptiveRateLimiter(rate_limit_config)
+      _rate_limiters[source_api_name] = rate_limiter
+    return rate_limiter
+
+def reset_rate_limiters():
+  """
+  Drops rate limiters e.g. between tests, so rates learnt by one test are not used by the next.
+  """
+  with _rate_limiters_lock:
+    _rate_limiters.clear()
+
+def get_status_codes(response):
+  """
+  -> list : status codes of responses retried by the HTTP adapter, followed by the status code of response
+  """
+  retries = getattr(getattr(response, "raw", None), "retries", None)
+  history = getattr(retries, "history", None) or ()
+  return [request_history.status for request_history in history if request_history.status is not None] + [response.status_code]
+
+def get_http_retry_count(response):
+  """
+  -> int : requests retried by the HTTP adapter before response, for retried statuses and for connection or read errors
+  """
+  retries = getattr(getattr(response, "raw", None), "retries", None)
+  return len(getattr(retries, "history", None) or ())
+
+
+class AdaptiveRateLimiter:
+  """
+  Token bucket holding up to rate_limit_burst tokens, refilled at self.rate tokens per second. A request takes a token,
+  and waits for one if the bucket is empty. Tokens are reserved before waiting, so the lock is not held while sleeping.
+  """
+  def __init__(self, rate_limit_config, clock=time.monotonic, sleep=time.sleep):
+    self.rate_limit_config = rate_limit_config
+    self.rate = rate_limit_config["rate_limit_initial_rate"]
+    self.min_rate = rate_limit_config["rate_limit_min_rate"]
+    self.max_rate = rate_limit_config["rate_limit_max_rate"]
+    self.burst = rate_limit_config["rate_limit_burst"]
+    self.increase = rate_limit_config["rate_limit_increase"]
+    self.decrease_factor = rate_limit_config["rate_limit_decrease_factor"]
+    self.latency_target = rate_limit_config["rate_limit_latency_target"]
+    self.clock = clock
+    self.sleep = sleep
+    self.tokens = self.burst
+    self.updated_at = clock()
+    self.decreased_at = None
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    """
+    Takes a token, sleeping until it is available.
+    -> tuple : (sent_at, wait_seconds), where sent_at is passed to record_response once the response is received
+    """
+    wait_seconds = self.reserve()
+    if wait_seconds > 0:
+      self.sleep(wait_seconds)
+    return self.clock(), wait_seconds
+
+  def reserve(self):
+    """
+    Takes a token without sleeping, e.g. for the asyncio engine, which sleeps on the event loop instead.
+    -> float : seconds to wait before sending the request
+    """
+    with self.lock:
+      self.refill()
+      self.tokens -= 1
+      return -self.tokens / self.rate if self.tokens < 0 else 0
+
+  def refill(self):
+    now = self.clock()
+    self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+    self.updated_at = now
+
+  def record_response(self, sent_at, status_codes, latency):
+    """
+    params:
+    sent_at: (float) : from acquire
+    status_codes: (list) : from get_status_codes, or None if the request failed e.g. with a connection error
+    latency: (float) : seconds until the response was received
+    -> bool : True if the rate was cut
+    """
+    healthy = status_codes is not None and not set(status_codes) & set(THROTTLE_STATUS_CODES) and latency <= self.latency_target
+    with self.lock:
+      self.refill()
+      if healthy:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+        return False
+      if self.decreased_at is not None and sent_at < self.decreased_at:
+        return False
+      self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+      self.tokens = min(self.tokens, 0)
+      self.decreased_at = self.clock()
+      print(f"Rate limit cut to {self.rate:.2f} requests per second - status codes: {status_codes}, latency: {latency:.2f} seconds")
+      return True
@@ -0,0 +1,56 @@
+"""
+Compiles the field_mapping and custom_field_info from an ssm_value_dict into a single function, which
+builds each transformed record in one go, as a CompactRecord, instead of removing, renaming and nesting
+fields key by key for every record.
+"""
+from modules.utils.compact_record import make_compact_record_class
+
+def compile_record_transformer(field_mapping, custom_field_info, timestamp):
+  """
+  Key tuples, and the compact record class, are worked out once here, rather than for every record.
+  params:
+  field_mapping: (dict) : api record keys mapped to new keys
+  custom_field_info: (dict) : if "ingredient_max_count" is found, ingredient and measure fields are nested
+  in an "ingredients" list, as per RecordManager.prepare_ingredients_doc
+  timestamp: (string) : added to every record
+  -> function : Takes a scraped api_record and returns a new, transformed CompactRecord. Raises a KeyError if the
+  api_record is missing a key from field_mapping.
+  """
+  ingredient_max_count = custom_field_info.get("ingredient_max_count")
+  if not ingredient_max_count:
+    keys = get_mapped_source_keys(field_mapping, {"timestamp"})
+    record_class = make_compact_record_class(tuple(keys) + ("timestamp",))
+    source_keys = tuple(keys.values())
+
+    def transform_record(api_record):
+      return record_class(*[api_record[key] for key in source_keys], timestamp)
+    return transform_record
+
+  mapped_keys_by_new_key = {new_key: key for key, new_key in field_mapping.items()}
+  ingredient_keys = tuple((mapped_keys_by_new_key[f"ingredient_{x}"], f"ingredient_{x}",
+                           mapped_keys_by_new_key[f"measure_{x}"], f"measure_{x}")
+                          for x in range(1, ingredient_max_count + 1))
+  nested_new_keys = {new_key for _, ingredient_key, _, measure_key in ingredient_keys for new_key in (ingredient_key, measure_key)}
+  keys = get_mapped_source_keys(field_mapping, nested_new_keys | {"timestamp", "ingredients"})
+  record_class = make_compact_record_class(tuple(keys) + ("timestamp", "ingredients"), {"ingredients": expand_ingredients})
+  source_keys = tuple(keys.values())
+
+  def transform_record_with_ingredients(api_record):
+    ingredients = []
+    for key, ingredient_key, measure_source_key, measure_key in ingredient_keys:
+      if api_record[key] is not None and api_record[key] != '':
+        ingredients += (ingredient_key, api_record[key], measure_key, api_record[measure_source_key])
+    return record_class(*[api_record[key] for key in source_keys], timestamp, tuple(ingredients))
+  return transform_record_with_ingredients
+
+def get_mapped_source_keys(field_mapping, new_keys_left_out):
+  """
+  -> dict : new keys mapped to api record keys, in field_mapping order. If keys are mapped to the same new key, the last is used.
+  """
+  return {new_key: key for key, new_key in field_mapping.items() if new_key not in new_keys_left_out}
+
+def expand_ingredients(ingredients):
+  """
+  -> list : e.g. [{"ingredient_1": "Gin", "measure_1": "2 oz"}], from the flat tuple kept in the compact record
+  """
+  return [{ingredients[i]: ingredients[i + 1], ingredients[i + 2]: ingredients[i + 3]} for i in range(0, len(ingredients), 4)]
@@ -0,0 +1,105 @@
+"""
+On-disk cache of api responses, used when "response_cache" is set in http_config. For each endpoint, the ETag and
+Last-Modified headers and a hash of the body are kept, so requests can be made conditional with If-None-Match and
+If-Modified-Since. If the source api returns 304, or the same body as before, the endpoint is not parsed,
+transformed or uploaded again.
+
+Bodies are not kept, so entries are small. The hash_keys and number of records uploaded for the endpoint are kept
+instead, so that unchanged endpoints still count towards the records scraped in a run e.g. for the "upsert" write mode.
+Entries are only saved once records for the endpoint have been uploaded, and are dropped least recently used first
+once the cache is larger than max_bytes.
+"""
+import os
+import hashlib
+import threading
+import simplejson as json
+
+NOT_MODIFIED_MESSAGE = "The api response has not changed since the last run"
+
+_response_caches = {}
+_response_caches_lock = threading.Lock()
+
+def get_response_cache(http_config):
+  """
+  A single cache is kept per directory, so that letters scraped concurrently share it.
+  -> ResponseCache : or None if "response_cache" is not set in http_config
+  """
+  if not http_config["response_cache"]:
+    return None
+  cache_dir = http_config["response_cache_dir"]
+  with _response_caches_lock:
+    if cache_dir not in _response_caches:
+      _response_caches[cache_dir] = ResponseCache(cache_dir, http_config["response_cache_max_bytes"])
+    _response_caches[cache_dir].max_bytes = http_config["response_cache_max_bytes"]
+    return _response_caches[cache_dir]
+
+def get_body_hash(body):
+  return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def get_config_hash(ssm_value_dict):
+  """
+  -> string : Hash of the ssm_value_dict. If the config changes e.g. the field_mapping, records should be
+  transformed and uploaded again, even if the response hasn't changed.
+  """
+  serialised_config = json.dumps(ssm_value_dict, sort_keys=True, separators=(",", ":"))
+  return hashlib.blake2b(serialised_config.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+  """
+  Entries are JSON files in cache_dir, named by a hash of the endpoint, so api keys in endpoints are not written to disk.
+  The modified time of each file is updated when it is read, to find the least recently used entries.
+  """
+  def __init__(self, cache_dir, max_bytes):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.lock = threading.Lock()
+
+  def get_entry_path(self, endpoint):
+    return os.path.join(self.cache_dir, f"{hashlib.sha256(endpoint.encode('utf-8')).hexdigest()}.json")
+
+  def get(self, endpoint, config_hash):
+    """
+    -> dict : entry for endpoint, or None if there isn't one for the same config_hash
+    """
+    entry_path = self.get_entry_path(endpoint)
+    with self.lock:
+      try:
+        with open(entry_path) as entry_file:
+          entry = json.load(entry_file)
+        os.utime(entry_path)
+      except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return entry if entry.get("config_hash") == config_hash else None
+
+  def put(self, endpoint, entry):
+    entry_path = self.get_entry_path(endpoint)
+    with self.lock:
+      os.makedirs(self.cache_dir, exist_ok=True)
+      temp_entry_path = f"{entry_path}.tmp"
+      with open(temp_entry_path, "w") as entry_file:
+        json.dump(entry, entry_file)
+      os.replace(temp_entry_path, entry_path)
+      self.evict()
+
+  def evict(self):
+    """
+    Deletes least recently used entries until the cache is no larger than max_bytes
+    """
+    entries = []
+    for entry_name in os.listdir(self.cache_dir):
+      if entry_name.endswith(".json"):
+        entry_stat = os.stat(os.path.join(self.cache_dir, entry_name))
+        entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry_name))
+    cache_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry_name in sorted(entries):
+      if cache_bytes <= self.max_bytes:
+        break
+      os.remove(os.path.join(self.cache_dir, entry_name))
+      cache_bytes -= size
+
+  def clear(self):
+    with self.lock:
+      if os.path.isdir(self.cache_dir):
+        for entry_name in os.listdir(self.cache_dir):
+          os.remove(os.path.join(self.cache_dir, entry_name))
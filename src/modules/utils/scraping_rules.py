@@ -0,0 +1,222 @@
+"""
+Scraping rules turn the endpoint of a source api into the endpoints to scrape, one unit at a time e.g. a letter for the
+alphabetical scraping rule, or a page. The rule for a source api is given by its api_group in APIMapping, and its "type"
+is looked up in SCRAPING_RULES, so a new kind of pagination only needs a class registered with register_scraping_rule,
+rather than changes to the Orchestrator.
+
+Units are yielded lazily, once the previous unit has been scraped when units are scraped one after another. So a rule
+can decide on the next endpoint from the previous one, e.g. stopping once a page has fewer than page_size records, or
+following a cursor from the response.
+"""
+from urllib.parse import quote
+from modules.utils.checkpoint import DEFAULT_UNIT
+from modules.utils.http_session import get_http_config
+from modules.utils.shard_planner import get_shard_letters, is_first_shard
+
+SCRAPING_RULES = {}
+DEFAULT_MAX_PAGES = 1000
+
+def register_scraping_rule(scraping_rule_type):
+  """
+  Class decorator, adding a ScrapingRule subclass to SCRAPING_RULES for scraping_rule_type
+  """
+  def register(scraping_rule_class):
+    scraping_rule_class.type = scraping_rule_type
+    SCRAPING_RULES[scraping_rule_type] = scraping_rule_class
+    return scraping_rule_class
+  return register
+
+def get_scraping_rule(scraping_rule_dict, ssm_value_dict, shard=None):
+  """
+  params:
+  scraping_rule_dict: (dict) : e.g. { "query": "?f=", "type": "alphabetical"}
+  ssm_value_dict: (dict) : source_api_endpoint is the endpoint the scraping rule builds on
+  shard: (string) : See shard_planner
+  -> ScrapingRule
+  """
+  scraping_rule_class = SCRAPING_RULES.get(scraping_rule_dict.get("type"))
+  if scraping_rule_class is None:
+    raise ValueError(f"Scraping rule type - {scraping_rule_dict.get('type')} is not supported. Supported types are {sorted(SCRAPING_RULES)}")
+  return scraping_rule_class(scraping_rule_dict, ssm_value_dict, shard)
+
+
+class ScrapingRule:
+  """
+  Subclasses implement iter_endpoints, and optionally record_unit and record_api_response to decide on later endpoints.
+  concurrent: (bool) : Units don't depend on each other, so can be scraped at the same time
+  resumable: (bool) : Units finished by a previous run can be skipped, when a run is resumed from a checkpoint
+  record_counts_key: (string) : If set, records scraped for each unit are kept in the Orchestrator summary under this key
+  replayable: (bool) : Units can be replayed from snapshots, as they don't depend on responses other than record counts
+  """
+  type = None
+  concurrent = True
+  resumable = True
+  replayable = True
+  record_counts_key = None
+
+  def __init__(self, scraping_rule_dict, ssm_value_dict, shard=None):
+    self.scraping_rule_dict = scraping_rule_dict
+    self.ssm_value_dict = ssm_value_dict
+    self.shard = shard
+    self.base_endpoint = ssm_value_dict["source_api_endpoint"]
+    self.query = scraping_rule_dict.get("query", "")
+
+  def iter_units(self):
+    """
+    -> generator : Yields (unit, ssm_value_dict with source_api_endpoint set to the endpoint for the unit)
+    """
+    for unit, endpoint in self.iter_endpoints():
+      yield unit, dict(self.ssm_value_dict, source_api_endpoint=endpoint)
+
+  def iter_endpoints(self):
+    """
+    -> generator : Yields (unit, endpoint)
+    """
+    raise NotImplementedError
+
+  def is_scraped_by_shard(self):
+    """
+    Rules which don't split units between shards are only applied by the first shard, so they are scraped once per run
+    """
+    if is_first_shard(self.shard):
+      return True
+    print(f"Skipping {self.ssm_value_dict['source_api']} for shard {self.shard}, as it is only scraped by the first shard")
+    return False
+
+  def record_unit(self, unit, record_count):
+    """
+    Called with the number of records scraped once a unit has been scraped and uploaded
+    """
+
+  def record_api_response(self, unit, api_response):
+    """
+    Called with the parsed response for a unit, before api_records are taken from it. Not called when records are streamed,
+    or when the response has not changed since the last run.
+    """
+
+
+@register_scraping_rule("default")
+class DefaultScrapingRule(ScrapingRule):
+  """
+  Scrapes all records from the single endpoint
+  """
+  def iter_endpoints(self):
+    if self.is_scraped_by_shard():
+      yield DEFAULT_UNIT, self.base_endpoint
+
+
+@register_scraping_rule("alphabetical")
+class AlphabeticalScrapingRule(ScrapingRule):
+  """
+  Scrapes records from <endpoint><query><letter> for each letter of the alphabet, or the letters for the shard
+  """
+  record_counts_key = "letter_record_counts"
+
+  def iter_endpoints(self):
+    letters = get_shard_letters(self.shard, self.ssm_value_dict.get("letter_record_counts"))
+    if self.shard is not None:
+      print(f"Scraping letters {letters} for shard {self.shard}")
+    for letter in letters:
+      yield letter, self.base_endpoint + self.query + letter
+
+
+@register_scraping_rule("numeric_range")
+class NumericRangeScrapingRule(ScrapingRule):
+  """
+  Scrapes records from <endpoint><query><value><page_size_query><page_size>, for values from start, going up by step.
+  Stops before stop if it is set, after a page with no records, or fewer than page_size records, or after max_pages pages.
+  e.g. { "type": "numeric_range", "query": "?page=", "start": 1, "page_size": 50, "page_size_query": "&per_page=" }
+  Pages are only scraped at the same time if stop is set, as otherwise the last page is only known once it has been scraped.
+  """
+  def __init__(self, scraping_rule_dict, ssm_value_dict, shard=None):
+    super().__init__(scraping_rule_dict, ssm_value_dict, shard)
+    self.start = scraping_rule_dict.get("start", 0)
+    self.step = scraping_rule_dict.get("step", 1)
+    self.stop = scraping_rule_dict.get("stop")
+    self.page_size = scraping_rule_dict.get("page_size")
+    self.page_size_query = scraping_rule_dict.get("page_size_query", "")
+    self.max_pages = scraping_rule_dict.get("max_pages", DEFAULT_MAX_PAGES)
+    self.concurrent = self.stop is not None
+    self.finished = False
+    for key in ["start", "step", "stop", "page_size", "max_pages"]:
+      value = getattr(self, key)
+      if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ValueError(f"Check scraping rule values - {key} should be an integer. {key} is {value}")
+    if self.step < 1:
+      raise ValueError(f"Check scraping rule values - step should be 1 or more. step is {self.step}")
+
+  def iter_endpoints(self):
+    if not self.is_scraped_by_shard():
+      return
+    value = self.start
+    for _ in range(self.max_pages):
+      if self.finished or (self.stop is not None and value >= self.stop):
+        return
+      yield str(value), self.get_endpoint(value)
+      value += self.step
+
+  def get_endpoint(self, value):
+    endpoint = f"{self.base_endpoint}{self.query}{value}"
+    if self.page_size is not None and self.page_size_query:
+      endpoint = f"{endpoint}{self.page_size_query}{self.page_size}"
+    return endpoint
+
+  def record_unit(self, unit, record_count):
+    if record_count == 0 or (self.page_size is not None and record_count < self.page_size):
+      self.finished = True
+
+
+@register_scraping_rule("offset")
+class OffsetScrapingRule(NumericRangeScrapingRule):
+  """
+  Numeric range of offsets, starting at 0 and going up by page_size, which must be set
+  e.g. { "type": "offset", "query": "?offset=", "page_size": 100, "page_size_query": "&limit=" }
+  """
+  def __init__(self, scraping_rule_dict, ssm_value_dict, shard=None):
+    if not scraping_rule_dict.get("page_size"):
+      raise ValueError("Check scraping rule values - page_size should be set for the offset scraping rule")
+    scraping_rule_dict = dict({"start": 0, "step": scraping_rule_dict["page_size"]}, **scraping_rule_dict)
+    super().__init__(scraping_rule_dict, ssm_value_dict, shard)
+
+
+@register_scraping_rule("cursor")
+class CursorScrapingRule(ScrapingRule):
+  """
+  Scrapes the endpoint, then <endpoint><query><cursor> with the cursor found under cursor_key in each response,
+  until a response has no cursor, or after max_pages pages.
+  e.g. { "type": "cursor", "query": "?cursor=", "cursor_key": "next_cursor" }
+  Each page needs the cursor from the one before, so pages are scraped one after another, and are scraped again
+  when a run is resumed from a checkpoint. Records can't be streamed, as the cursor is read from the parsed response.
+  With the response cache, scraping stops at a page which has not changed, as there is no response to read the cursor from.
+  Snapshots only keep records, not cursors, so pages can't be replayed.
+  """
+  concurrent = False
+  resumable = False
+  replayable = False
+
+  def __init__(self, scraping_rule_dict, ssm_value_dict, shard=None):
+    super().__init__(scraping_rule_dict, ssm_value_dict, shard)
+    if not scraping_rule_dict.get("cursor_key"):
+      raise ValueError("Check scraping rule values - cursor_key should be set for the cursor scraping rule")
+    if get_http_config(ssm_value_dict)["stream_records"]:
+      raise ValueError("Check http_config values - stream_records can't be used with the cursor scraping rule")
+    self.cursor_key = scraping_rule_dict["cursor_key"]
+    self.max_pages = scraping_rule_dict.get("max_pages", DEFAULT_MAX_PAGES)
+    self.cursor = None
+
+  def iter_endpoints(self):
+    if not self.is_scraped_by_shard():
+      return
+    endpoint = self.base_endpoint
+    cursors = set()
+    for page in range(1, self.max_pages + 1):
+      self.cursor = None
+      yield f"page-{page}", endpoint
+      if self.cursor is None or self.cursor in cursors:
+        return
+      cursors.add(self.cursor)
+      endpoint = f"{self.base_endpoint}{self.query}{quote(str(self.cursor), safe='')}"
+
+  def record_api_response(self, unit, api_response):
+    if isinstance(api_response, dict):
+      self.cursor = api_response.get(self.cursor_key) or None
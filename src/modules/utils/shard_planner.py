@@ -0,0 +1,79 @@
+"""
+Splits the letters for the alphabetical scraping rule into shards, so that a source api can be scraped
+by several Lambda invocations or local processes, each handling a share of the alphabet.
+
+A shard is either numbered e.g. "3/8" (the third of 8 shards), or an explicit set of letters e.g. "a-f" or "a-c,x,y".
+Numbered shards are planned from letter_record_counts, so that each shard gets a similar number of records.
+Every invocation plans from the same counts, so the shards don't overlap and between them cover every letter.
+"""
+import re
+from string import ascii_lowercase as alphabet
+
+NUMBERED_SHARD_PATTERN = re.compile(r"^(\d+)/(\d+)$")
+LETTER_RANGE_PATTERN = re.compile(r"^([a-z])(?:-([a-z]))?$")
+
+
+def parse_shard(shard):
+  """
+  params:
+  shard: (string) : e.g. "3/8" or "a-f", or None for every letter
+  -> tuple : (shard_index, shard_count) for a numbered shard, starting at 1, or (letters, None) for letters
+  Raises a ValueError if the shard can't be parsed.
+  """
+  if shard is None:
+    return list(alphabet), None
+  if not isinstance(shard, str):
+    raise ValueError(f"shard should be a string e.g. '3/8' or 'a-f'. shard is {shard}")
+  match = NUMBERED_SHARD_PATTERN.match(shard.strip())
+  if match:
+    shard_index, shard_count = int(match.group(1)), int(match.group(2))
+    if not 1 <= shard_index <= shard_count:
+      raise ValueError(f"shard index should be between 1 and the number of shards. shard is {shard}")
+    return shard_index, shard_count
+  letters = set()
+  for letter_range in shard.lower().split(","):
+    match = LETTER_RANGE_PATTERN.match(letter_range.strip())
+    if not match or (match.group(2) and match.group(2) < match.group(1)):
+      raise ValueError(f"shard should be e.g. '3/8' or a range of letters e.g. 'a-f' or 'a-c,x,y'. shard is {shard}")
+    first, last = match.group(1), match.group(2) or match.group(1)
+    letters.update(alphabet[alphabet.index(first):alphabet.index(last) + 1])
+  return sorted(letters), None
+
+def plan_shards(shard_count, letter_record_counts=None):
+  """
+  Letters are taken from the most records to the fewest, each going to the shard with the fewest records so far.
+  Letters without a count are given the average count, so with no counts, letters are spread evenly.
+  params:
+  shard_count: (int)
+  letter_record_counts: (dict) : letters mapped to the number of records scraped for them in a previous run
+  -> list : shard_count lists of letters, in alphabetical order
+  """
+  letter_record_counts = letter_record_counts or {}
+  default_count = sum(letter_record_counts.values()) / len(letter_record_counts) if letter_record_counts else 1
+  weights = {letter: letter_record_counts.get(letter, default_count) for letter in alphabet}
+  shards = [[] for _ in range(shard_count)]
+  shard_record_counts = [0] * shard_count
+  for letter in sorted(alphabet, key=lambda letter: (-weights[letter], letter)):
+    i = min(range(shard_count), key=lambda i: (shard_record_counts[i], len(shards[i]), i))
+    shards[i].append(letter)
+    shard_record_counts[i] += weights[letter]
+  return [sorted(letters) for letters in shards]
+
+def get_shard_letters(shard, letter_record_counts=None):
+  """
+  -> list : letters to scrape for shard
+  """
+  shard_index, shard_count = parse_shard(shard)
+  if shard_count is None:
+    return shard_index
+  return plan_shards(shard_count, letter_record_counts)[shard_index - 1]
+
+def is_first_shard(shard):
+  """
+  Source apis which are not scraped by letter are only scraped by the first shard, so they are scraped once per run.
+  -> bool : True if shard is None, a numbered shard 1, or letters including "a"
+  """
+  shard_index, shard_count = parse_shard(shard)
+  if shard_count is None:
+    return alphabet[0] in shard_index
+  return shard_index == 1
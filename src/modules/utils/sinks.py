@@ -0,0 +1,195 @@
+"""
+Sinks take the transformed records for a source api, alongside the uploads to DynamoDB, e.g. to export a copy of the
+catalogue for analytics. Sinks are listed under "sinks" in upload_config, and each "type" is looked up in SINKS, so a
+new sink only needs a class registered with register_sink.
+
+A sink is kept for the whole run, and shared by every letter. Sinks write what they are given for each letter (or unit)
+separately, replacing what was written for that letter before, as soon as RecordManager has uploaded it. Letters which
+are not uploaded in a run e.g. unchanged responses with the response cache, letters finished before a run was resumed
+from a checkpoint, or letters scraped by other shards, keep what was written for them by an earlier run, so the export
+always covers every letter. A letter with no records is written as empty.
+"""
+import os
+import threading
+import importlib.util
+from urllib.parse import quote
+from modules.utils.checkpoint import DEFAULT_UNIT
+import simplejson as json
+from modules.utils.record_transformer import get_mapped_source_keys
+
+DEFAULT_UNIT_FILE_NAME = "all"
+
+SINKS = {}
+
+def register_sink(sink_type):
+  """
+  Class decorator, adding a RecordSink subclass to SINKS for sink_type
+  """
+  def register(sink_class):
+    sink_class.type = sink_type
+    SINKS[sink_type] = sink_class
+    return sink_class
+  return register
+
+def get_sinks(upload_config, ssm_value_dict, export_name):
+  """
+  params:
+  upload_config: (dict) : "sinks" lists the sink types e.g. ["parquet"]
+  export_name: (string) : Name for what the sinks write for the source api e.g. the source api name
+  -> list : RecordSinks
+  """
+  sinks = []
+  for sink_type in upload_config["sinks"]:
+    if sink_type not in SINKS:
+      raise ValueError(f"Sink type - {sink_type} is not supported. Supported types are {sorted(SINKS)}")
+    sinks.append(SINKS[sink_type](upload_config, ssm_value_dict, export_name))
+  return sinks
+
+def get_unit_file_name(unit):
+  """
+  -> string : e.g. "a" for a letter, or "all" for the default scraping rule
+  """
+  return DEFAULT_UNIT_FILE_NAME if unit == DEFAULT_UNIT else quote(unit, safe="")
+
+
+class RecordSink:
+  """
+  Subclasses implement write_unit. add_records keeps the last record for each hash_key in a unit, and is thread safe,
+  as letters are uploaded concurrently.
+  """
+  type = None
+
+  def __init__(self, upload_config, ssm_value_dict, export_name):
+    self.upload_config = upload_config
+    self.hash_key = ssm_value_dict["dynamo_db_config"]["hash_key"]
+    self.export_name = export_name
+    self.record_count = 0
+    self.lock = threading.Lock()
+
+  def add_records(self, unit, api_records):
+    """
+    -> int : Number of records written for the unit
+    """
+    records = list({api_record[self.hash_key]: api_record for api_record in api_records}.values())
+    record_count = self.write_unit(unit, records)
+    with self.lock:
+      self.record_count += record_count
+    return record_count
+
+  def write_unit(self, unit, api_records):
+    """
+    Replaces anything written for unit by an earlier run with api_records, which may be empty
+    -> int : Number of records written
+    """
+    raise NotImplementedError
+
+  def close(self):
+    """
+    -> int : Number of records written in the run
+    """
+    return self.record_count
+
+
+@register_sink("parquet")
+class ParquetSink(RecordSink):
+  """
+  Writes the records for each unit to <parquet_path>/<export_name>/<unit>.parquet with pyarrow, so the directory can be
+  read as one Parquet dataset. A unit with no records has its file removed. parquet_path is a local directory, or an
+  s3:// uri. For S3 compatible storage, parquet_endpoint_url is passed to pyarrow's S3FileSystem.
+  Every file is written with the same schema, from get_schema, rather than one inferred from the records for the unit,
+  as a column which is all null for one letter, or ingredients with fewer fields, would otherwise give files which
+  can't be read together.
+  pyarrow is only imported when a ParquetSink is made, so it is not needed unless the sink is used.
+  """
+  def __init__(self, upload_config, ssm_value_dict, export_name):
+    super().__init__(upload_config, ssm_value_dict, export_name)
+    if importlib.util.find_spec("pyarrow") is None:
+      raise ImportError("pyarrow is needed for the parquet sink")
+    self.path = f"{upload_config['parquet_path'].rstrip('/')}/{quote(export_name, safe='')}"
+    self.filesystem = self.get_filesystem()
+    self.schema = self.get_schema(ssm_value_dict)
+
+  def write_unit(self, unit, api_records):
+    import pyarrow.parquet as pq
+    path = self.get_unit_path(unit)
+    if not api_records:
+      self.remove_unit_file(path)
+      return 0
+    table = self.get_table(api_records)
+    if self.filesystem is None:
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      temporary_path = f"{path}.tmp"
+      pq.write_table(table, temporary_path)
+      os.replace(temporary_path, path)
+    else:
+      pq.write_table(table, path, filesystem=self.filesystem)
+    print(f"Wrote {table.num_rows} records to {path}")
+    return table.num_rows
+
+  def remove_unit_file(self, path):
+    from pyarrow import fs
+    if self.filesystem is None:
+      if os.path.exists(path):
+        os.remove(path)
+    elif self.filesystem.get_file_info(path).type != fs.FileType.NotFound:
+      self.filesystem.delete_file(path)
+
+  def get_unit_path(self, unit):
+    """
+    -> string : local path, or the path within the S3 filesystem, for an s3:// parquet_path
+    """
+    path = f"{self.path}/{get_unit_file_name(unit)}.parquet"
+    return path if self.filesystem is None else path[len("s3://"):]
+
+  def get_schema(self, ssm_value_dict):
+    """
+    Fields from the field_mapping are strings, as the source apis don't give types, with values which aren't strings
+    written as JSON. With "ingredient_max_count" in custom_field_info, ingredients are a list of
+    {"ingredient", "measure"} structs, in place of the numbered ingredient and measure fields.
+    -> pyarrow.Schema : with the fields of records transformed for ssm_value_dict, in the order they are built
+    """
+    import pyarrow as pa
+    field_mapping = ssm_value_dict["field_mapping"]
+    ingredient_max_count = ssm_value_dict["custom_field_info"].get("ingredient_max_count")
+    nested_keys = {f"{key}_{x}" for key in ("ingredient", "measure") for x in range(1, (ingredient_max_count or 0) + 1)}
+    fields = [pa.field(key, pa.string()) for key in get_mapped_source_keys(field_mapping, nested_keys | {"timestamp", "ingredients"})]
+    fields.append(pa.field("timestamp", pa.string()))
+    if ingredient_max_count:
+      fields.append(pa.field("ingredients", pa.list_(pa.struct([("ingredient", pa.string()), ("measure", pa.string())]))))
+    return pa.schema(fields)
+
+  def get_table(self, records):
+    """
+    -> pyarrow.Table : with self.schema, leaving out any keys of records which are not in it e.g. the content_hash field
+    """
+    import pyarrow as pa
+    columns = {}
+    for name in self.schema.names:
+      if name == "ingredients":
+        columns[name] = [self.get_ingredients_value(api_record.get(name)) for api_record in records]
+      else:
+        columns[name] = [self.get_string_value(api_record.get(name)) for api_record in records]
+    return pa.Table.from_pydict(columns, schema=self.schema)
+
+  def get_string_value(self, value):
+    if value is None or isinstance(value, str):
+      return value
+    return json.dumps(value)
+
+  def get_ingredients_value(self, ingredients):
+    """
+    -> list : e.g. [{"ingredient": "Gin", "measure": "2 oz"}] for [{"ingredient_1": "Gin", "measure_1": "2 oz"}]
+    """
+    if ingredients is None:
+      return None
+    return [dict(zip(("ingredient", "measure"), map(self.get_string_value, ingredient.values()))) for ingredient in ingredients]
+
+  def get_filesystem(self):
+    """
+    -> pyarrow S3FileSystem for an s3:// parquet_path, or None for a local directory
+    """
+    if not self.path.startswith("s3://"):
+      return None
+    from pyarrow import fs
+    endpoint_url = self.upload_config["parquet_endpoint_url"]
+    return fs.S3FileSystem(endpoint_override=endpoint_url) if endpoint_url else fs.S3FileSystem()
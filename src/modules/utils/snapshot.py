@@ -0,0 +1,71 @@
+"""
+Snapshots of scraped api records, so a scrape can be replayed later without calling the source apis, e.g. to
+reprocess records, or for load tests. With the "record" snapshot mode, the records scraped for each unit (a letter
+for the alphabetical scraping rule) are written as gzipped JSON Lines to <snapshot_dir>/<source_api>/<unit>.jsonl.gz,
+as they are uploaded. With the "replay" mode, the Orchestrator reads records from those files instead of the source api,
+and they go through the same validation, transforms and uploads.
+
+Records are kept as they were found under source_api_records_key, before they are transformed, so a replay picks up any
+changes to the field_mapping. The Parquet sink can be used to export transformed records instead. A file is only in
+place once every record for the unit has been written, so a failed unit doesn't leave a partial snapshot. With the
+response cache, a unit whose response has not changed keeps the snapshot from when it was last recorded.
+"""
+import os
+import gzip
+import simplejson as json
+from urllib.parse import quote
+from modules.utils.checkpoint import DEFAULT_UNIT
+
+SNAPSHOT_MODES = ["record", "replay"]
+DEFAULT_SNAPSHOT_DIR = "/tmp/snapshots"
+DEFAULT_UNIT_FILE_NAME = "all"
+#Faster than gzip's default of 9, for much the same size with JSON
+SNAPSHOT_COMPRESSLEVEL = 6
+
+def validate_snapshot_mode(snapshot_mode):
+  if snapshot_mode is not None and snapshot_mode not in SNAPSHOT_MODES:
+    raise ValueError(f"snapshot_mode should be one of {SNAPSHOT_MODES}, or None. snapshot_mode is {snapshot_mode}")
+  return snapshot_mode
+
+def get_snapshot_path(snapshot_dir, source_api, unit):
+  """
+  -> string : e.g. "/tmp/snapshots/the-cocktail-db/a.jsonl.gz"
+  """
+  file_name = DEFAULT_UNIT_FILE_NAME if unit == DEFAULT_UNIT else quote(unit, safe="")
+  return os.path.join(snapshot_dir, quote(source_api, safe=""), f"{file_name}.jsonl.gz")
+
+def iter_snapshot_records(snapshot_path):
+  """
+  -> generator : Yields records from a snapshot, one line at a time. Raises a FileNotFoundError if there's no snapshot.
+  """
+  if not os.path.exists(snapshot_path):
+    raise FileNotFoundError(f"No snapshot has been recorded at {snapshot_path}")
+  with gzip.open(snapshot_path, "rt", encoding="utf-8") as snapshot_file:
+    for line in snapshot_file:
+      yield json.loads(line)
+
+def iter_records_writing_snapshot(api_records, snapshot_path):
+  """
+  The snapshot is written to a temporary file, which replaces snapshot_path once api_records run out,
+  or is removed if they aren't all read.
+  -> generator : Yields api_records unchanged, writing each to the snapshot
+  """
+  os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+  temporary_path = f"{snapshot_path}.{os.getpid()}.tmp"
+  completed = False
+  try:
+    with gzip.open(temporary_path, "wt", encoding="utf-8", compresslevel=SNAPSHOT_COMPRESSLEVEL) as snapshot_file:
+      for api_record in api_records:
+        snapshot_file.write(json.dumps(api_record, separators=(",", ":")) + "\n")
+        yield api_record
+    os.replace(temporary_path, snapshot_path)
+    completed = True
+  finally:
+    if not completed and os.path.exists(temporary_path):
+      os.remove(temporary_path)
+
+def write_snapshot(api_records, snapshot_path):
+  """
+  -> int : Number of records written
+  """
+  return sum(1 for _ in iter_records_writing_snapshot(api_records, snapshot_path))
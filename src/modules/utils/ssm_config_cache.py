@@ -0,0 +1,107 @@
+"""
+Cache of SSM parameter values, kept at module level so that it survives warm Lambda invocations.
+When the state machine runs sources back to back, each parameter is fetched from SSM once per ttl,
+instead of once per invocation, and config for every source can be prefetched with one get_parameters call.
+
+Entries are refetched when they are older than ttl seconds, or older than a parameter version the caller asks for.
+In tests, call reset_ssm_config_cache() so that values cached under one moto mock are not seen by another.
+"""
+import time
+import threading
+import simplejson as json
+from copy import deepcopy
+
+DEFAULT_CONFIG_CACHE_TTL = 300
+GET_PARAMETERS_MAX_NAMES = 10
+
+
+class SSMConfigCache:
+  """
+  Holds the raw value, version and fetch time for each parameter name. Values are parsed as JSON
+  on first use, so that an invalid parameter for one source does not stop others being prefetched.
+  """
+  def __init__(self, clock=time.monotonic):
+    self.clock = clock
+    self.entries = {}
+    self.lock = threading.Lock()
+
+  def get(self, ssm_client, name, ttl=DEFAULT_CONFIG_CACHE_TTL, min_version=None):
+    """
+    params:
+    ssm_client: Relates to AWS SSM Client
+    name: The name of the parameter to retrieve from SSM Parameter Store.
+    ttl: (int) : Seconds an entry can be used for. 0 means the parameter is always fetched.
+    min_version: (int) : If the cached entry has an older version, the parameter is fetched again.
+    -> dict : A copy of the parsed value, so callers can't change the cached value. Raises a
+    JSONDecodeError if the value is not valid JSON.
+    """
+    entry = self.get_fresh_entry(name, ttl, min_version)
+    if entry is None:
+      response = ssm_client.get_parameter(Name=name, WithDecryption=True)
+      entry = self.put(response["Parameter"])
+    with self.lock:
+      if entry["value"] is None:
+        entry["value"] = json.loads(entry["raw_value"].strip())
+      return deepcopy(entry["value"])
+
+  def prefetch(self, ssm_client, names, ttl=DEFAULT_CONFIG_CACHE_TTL):
+    """
+    Fetches names which are not cached, or have expired, with get_parameters, up to GET_PARAMETERS_MAX_NAMES
+    per call. Names not found in SSM are left out, so get() will raise for them as before.
+    -> list : names which were fetched
+    """
+    if ttl <= 0:
+      return []
+    names = [name for name in dict.fromkeys(names) if self.get_fresh_entry(name, ttl) is None]
+    for i in range(0, len(names), GET_PARAMETERS_MAX_NAMES):
+      response = ssm_client.get_parameters(Names=names[i:i + GET_PARAMETERS_MAX_NAMES], WithDecryption=True)
+      for parameter in response["Parameters"]:
+        self.put(parameter)
+    return names
+
+  def get_fresh_entry(self, name, ttl, min_version=None):
+    """
+    -> dict : cache entry for name, or None if it is missing, older than ttl seconds or older than min_version
+    """
+    validate_config_cache_ttl(ttl)
+    with self.lock:
+      entry = self.entries.get(name)
+    if entry is None or self.clock() - entry["fetched_at"] >= ttl:
+      return None
+    if min_version is not None and entry["version"] < min_version:
+      print(f"Cached version {entry['version']} of {name} is older than version {min_version}")
+      return None
+    return entry
+
+  def put(self, parameter):
+    """
+    parameter: (dict) : "Parameter" from a get_parameter response, or one of the "Parameters" from get_parameters
+    """
+    entry = {"raw_value": parameter["Value"], "value": None, "version": parameter["Version"], "fetched_at": self.clock()}
+    with self.lock:
+      self.entries[parameter["Name"]] = entry
+    return entry
+
+  def invalidate(self, name=None):
+    """
+    Drops the entry for name, or every entry if name is None
+    """
+    with self.lock:
+      if name is None:
+        self.entries.clear()
+      else:
+        self.entries.pop(name, None)
+
+
+_ssm_config_cache = SSMConfigCache()
+
+def get_ssm_config_cache():
+  return _ssm_config_cache
+
+def reset_ssm_config_cache():
+  _ssm_config_cache.invalidate()
+
+def validate_config_cache_ttl(ttl):
+  if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl < 0:
+    raise ValueError(f"config_cache_ttl should be a number of seconds, 0 or more. config_cache_ttl is {ttl}")
+  return ttl
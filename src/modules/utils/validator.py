@@ -1,4 +1,13 @@
+from decimal import Decimal
 from datetime import datetime
+from collections import Counter
+from string import ascii_lowercase as alphabet
+from modules.batch_uploader import DEFAULT_UPLOAD_CONFIG, WRITE_MODES
+from modules.utils.http_session import DEFAULT_HTTP_CONFIG
+from modules.utils.content_hash import HASH_STORES
+from modules.utils.checkpoint import CHECKPOINT_STORES
+from modules.utils.rate_limiter import RATE_LIMIT_CONFIG_KEYS
+from modules.utils.sinks import SINKS
 
 class SSMValueDictValidator:
   """
@@ -12,6 +21,15 @@ class SSMValueDictValidator:
     self.validate_source_api_name_in_ssm_value_dict(self.source_api_name, self.ssm_value_dict)
     self.validate_ssm_value_dict_types(self.ssm_value_dict)
     self.validate_ssm_value_dict_dynamo_db_keys(self.ssm_value_dict)
+    self.validate_ssm_value_dict_optional_config(self.ssm_value_dict, "http_config", DEFAULT_HTTP_CONFIG)
+    self.validate_ssm_value_dict_optional_config(self.ssm_value_dict, "upload_config", DEFAULT_UPLOAD_CONFIG)
+    self.validate_ssm_value_dict_write_mode(self.ssm_value_dict)
+    self.validate_ssm_value_dict_hash_store(self.ssm_value_dict)
+    self.validate_ssm_value_dict_checkpoint_store(self.ssm_value_dict)
+    self.validate_ssm_value_dict_rate_limit(self.ssm_value_dict)
+    self.validate_ssm_value_dict_write_capacity(self.ssm_value_dict)
+    self.validate_ssm_value_dict_sinks(self.ssm_value_dict)
+    self.validate_ssm_value_dict_letter_record_counts(self.ssm_value_dict)
 
   def validate_source_api_name_in_ssm_value_dict(self, source_api_name, ssm_value_dict):
     print("source_api")
@@ -24,6 +42,65 @@ class SSMValueDictValidator:
     if sorted(list(ssm_value_dict["dynamo_db_config"].keys())) != dynamo_db_keys:
       raise ValueError(f"Check dynamo_db_config values - {dynamo_db_keys} is populated")
 
+  def validate_ssm_value_dict_optional_config(self, ssm_value_dict, config_key, default_config):
+    """
+    Optional config e.g. http_config can be left out. Any keys provided should be found in default_config
+    """
+    unknown_keys = set(ssm_value_dict.get(config_key, {}).keys()) - set(default_config.keys())
+    if unknown_keys:
+      raise ValueError(f"Check {config_key} values - {sorted(unknown_keys)} are not supported. Supported keys are {sorted(default_config.keys())}")
+
+  def validate_ssm_value_dict_write_mode(self, ssm_value_dict):
+    write_mode = ssm_value_dict.get("upload_config", {}).get("write_mode", DEFAULT_UPLOAD_CONFIG["write_mode"])
+    if write_mode not in WRITE_MODES:
+      raise ValueError(f"Check upload_config values - write_mode is {write_mode}. Supported write modes are {WRITE_MODES}")
+
+  def validate_ssm_value_dict_hash_store(self, ssm_value_dict):
+    hash_store = ssm_value_dict.get("upload_config", {}).get("hash_store", DEFAULT_UPLOAD_CONFIG["hash_store"])
+    if hash_store not in HASH_STORES:
+      raise ValueError(f"Check upload_config values - hash_store is {hash_store}. Supported hash stores are {HASH_STORES}")
+
+  def validate_ssm_value_dict_checkpoint_store(self, ssm_value_dict):
+    upload_config = dict(DEFAULT_UPLOAD_CONFIG, **ssm_value_dict.get("upload_config", {}))
+    if upload_config["checkpoint_store"] not in CHECKPOINT_STORES:
+      raise ValueError(f"Check upload_config values - checkpoint_store is {upload_config['checkpoint_store']}. Supported checkpoint stores are {CHECKPOINT_STORES}")
+    if upload_config["checkpoint"] and upload_config["checkpoint_store"] == "dynamo_db" and not upload_config["checkpoint_table"]:
+      raise ValueError("Check upload_config values - checkpoint_table should be set for the dynamo_db checkpoint_store")
+
+  def validate_ssm_value_dict_rate_limit(self, ssm_value_dict):
+    http_config = dict(DEFAULT_HTTP_CONFIG, **ssm_value_dict.get("http_config", {}))
+    for key in RATE_LIMIT_CONFIG_KEYS:
+      if not isinstance(http_config[key], (int, float)) or isinstance(http_config[key], bool) or http_config[key] <= 0:
+        raise ValueError(f"Check http_config values - {key} should be a positive number. {key} is {http_config[key]}")
+    if not http_config["rate_limit_min_rate"] <= http_config["rate_limit_initial_rate"] <= http_config["rate_limit_max_rate"]:
+      raise ValueError("Check http_config values - rate_limit_initial_rate should be between rate_limit_min_rate and rate_limit_max_rate")
+    if http_config["rate_limit_decrease_factor"] >= 1:
+      raise ValueError(f"Check http_config values - rate_limit_decrease_factor should be less than 1. rate_limit_decrease_factor is {http_config['rate_limit_decrease_factor']}")
+
+  def validate_ssm_value_dict_write_capacity(self, ssm_value_dict):
+    upload_config = dict(DEFAULT_UPLOAD_CONFIG, **ssm_value_dict.get("upload_config", {}))
+    write_capacity_units = upload_config["write_capacity_units"]
+    if not isinstance(write_capacity_units, (int, float)) or isinstance(write_capacity_units, bool) or write_capacity_units < 0:
+      raise ValueError(f"Check upload_config values - write_capacity_units should be 0 or more. write_capacity_units is {write_capacity_units}")
+    write_capacity_utilisation = upload_config["write_capacity_utilisation"]
+    if not isinstance(write_capacity_utilisation, (int, float)) or isinstance(write_capacity_utilisation, bool) or not 0 < write_capacity_utilisation <= 1:
+      raise ValueError(f"Check upload_config values - write_capacity_utilisation should be above 0 and at most 1. write_capacity_utilisation is {write_capacity_utilisation}")
+
+  def validate_ssm_value_dict_sinks(self, ssm_value_dict):
+    upload_config = dict(DEFAULT_UPLOAD_CONFIG, **ssm_value_dict.get("upload_config", {}))
+    sinks = upload_config["sinks"]
+    if not isinstance(sinks, list) or any(sink not in SINKS for sink in sinks):
+      raise ValueError(f"Check upload_config values - sinks is {sinks}. Supported sinks are {sorted(SINKS)}")
+    if "parquet" in sinks and not upload_config["parquet_path"]:
+      raise ValueError("Check upload_config values - parquet_path should be set for the parquet sink")
+
+  def validate_ssm_value_dict_letter_record_counts(self, ssm_value_dict):
+    """
+    Optional letter_record_counts e.g. {"a": 120, "b": 85} are used to plan shards for the alphabetical scraping rule
+    """
+    for letter, record_count in ssm_value_dict.get("letter_record_counts", {}).items():
+      if letter not in list(alphabet) or not isinstance(record_count, int) or isinstance(record_count, bool) or record_count < 0:
+        raise ValueError(f"Check letter_record_counts values - letters should be mapped to record counts of 0 or more. {letter} is mapped to {record_count}")
 
   def validate_ssm_value_dict_types(self, ssm_value_dict):
     # check all fields are there and they have expected types
@@ -33,7 +110,10 @@ class SSMValueDictValidator:
                       "auth_header": dict,
                       "field_mapping" : dict,
                       "custom_field_info" : dict,
-                      "dynamo_db_config" : dict
+                      "dynamo_db_config" : dict,
+                      "http_config" : dict,
+                      "upload_config" : dict,
+                      "letter_record_counts" : dict
                       }
     for k, v in ssm_value_dict.items():
       derived_type = type(v)
@@ -82,5 +162,80 @@ def validate_api_record_keys(api_records, field_mapping):
       
 
 
+class APIRecordValidator:
+  """
+  Validates every api_record in one pass, as they flow through the RecordManager pipeline. Each record's key set is
+  fingerprinted with a frozenset, and whether a key set has every key in field_mapping is only worked out the first time
+  it is seen. So for records with the same keys, the cost per record is building and looking up the frozenset, and
+  checking the type of the hash_key value. Records with another key set take a slow path, where missing keys are worked
+  out and the record is reported. Records which are missing keys, are not dicts, or have no usable hash_key value are
+  left out, rather than failing the upload part way through with a KeyError.
+  """
+  # Types a hash_key value can have, for a DynamoDB string or number key
+  hash_key_types = (str, int, float, Decimal)
+  max_reported_records = 5
+
+  def __init__(self, field_mapping, hash_key):
+    """
+    params:
+    field_mapping: (dict) : api record keys mapped to new keys
+    hash_key: (string) : hash_key of the DynamoDB table, after keys are renamed as per field_mapping
+    """
+    self.field_mapping_keys = frozenset(field_mapping)
+    self.api_record_hash_key = {new_key: key for key, new_key in field_mapping.items()}.get(hash_key)
+    self.valid_shapes = {}
+    self.shape_counts = Counter()
+    self.record_count = 0
+    self.invalid_record_count = 0
+    self.invalid_hash_keys = set()
+    self.reported_records = []
+
+  def iter_valid_records(self, api_records):
+    """
+    -> generator : Yields api_records which have every key in field_mapping and a usable hash_key value
+    """
+    for api_record in api_records:
+      if self.is_valid(api_record):
+        yield api_record
+
+  def is_valid(self, api_record):
+    self.record_count += 1
+    if not isinstance(api_record, dict):
+      return self.add_invalid_record(api_record, f"record is a {type(api_record).__name__}")
+    shape = frozenset(api_record)
+    self.shape_counts[shape] += 1
+    valid_shape = self.valid_shapes.get(shape)
+    if valid_shape is None:
+      valid_shape = self.valid_shapes[shape] = self.field_mapping_keys <= shape
+    if not valid_shape:
+      return self.add_invalid_record(api_record, f"missing keys {sorted(self.field_mapping_keys - shape)}")
+    if self.api_record_hash_key is not None:
+      hash_key_value = api_record[self.api_record_hash_key]
+      if not isinstance(hash_key_value, self.hash_key_types) or isinstance(hash_key_value, bool) or hash_key_value == "":
+        return self.add_invalid_record(api_record, f"{self.api_record_hash_key} is {hash_key_value!r}")
+    return True
 
+  def add_invalid_record(self, api_record, reason):
+    """
+    hash_keys of invalid records are kept, so that items already in the table for them are not deleted as stale records
+    -> bool : False
+    """
+    self.invalid_record_count += 1
+    if isinstance(api_record, dict) and self.api_record_hash_key is not None:
+      hash_key_value = api_record.get(self.api_record_hash_key)
+      if isinstance(hash_key_value, self.hash_key_types) and not isinstance(hash_key_value, bool) and hash_key_value != "":
+        self.invalid_hash_keys.add(hash_key_value)
+    if len(self.reported_records) < self.max_reported_records:
+      self.reported_records.append({"reason": reason, "hash_key": api_record.get(self.api_record_hash_key) if isinstance(api_record, dict) else None})
+    return False
 
+  def get_report(self):
+    """
+    -> dict : records validated, distinct key sets, records without the most common key set, and invalid records
+    """
+    most_common_shape_count = self.shape_counts.most_common(1)[0][1] if self.shape_counts else 0
+    return {"record_count": self.record_count,
+            "shape_count": len(self.shape_counts),
+            "heterogeneous_record_count": self.record_count - most_common_shape_count,
+            "invalid_record_count": self.invalid_record_count,
+            "invalid_records": self.reported_records}
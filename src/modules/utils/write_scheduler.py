@@ -0,0 +1,148 @@
+"""
+Adaptive pacing of batch_write_item requests, used when "adaptive_writes" is set in upload_config. A scheduler is kept
+for each DynamoDB table and shared by every BatchUploader writing to it e.g. letters uploaded concurrently, so between
+them they stay under the table's write capacity.
+
+The scheduler limits the number of requests in flight, and for tables with a known write capacity, the capacity units
+sent each second, to write_capacity_utilisation of the table's capacity. The capacity a request will consume is
+estimated from the capacity consumed per item so far. Throttling, either a ProvisionedThroughputExceededException or
+UnprocessedItems in a response, halves the requests in flight and the capacity rate. Each time as many requests as are
+allowed in flight succeed without throttling, one more request is allowed in flight and the capacity rate rises by a
+tenth of its limit. Responses to requests sent before the last cut don't cut again, so a burst of throttled requests
+only backs off once.
+"""
+import time
+import threading
+
+THROTTLING_ERROR_CODES = ["ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"]
+WRITE_SCHEDULER_CONFIG_KEYS = ["max_in_flight", "write_capacity_units", "write_capacity_utilisation"]
+
+_write_schedulers = {}
+_write_schedulers_lock = threading.Lock()
+
+def get_write_scheduler(dynamo_db_resource, dynamo_db_table, upload_config):
+  """
+  A write scheduler is created again if its settings in upload_config change.
+  -> WriteScheduler : for dynamo_db_table, or None if "adaptive_writes" is not set in upload_config
+  """
+  if not upload_config["adaptive_writes"]:
+    return None
+  write_scheduler_config = {key: upload_config[key] for key in WRITE_SCHEDULER_CONFIG_KEYS}
+  with _write_schedulers_lock:
+    write_scheduler = _write_schedulers.get(dynamo_db_table)
+    if write_scheduler is None or write_scheduler.write_scheduler_config != write_scheduler_config:
+      write_capacity_units = upload_config["write_capacity_units"] or get_provisioned_write_capacity_units(dynamo_db_resource, dynamo_db_table)
+      write_scheduler = WriteScheduler(write_scheduler_config, write_capacity_units)
+      _write_schedulers[dynamo_db_table] = write_scheduler
+    return write_scheduler
+
+def reset_write_schedulers():
+  """
+  Drops write schedulers e.g. between tests
+  """
+  with _write_schedulers_lock:
+    _write_schedulers.clear()
+
+def get_provisioned_write_capacity_units(dynamo_db_resource, dynamo_db_table):
+  """
+  -> int : WriteCapacityUnits for a table in provisioned mode, or 0 for an on-demand table
+  """
+  table_description = dynamo_db_resource.meta.client.describe_table(TableName=dynamo_db_table)["Table"]
+  if table_description.get("BillingModeSummary", {}).get("BillingMode") == "PAY_PER_REQUEST":
+    return 0
+  return table_description.get("ProvisionedThroughput", {}).get("WriteCapacityUnits", 0)
+
+
+class WriteScheduler:
+  """
+  params:
+  write_scheduler_config: (dict) : max_in_flight, write_capacity_units and write_capacity_utilisation from upload_config
+  write_capacity_units: (int) : Capacity units the table can take each second, or 0 if unknown e.g. for an on-demand
+  table. Then only the requests in flight are limited.
+  """
+  def __init__(self, write_scheduler_config, write_capacity_units, clock=time.monotonic, sleep=time.sleep):
+    self.write_scheduler_config = write_scheduler_config
+    self.max_in_flight = write_scheduler_config["max_in_flight"]
+    self.in_flight_limit = self.max_in_flight
+    self.in_flight = 0
+    self.max_capacity_rate = write_capacity_units * write_scheduler_config["write_capacity_utilisation"] or None
+    self.capacity_rate = self.max_capacity_rate
+    self.capacity_tokens = self.max_capacity_rate or 0
+    self.units_per_item = 1.0
+    self.success_count = 0
+    self.clock = clock
+    self.sleep = sleep
+    self.updated_at = clock()
+    self.decreased_at = None
+    self.condition = threading.Condition()
+
+  def acquire(self, item_count):
+    """
+    Waits until another request can be in flight, then until the capacity it is estimated to consume is available.
+    Tokens are reserved before waiting for capacity, so the lock is not held while sleeping.
+    -> tuple : (sent_at, estimated_units), to pass to record_response or cancel
+    """
+    with self.condition:
+      while self.in_flight >= self.in_flight_limit:
+        self.condition.wait()
+      self.in_flight += 1
+      estimated_units = item_count * self.units_per_item
+      wait_seconds = 0
+      if self.capacity_rate is not None:
+        self.refill()
+        self.capacity_tokens -= estimated_units
+        if self.capacity_tokens < 0:
+          wait_seconds = -self.capacity_tokens / self.capacity_rate
+    if wait_seconds > 0:
+      self.sleep(wait_seconds)
+    return self.clock(), estimated_units
+
+  def refill(self):
+    now = self.clock()
+    self.capacity_tokens = min(self.capacity_rate, self.capacity_tokens + (now - self.updated_at) * self.capacity_rate)
+    self.updated_at = now
+
+  def cancel(self):
+    """
+    Used when a request fails for a reason other than throttling
+    """
+    with self.condition:
+      self.in_flight -= 1
+      self.condition.notify()
+
+  def record_response(self, sent_at, estimated_units, item_count, consumed_units, throttled):
+    """
+    params:
+    sent_at, estimated_units: (float) : from acquire
+    item_count: (int) : items sent in the request
+    consumed_units: (float) : ConsumedCapacity for the table in the response
+    throttled: (bool) : True if the request was throttled, or items were returned as UnprocessedItems
+    -> bool : True if requests in flight and the capacity rate were cut
+    """
+    with self.condition:
+      self.in_flight -= 1
+      self.condition.notify()
+      if consumed_units > 0 and item_count > 0:
+        self.units_per_item = 0.8 * self.units_per_item + 0.2 * consumed_units / item_count
+      if self.capacity_rate is not None:
+        self.refill()
+        self.capacity_tokens += estimated_units - consumed_units
+      if not throttled:
+        self.success_count += 1
+        if self.success_count >= self.in_flight_limit:
+          self.success_count = 0
+          self.in_flight_limit = min(self.max_in_flight, self.in_flight_limit + 1)
+          if self.capacity_rate is not None:
+            self.capacity_rate = min(self.max_capacity_rate, self.capacity_rate + self.max_capacity_rate / 10)
+          self.condition.notify_all()
+        return False
+      if self.decreased_at is not None and sent_at < self.decreased_at:
+        return False
+      self.success_count = 0
+      self.in_flight_limit = max(1, self.in_flight_limit // 2)
+      if self.capacity_rate is not None:
+        self.capacity_rate = max(self.max_capacity_rate / 10, self.capacity_rate / 2)
+        self.capacity_tokens = min(self.capacity_tokens, 0)
+      self.decreased_at = self.clock()
+      print(f"Writes throttled - {self.in_flight_limit} requests in flight allowed, capacity rate {self.capacity_rate} units per second")
+      return True
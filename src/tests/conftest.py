@@ -0,0 +1,32 @@
+import pytest
+
+from modules.utils.rate_limiter import reset_rate_limiters
+from modules.utils.ssm_config_cache import reset_ssm_config_cache
+from modules.utils.write_scheduler import reset_write_schedulers
+
+@pytest.fixture(autouse=True)
+def ssm_config_cache():
+   """
+   ssm parameters are cached at module level across invocations, so the cache is emptied around each test
+   """
+   reset_ssm_config_cache()
+   yield
+   reset_ssm_config_cache()
+
+@pytest.fixture(autouse=True)
+def rate_limiters():
+   """
+   Rate limiters are kept at module level for each source api, so rates learnt in one test are dropped before the next
+   """
+   reset_rate_limiters()
+   yield
+   reset_rate_limiters()
+
+@pytest.fixture(autouse=True)
+def write_schedulers():
+   """
+   Write schedulers are kept at module level for each DynamoDB table, so they are dropped around each test
+   """
+   reset_write_schedulers()
+   yield
+   reset_write_schedulers()
@@ -0,0 +1,150 @@
+import boto3
+import pytest
+import asyncio
+import threading
+from copy import deepcopy
+from moto import mock_aws
+from string import ascii_lowercase as alphabet
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.api_mapping import APIMapping
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from modules.async_scraper import AsyncScraper
+from modules.async_engine import AsyncEngine, validate_engine
+from modules.utils.metrics import UnitMetrics
+from modules.utils.aws_clients import reset_aws_clients
+from modules.utils.api_mapping_manager import APIMappingManager
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+APP = "fruit-project-api-scraper"
+REGION = "eu-west-2"
+TARGET_API_1 = "fruity-vice"
+TARGET_API_2 = "the-cocktail-db"
+FAST_HTTP_CONFIG = {"backoff_factor": 0, "backoff_jitter": 0, "retry_after_max": 0}
+
+class FlakyAPIHandler(BaseHTTPRequestHandler):
+  """
+  Responds with the statuses in server.statuses, one per request, followed by 200s
+  """
+  def do_GET(self):
+    self.server.request_count += 1
+    status = self.server.statuses.pop(0) if self.server.statuses else 200
+    body = b'[{"name": "Persimmon", "id": 1}, {"name": "Strawberry", "id": 2}]' if status == 200 else b'unavailable'
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+@pytest.fixture
+def flaky_api_server():
+   server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyAPIHandler)
+   server.statuses = []
+   server.request_count = 0
+   thread = threading.Thread(target=server.serve_forever, daemon=True)
+   thread.start()
+   yield server
+   server.shutdown()
+   server.server_close()
+
+@pytest.fixture
+def local_ssm_value_dict(flaky_api_server):
+   ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+   ssm_value_dict["source_api_endpoint"] = f"http://127.0.0.1:{flaky_api_server.server_port}/api/fruit/all"
+   ssm_value_dict["http_config"] = dict(FAST_HTTP_CONFIG)
+   return ssm_value_dict
+
+async def get_api_records(ssm_value_dict, metrics=None):
+   async with AsyncEngine(2) as async_engine:
+      return await AsyncScraper(APP, TARGET_API_1).get_api_records_from_endpoint_async(async_engine, ssm_value_dict, metrics)
+
+class TestAsyncEngine:
+
+  @pytest.mark.parametrize("engine", ["trio", None, ""])
+  def test_invalid_engine_raises_value_error(self, engine):
+     with pytest.raises(ValueError):
+        validate_engine(engine)
+     with pytest.raises(ValueError):
+        Orchestrator(APP, TARGET_API_2, engine=engine)
+
+  def test_async_scraper_retries_status_forcelist(self, flaky_api_server, local_ssm_value_dict):
+     flaky_api_server.statuses = [503, 502]
+     metrics = UnitMetrics()
+     api_records = asyncio.run(get_api_records(local_ssm_value_dict, metrics))
+     assert [api_record["name"] for api_record in api_records] == ["Persimmon", "Strawberry"]
+     assert flaky_api_server.request_count == 3 and metrics.get_values()["http_retry_count"] == 2
+
+  def test_async_scraper_raises_once_retries_run_out(self, flaky_api_server, local_ssm_value_dict):
+     flaky_api_server.statuses = [500, 500]
+     local_ssm_value_dict["http_config"]["max_retries"] = 1
+     with pytest.raises(Exception, match="status code: 500"):
+        asyncio.run(get_api_records(local_ssm_value_dict))
+     assert flaky_api_server.request_count == 2
+
+  @mock_aws
+  def test_records_are_scraped_and_uploaded_on_the_event_loop(self, local_ssm_value_dict, monkeypatch):
+     monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+     reset_aws_clients()
+     dynamo_db_resource = boto3.resource('dynamodb', region_name = REGION)
+     table = dynamo_db_resource.create_table(TableName = local_ssm_value_dict["dynamo_db_config"]["table"],
+                                             KeySchema = [{'AttributeName': 'name', 'KeyType': 'HASH'}],
+                                             AttributeDefinitions = [{"AttributeName": "name", "AttributeType": "S"}],
+                                             BillingMode = 'PAY_PER_REQUEST')
+     local_ssm_value_dict["field_mapping"] = {"name": "name", "id": "id1"}
+
+     async def scrape_and_upload():
+        async with AsyncEngine(2) as async_engine:
+           api_records = await AsyncScraper(APP, TARGET_API_1).get_api_records_from_endpoint_async(async_engine, local_ssm_value_dict)
+           record_manager = RecordManager(api_records, local_ssm_value_dict)
+           return await record_manager.execute_async(async_engine), record_manager
+
+     upload_summary, record_manager = asyncio.run(scrape_and_upload())
+     reset_aws_clients()
+     assert upload_summary["batch_count"] == 2 and record_manager.record_count == 2
+     assert sorted(item["name"] for item in table.scan()["Items"]) == ["Persimmon", "Strawberry"]
+
+  @pytest.mark.parametrize("max_workers", [1, 4])
+  def test_alphabetical_scraping_rule_scrapes_every_letter_as_tasks(self, max_workers, monkeypatch):
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+     api_mapping_manager = APIMappingManager(TARGET_API_2, APIMapping)
+     api_mapping_manager.execute()
+     orchestrator = Orchestrator(APP, TARGET_API_2, max_workers, engine="asyncio")
+     units = []
+     running = {"now": 0, "max": 0}
+
+     async def mock_scrape_and_upload(async_engine, scraper, ssm_value_dict, unit):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0)
+        running["now"] -= 1
+        units.append(unit)
+        return 1
+
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db_async", mock_scrape_and_upload)
+     scraping_rule = api_mapping_manager.get_scraping_rule(ssm_value_dict, orchestrator.shard)
+     asyncio.run(orchestrator.scrape_and_upload_records_for_scraping_rule_async(None, scraping_rule, {"max_in_flight": 2}))
+
+     assert sorted(units) == list(alphabet)
+     assert orchestrator.summary["letter_record_counts"] == {letter: 1 for letter in alphabet}
+     assert running["max"] == max_workers
+
+  def test_failed_letter_cancels_other_tasks(self, monkeypatch):
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+     api_mapping_manager = APIMappingManager(TARGET_API_2, APIMapping)
+     api_mapping_manager.execute()
+     orchestrator = Orchestrator(APP, TARGET_API_2, 4, engine="asyncio")
+
+     async def mock_scrape_and_upload(async_engine, scraper, ssm_value_dict, unit):
+        if unit == "b":
+           raise ValueError("There's a mismatch between api_record_keys and field_mapping_keys")
+        await asyncio.sleep(10)
+
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db_async", mock_scrape_and_upload)
+     scraping_rule = api_mapping_manager.get_scraping_rule(ssm_value_dict, orchestrator.shard)
+     with pytest.raises(ValueError):
+        asyncio.run(orchestrator.scrape_and_upload_records_for_scraping_rule_async(None, scraping_rule, {"max_in_flight": 2}))
+     assert orchestrator.summary["letter_record_counts"] == {}
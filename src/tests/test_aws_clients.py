@@ -0,0 +1,65 @@
+import json
+import pytest
+import botocore.session
+from moto import mock_aws
+from copy import deepcopy
+
+from modules.scraper import Scraper
+from modules.record_manager import RecordManager
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from modules.utils.aws_clients import get_aws_client, get_aws_resource, register_aws_client, reset_aws_clients
+
+APP = "fruit-project-api-scraper"
+REGION = "eu-west-2"
+TARGET_API_1 = "fruity-vice"
+TARGET_API_1_SSM_PARAM = f"{APP}--{TARGET_API_1}-config"
+
+@pytest.fixture
+def aws_clients(monkeypatch):
+   """
+   Clients are reset before and after each test, so that clients are created within the moto mock
+   """
+   monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+   reset_aws_clients()
+   yield
+   reset_aws_clients()
+
+@pytest.fixture
+def target_api_1_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+
+class TestAWSClients:
+
+  @mock_aws
+  def test_get_aws_client_returns_same_client(self, aws_clients):
+     assert get_aws_client("ssm") is get_aws_client("ssm")
+
+  @mock_aws
+  def test_get_aws_resource_returns_same_resource(self, aws_clients):
+     assert get_aws_resource("dynamodb") is get_aws_resource("dynamodb")
+
+  @mock_aws
+  def test_reset_aws_clients_creates_new_client(self, aws_clients):
+     ssm_client = get_aws_client("ssm")
+     reset_aws_clients()
+     assert get_aws_client("ssm") is not ssm_client
+
+  def test_register_aws_client_swaps_client(self, aws_clients):
+     ssm_client = botocore.session.get_session().create_client("ssm", region_name=REGION)
+     register_aws_client("ssm", ssm_client)
+     assert get_aws_client("ssm") is ssm_client
+
+  @mock_aws
+  def test_scraper_and_record_manager_share_registry_clients(self, aws_clients, target_api_1_ssm_value_dict):
+     get_aws_client("ssm").put_parameter(Name=TARGET_API_1_SSM_PARAM,
+                                         Value=json.dumps(target_api_1_ssm_value_dict),
+                                         Type="String")
+     ssm_value_dict = Scraper(APP, TARGET_API_1).get_validated_ssm_value_dict()
+     get_aws_resource("dynamodb").create_table(TableName="fruit",
+                                               KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                                               AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                                               BillingMode="PAY_PER_REQUEST")
+     record_manager = RecordManager([{"name": "Persimmon", "id": 52, "family": "Ebenaceae", "order": "Rosales", "genus": "Diospyros"}], ssm_value_dict)
+     record_manager.execute()
+     item = get_aws_resource("dynamodb").Table("fruit").get_item(Key={"name": "Persimmon"})["Item"]
+     assert ssm_value_dict == target_api_1_ssm_value_dict and item["family1"] == "Ebenaceae"
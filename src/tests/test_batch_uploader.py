@@ -0,0 +1,96 @@
+import time
+import boto3
+import pytest
+import threading
+from copy import deepcopy
+from moto import mock_aws
+
+from modules.record_manager import RecordManager
+from modules.utils.aws_clients import reset_aws_clients
+from modules.batch_uploader import BatchUploader, DEFAULT_UPLOAD_CONFIG, get_upload_config
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+REGION = "eu-west-2"
+TARGET_API_1 = "fruity-vice"
+TARGET_DYNAMO_DB_TABLE_NAME = "fruit"
+FAST_UPLOAD_CONFIG = dict(DEFAULT_UPLOAD_CONFIG, backoff_base=0, backoff_max=0)
+
+def get_put_batch_items(names):
+   return [{"PutRequest": {"Item": {"name": name}}} for name in names]
+
+def get_response(unprocessed_batch_items=None, capacity_units=1.0):
+   return {"UnprocessedItems": {TARGET_DYNAMO_DB_TABLE_NAME: unprocessed_batch_items} if unprocessed_batch_items else {},
+           "ConsumedCapacity": [{"TableName": TARGET_DYNAMO_DB_TABLE_NAME, "CapacityUnits": capacity_units}]}
+
+@pytest.fixture
+def target_api_1_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+
+@pytest.fixture
+def dynamo_db_table(monkeypatch):
+   monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+   with mock_aws():
+      reset_aws_clients()
+      dynamo_db_resource = boto3.resource("dynamodb", region_name=REGION)
+      table = dynamo_db_resource.create_table(TableName=TARGET_DYNAMO_DB_TABLE_NAME,
+                                              KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                                              AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                                              BillingMode="PAY_PER_REQUEST")
+      yield table
+      reset_aws_clients()
+
+class TestBatchUploader:
+
+  def test_get_upload_config_overrides_defaults(self, target_api_1_ssm_value_dict):
+     target_api_1_ssm_value_dict["upload_config"] = {"max_in_flight": 8}
+     upload_config = get_upload_config(target_api_1_ssm_value_dict)
+     assert upload_config["max_in_flight"] == 8 and upload_config["max_retries"] == DEFAULT_UPLOAD_CONFIG["max_retries"]
+
+  def test_unprocessed_items_are_sent_again(self):
+     sent_batch_items = []
+     responses = [get_response(get_put_batch_items(["Strawberry"])), get_response()]
+
+     def upload_batch(batch_items):
+        sent_batch_items.append(batch_items)
+        return responses.pop(0)
+
+     batch_uploader = BatchUploader(upload_batch, TARGET_DYNAMO_DB_TABLE_NAME, FAST_UPLOAD_CONFIG)
+     summary = batch_uploader.execute([[get_put_batch_items(["Persimmon", "Strawberry"])]])
+     assert sent_batch_items[1] == get_put_batch_items(["Strawberry"])
+     assert summary == {"batch_count": 1, "request_count": 2, "retry_count": 1, "consumed_capacity_units": 2.0, "throttle_count": 1}
+
+  def test_raises_when_items_remain_unprocessed(self):
+     def upload_batch(batch_items):
+        return get_response(batch_items)
+
+     batch_uploader = BatchUploader(upload_batch, TARGET_DYNAMO_DB_TABLE_NAME, dict(FAST_UPLOAD_CONFIG, max_retries=2))
+     with pytest.raises(Exception, match="still unprocessed"):
+        batch_uploader.execute([[get_put_batch_items(["Persimmon"])]])
+     assert batch_uploader.request_count == 3
+
+  def test_batch_item_groups_are_sent_in_order_with_bounded_concurrency(self):
+     lock = threading.Lock()
+     in_flight = {"current": 0, "max": 0}
+     sent_batch_items = []
+
+     def upload_batch(batch_items):
+        with lock:
+           in_flight["current"] += 1
+           in_flight["max"] = max(in_flight["max"], in_flight["current"])
+           sent_batch_items.append(batch_items)
+        time.sleep(0.02)
+        with lock:
+           in_flight["current"] -= 1
+        return get_response()
+
+     batch_item_groups = ([[{"DeleteRequest": {"Key": {"name": str(i)}}}], get_put_batch_items([str(i)])] for i in range(20))
+     summary = BatchUploader(upload_batch, TARGET_DYNAMO_DB_TABLE_NAME, dict(FAST_UPLOAD_CONFIG, max_in_flight=3)).execute(batch_item_groups)
+     for i in range(20):
+        assert sent_batch_items.index([{"DeleteRequest": {"Key": {"name": str(i)}}}]) < sent_batch_items.index(get_put_batch_items([str(i)]))
+     assert summary["batch_count"] == 40 and in_flight["max"] == 3
+
+  def test_record_manager_uploads_all_batches(self, dynamo_db_table, target_api_1_ssm_value_dict):
+     api_records = [{"name": f"fruit-{i}", "id": i, "family": "Rosaceae", "order": "Rosales", "genus": "Fragaria"} for i in range(60)]
+     upload_summary = RecordManager(api_records, target_api_1_ssm_value_dict).execute()
+     assert dynamo_db_table.scan(Select="COUNT")["Count"] == 60
+     assert upload_summary["batch_count"] == 6 and upload_summary["consumed_capacity_units"] > 0
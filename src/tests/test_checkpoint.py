@@ -0,0 +1,138 @@
+import boto3
+import pytest
+from copy import deepcopy
+from moto import mock_aws
+
+from config.api_mapping import APIMapping
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from modules.utils.aws_clients import reset_aws_clients
+from modules.utils.api_mapping_manager import APIMappingManager
+from modules.utils.validator import SSMValueDictValidator
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from modules.utils.checkpoint import (CHECKPOINT_ID_FIELD, Checkpoint, DynamoDBCheckpointStore, ManifestCheckpointStore,
+                                      get_checkpoint_id, load_checkpoint)
+
+APP = "fruit-project-api-scraper"
+REGION = "eu-west-2"
+TARGET_API_1 = "fruity-vice"
+TARGET_API_2 = "the-cocktail-db"
+TARGET_DYNAMO_DB_TABLE_NAME = "fruit"
+CHECKPOINT_TABLE_NAME = "fruit-project-api-scraper-checkpoints"
+
+def get_api_records(record_count):
+   return [{"name": f"Fruit {i}", "id": i, "family": "Rosaceae", "order": "Rosales", "genus": "Fragaria"} for i in range(record_count)]
+
+@pytest.fixture
+def target_api_1_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+
+@pytest.fixture
+def target_api_2_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+
+@pytest.fixture
+def dynamo_db_resource(monkeypatch):
+   monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+   with mock_aws():
+      reset_aws_clients()
+      dynamo_db_resource = boto3.resource("dynamodb", region_name=REGION)
+      dynamo_db_resource.create_table(TableName=TARGET_DYNAMO_DB_TABLE_NAME,
+                                      KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                                      AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                                      BillingMode="PAY_PER_REQUEST")
+      dynamo_db_resource.create_table(TableName=CHECKPOINT_TABLE_NAME,
+                                      KeySchema=[{"AttributeName": CHECKPOINT_ID_FIELD, "KeyType": "HASH"}],
+                                      AttributeDefinitions=[{"AttributeName": CHECKPOINT_ID_FIELD, "AttributeType": "S"}],
+                                      BillingMode="PAY_PER_REQUEST")
+      yield dynamo_db_resource
+      reset_aws_clients()
+
+class TestCheckpoint:
+
+  def test_get_checkpoint_id(self):
+     assert get_checkpoint_id(APP, TARGET_API_2) == f"{APP}--{TARGET_API_2}"
+     assert get_checkpoint_id(APP, TARGET_API_2, "3/8") == f"{APP}--{TARGET_API_2}--3/8"
+
+  def test_manifest_checkpoint_store_saves_and_clears(self, tmp_path):
+     checkpoint_id = get_checkpoint_id(APP, TARGET_API_2, "3/8")
+     checkpoint = Checkpoint(ManifestCheckpointStore(str(tmp_path)), checkpoint_id)
+     checkpoint.complete_unit("a")
+     checkpoint.complete_batch("b", 0)
+     checkpoint.complete_batch("b", 2)
+
+     state = ManifestCheckpointStore(str(tmp_path)).load(checkpoint_id)
+     assert state == {"completed_units": ["a"], "completed_batches": {"b": [0, 2]}}
+     checkpoint.complete_unit("b")
+     assert ManifestCheckpointStore(str(tmp_path)).load(checkpoint_id) == {"completed_units": ["a", "b"], "completed_batches": {}}
+     checkpoint.clear()
+     assert list(tmp_path.iterdir()) == []
+
+  def test_dynamo_db_checkpoint_store_saves_and_clears(self, dynamo_db_resource):
+     upload_config = {"checkpoint_store": "dynamo_db", "checkpoint_table": CHECKPOINT_TABLE_NAME}
+     checkpoint_id = get_checkpoint_id(APP, TARGET_API_2)
+     checkpoint = load_checkpoint(upload_config, dynamo_db_resource, checkpoint_id)
+     checkpoint.complete_unit("a")
+     checkpoint.complete_batch("b", 1)
+
+     resumed_checkpoint = load_checkpoint(upload_config, dynamo_db_resource, checkpoint_id)
+     assert resumed_checkpoint.is_unit_completed("a") and not resumed_checkpoint.is_unit_completed("b")
+     assert resumed_checkpoint.get_completed_batches("b") == {1}
+     assert resumed_checkpoint.resumed
+     resumed_checkpoint.clear()
+     assert DynamoDBCheckpointStore(dynamo_db_resource, CHECKPOINT_TABLE_NAME).load(checkpoint_id) == {}
+
+  def test_record_manager_skips_batches_uploaded_by_a_previous_run(self, dynamo_db_resource, target_api_1_ssm_value_dict, tmp_path):
+     checkpoint_store = ManifestCheckpointStore(str(tmp_path))
+     checkpoint = Checkpoint(checkpoint_store, get_checkpoint_id(APP, TARGET_API_1), {"completed_batches": {"*": [0, 2]}})
+     record_manager = RecordManager(get_api_records(80), target_api_1_ssm_value_dict, checkpoint)
+     upload_summary = record_manager.execute()
+
+     table = dynamo_db_resource.Table(TARGET_DYNAMO_DB_TABLE_NAME)
+     uploaded_names = {item["name"] for item in table.scan()["Items"]}
+     assert record_manager.skipped_batch_count == 2 and upload_summary["batch_count"] == 4
+     assert uploaded_names == {f"Fruit {i}" for i in list(range(25, 50)) + list(range(75, 80))}
+     assert checkpoint.get_completed_batches("*") == {0, 1, 2, 3}
+
+  def test_incremental_uploads_do_not_skip_batches(self, dynamo_db_resource, target_api_1_ssm_value_dict, tmp_path):
+     target_api_1_ssm_value_dict["upload_config"] = {"incremental": True}
+     checkpoint = Checkpoint(ManifestCheckpointStore(str(tmp_path)), get_checkpoint_id(APP, TARGET_API_1), {"completed_batches": {"*": [0]}})
+     record_manager = RecordManager(get_api_records(30), target_api_1_ssm_value_dict, checkpoint)
+     record_manager.execute()
+     assert record_manager.skipped_batch_count == 0
+
+  def test_orchestrator_resumes_from_first_unfinished_letter(self, target_api_2_ssm_value_dict, tmp_path, monkeypatch):
+     api_mapping_manager = APIMappingManager(TARGET_API_2, APIMapping)
+     api_mapping_manager.execute()
+     checkpoint_store = ManifestCheckpointStore(str(tmp_path))
+     checkpoint_id = get_checkpoint_id(APP, TARGET_API_2)
+     checkpoint_store.save(checkpoint_id, {"completed_units": list("abcdefghijklmnopq"), "completed_batches": {"r": [0]}})
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+     orchestrator.checkpoint = load_checkpoint({"checkpoint_store": "manifest", "checkpoint_dir": str(tmp_path)}, None, checkpoint_id)
+     letters = []
+
+     def mock_scrape_and_upload(scraper, ssm_value_dict, unit):
+        letters.append(unit)
+        if unit == "t":
+           raise Exception("Task timed out")
+        return 1
+
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db", mock_scrape_and_upload)
+     with pytest.raises(Exception):
+        orchestrator.scrape_and_upload_records_for_scraping_rule(None, api_mapping_manager.get_scraping_rule(target_api_2_ssm_value_dict, orchestrator.shard))
+     assert letters == ["r", "s", "t"]
+     assert checkpoint_store.load(checkpoint_id)["completed_units"] == list("abcdefghijklmnopqrs")
+
+  def test_stale_records_are_not_deleted_for_a_resumed_run(self, target_api_2_ssm_value_dict, tmp_path, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+     orchestrator.checkpoint = Checkpoint(ManifestCheckpointStore(str(tmp_path)), get_checkpoint_id(APP, TARGET_API_2), {"completed_units": ["a"]})
+     orchestrator.checkpoint.is_unit_completed("a")
+     orchestrator.scraped_hash_keys.add("Margarita")
+     monkeypatch.setattr(RecordManager, "delete_stale_records", lambda record_manager, hash_keys: pytest.fail("delete_stale_records was called"))
+     orchestrator.delete_stale_records(target_api_2_ssm_value_dict)
+
+  @pytest.mark.parametrize("upload_config", [{"checkpoint_store": "s3"}, {"checkpoint": True, "checkpoint_store": "dynamo_db"}])
+  def test_validate_checkpoint_store_raises_value_error(self, target_api_1_ssm_value_dict, upload_config):
+     target_api_1_ssm_value_dict["upload_config"] = upload_config
+     with pytest.raises(ValueError):
+        SSMValueDictValidator(TARGET_API_1, target_api_1_ssm_value_dict).validate_ssm_value_dict_checkpoint_store(target_api_1_ssm_value_dict)
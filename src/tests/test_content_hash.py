@@ -0,0 +1,64 @@
+import boto3
+import pytest
+from copy import deepcopy
+from moto import mock_aws
+
+from modules.record_manager import RecordManager
+from modules.utils.aws_clients import reset_aws_clients
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from modules.utils.content_hash import CONTENT_HASH_FIELD, ManifestContentHashStore, get_record_content_hash
+
+REGION = "eu-west-2"
+TARGET_API_1 = "fruity-vice"
+TARGET_DYNAMO_DB_TABLE_NAME = "fruit"
+
+def get_api_records():
+   return [{"name": "Persimmon", "id": 52, "family": "Ebenaceae", "order": "Rosales", "genus": "Diospyros"},
+           {"name": "Strawberry", "id": 3, "family": "Rosaceae", "order": "Rosales", "genus": "Fragaria"}]
+
+@pytest.fixture
+def target_api_1_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+
+@pytest.fixture
+def dynamo_db_table(monkeypatch):
+   monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+   with mock_aws():
+      reset_aws_clients()
+      dynamo_db_resource = boto3.resource("dynamodb", region_name=REGION)
+      table = dynamo_db_resource.create_table(TableName=TARGET_DYNAMO_DB_TABLE_NAME,
+                                              KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                                              AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                                              BillingMode="PAY_PER_REQUEST")
+      yield table
+      reset_aws_clients()
+
+class TestContentHash:
+
+  def test_content_hash_ignores_key_order_and_timestamp(self):
+     api_record = {"name": "Persimmon", "id": 52, "timestamp": "2024-06-05 15:51:58.084937+01:00"}
+     reordered_api_record = {"id": 52, "name": "Persimmon", "timestamp": "2024-06-06 15:51:58.084937+01:00"}
+     assert get_record_content_hash(api_record) == get_record_content_hash(reordered_api_record)
+
+  def test_content_hash_changes_with_content(self):
+     assert get_record_content_hash({"name": "Persimmon", "id": 52}) != get_record_content_hash({"name": "Persimmon", "id": 53})
+
+  def test_manifest_content_hash_store_persists_hashes(self, tmp_path):
+     manifest_path = str(tmp_path / "fruit-content-hashes.json")
+     ManifestContentHashStore(manifest_path).save_content_hashes({"Persimmon": "x", 3: "y"})
+     assert ManifestContentHashStore(manifest_path).get_content_hashes(["Persimmon", 3, "Durian"]) == {"Persimmon": "x", 3: "y"}
+
+  @pytest.mark.parametrize("hash_store", ["dynamo_db", "manifest"])
+  def test_incremental_upload_skips_unchanged_records(self, dynamo_db_table, target_api_1_ssm_value_dict, tmp_path, hash_store):
+     target_api_1_ssm_value_dict["upload_config"] = {"incremental": True, "hash_store": hash_store, "hash_manifest_dir": str(tmp_path)}
+     first_upload_summary = RecordManager(get_api_records(), target_api_1_ssm_value_dict).execute()
+     changed_api_records = get_api_records()
+     changed_api_records[1]["genus"] = "Rubus"
+     record_manager = RecordManager(changed_api_records, target_api_1_ssm_value_dict)
+     second_upload_summary = record_manager.execute()
+
+     assert first_upload_summary["batch_count"] == 2 and second_upload_summary["batch_count"] == 2
+     assert record_manager.changed_record_count == 1 and record_manager.record_count == 2
+     assert record_manager.hash_keys == {"Persimmon", "Strawberry"}
+     item = dynamo_db_table.get_item(Key={"name": "Strawberry"})["Item"]
+     assert item["genus1"] == "Rubus" and (CONTENT_HASH_FIELD in item) == (hash_store == "dynamo_db")
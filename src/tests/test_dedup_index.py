@@ -0,0 +1,54 @@
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from modules.record_manager import RecordManager
+from modules.utils.dedup_index import DedupIndex
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+TARGET_API_1 = "fruity-vice"
+
+def get_uploaded_records(api_records, dedup_index=None):
+   record_manager = RecordManager(api_records, deepcopy(sample_ssm_value_dicts[TARGET_API_1]), dedup_index=dedup_index)
+   record_batches = list(record_manager.get_record_batches_for_upload())
+   return [api_record for record_batch in record_batches for api_record in record_batch], record_manager
+
+def get_fruit(name, family="Rosaceae"):
+   return {"id": 1, "name": name, "family": family, "genus": "Fragaria", "order": "Rosales"}
+
+class TestDedupIndex:
+
+  def test_repeat_with_same_content_is_a_duplicate(self):
+     dedup_index = DedupIndex()
+     assert not dedup_index.is_duplicate("Strawberry", {"name": "Strawberry", "timestamp": "1"})
+     assert dedup_index.is_duplicate("Strawberry", {"name": "Strawberry", "timestamp": "2"})
+     assert dedup_index.duplicate_count == 1 and len(dedup_index) == 1
+
+  def test_repeat_with_different_content_replaces_the_last_record_seen(self):
+     dedup_index = DedupIndex()
+     assert not dedup_index.is_duplicate("Strawberry", {"name": "Strawberry", "family": "Rosaceae"})
+     assert not dedup_index.is_duplicate("Strawberry", {"name": "Strawberry", "family": "Fragaria"})
+     assert dedup_index.is_duplicate("Strawberry", {"name": "Strawberry", "family": "Fragaria"})
+     assert not dedup_index.is_duplicate("Strawberry", {"name": "Strawberry", "family": "Rosaceae"})
+
+  def test_records_repeated_across_letters_are_uploaded_once(self):
+     dedup_index = DedupIndex()
+     first_letter_records, _ = get_uploaded_records([get_fruit("Strawberry"), get_fruit("Apple")], dedup_index)
+     second_letter_records, record_manager = get_uploaded_records([get_fruit("Strawberry"), get_fruit("Banana")], dedup_index)
+     assert [api_record["name"] for api_record in first_letter_records] == ["Strawberry", "Apple"]
+     assert [api_record["name"] for api_record in second_letter_records] == ["Banana"]
+     assert record_manager.duplicate_record_count == 1 and record_manager.hash_keys == {"Strawberry", "Banana"}
+
+  def test_duplicate_hash_keys_in_a_batch_keep_the_last_occurrence(self):
+     api_records = [get_fruit("Strawberry", "Rosaceae"), get_fruit("Apple"), get_fruit("Strawberry", "Fragaria")]
+     uploaded_records, record_manager = get_uploaded_records(api_records)
+     assert [(api_record["name"], api_record["family1"]) for api_record in uploaded_records] == [("Strawberry", "Fragaria"), ("Apple", "Rosaceae")]
+     assert record_manager.duplicate_record_count == 1
+
+  def test_records_repeated_across_concurrent_letters_are_uploaded_once(self):
+     dedup_index = DedupIndex()
+     letter_records = [[get_fruit("Strawberry"), get_fruit("Apple", f"Family {i}"), get_fruit(f"Fruit {i}")] for i in range(16)]
+     with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda api_records: get_uploaded_records(api_records, dedup_index), letter_records))
+     uploaded_records = [api_record for records, _ in results for api_record in records]
+     assert [api_record["name"] for api_record in uploaded_records].count("Strawberry") == 1
+     assert sorted(api_record["family1"] for api_record in uploaded_records if api_record["name"] == "Apple") == sorted(f"Family {i}" for i in range(16))
+     assert sum(record_manager.duplicate_record_count for _, record_manager in results) == 15 == dedup_index.duplicate_count
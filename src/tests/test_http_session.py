@@ -0,0 +1,128 @@
+import pytest
+import requests
+import threading
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.scraper import Scraper
+from modules.utils.metrics import UnitMetrics
+from modules.utils.validator import SSMValueDictValidator
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from modules.utils.http_session import CappedRetry, DEFAULT_HTTP_CONFIG, get_http_config, get_retry, get_endpoint_prefix, mount_http_adapter
+
+APP = "fruit-project-api-scraper"
+TARGET_API_1 = "fruity-vice"
+FAST_HTTP_CONFIG = {"backoff_factor": 0, "backoff_jitter": 0, "retry_after_max": 0}
+
+class FlakyAPIHandler(BaseHTTPRequestHandler):
+  """
+  Responds with the statuses in server.statuses, one per request, followed by 200s
+  """
+  def do_GET(self):
+    self.server.request_count += 1
+    status = self.server.statuses.pop(0) if self.server.statuses else 200
+    body = b'[{"name": "Persimmon"}]' if status == 200 else b'unavailable'
+    self.send_response(status)
+    if status == 429:
+      self.send_header("Retry-After", "120")
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+@pytest.fixture
+def flaky_api_server():
+   server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyAPIHandler)
+   server.statuses = []
+   server.request_count = 0
+   thread = threading.Thread(target=server.serve_forever, daemon=True)
+   thread.start()
+   yield server
+   server.shutdown()
+   server.server_close()
+
+@pytest.fixture
+def target_api_1_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+
+@pytest.fixture
+def local_scraper_and_ssm_value_dict(flaky_api_server, target_api_1_ssm_value_dict):
+   target_api_1_ssm_value_dict["source_api_endpoint"] = f"http://127.0.0.1:{flaky_api_server.server_port}/api/fruit/all"
+   target_api_1_ssm_value_dict["http_config"] = dict(FAST_HTTP_CONFIG)
+   scraper = Scraper(APP, TARGET_API_1, requests.Session())
+   scraper.mount_http_adapter(target_api_1_ssm_value_dict)
+   yield scraper, target_api_1_ssm_value_dict
+   scraper.session.close()
+
+class TestHTTPSession:
+
+  def test_get_http_config_uses_defaults(self, target_api_1_ssm_value_dict):
+     assert get_http_config(target_api_1_ssm_value_dict) == DEFAULT_HTTP_CONFIG
+
+  def test_get_http_config_overrides_defaults(self, target_api_1_ssm_value_dict):
+     target_api_1_ssm_value_dict["http_config"] = {"max_retries": 5}
+     http_config = get_http_config(target_api_1_ssm_value_dict)
+     assert http_config["max_retries"] == 5 and http_config["read_timeout"] == DEFAULT_HTTP_CONFIG["read_timeout"]
+
+  def test_validator_raises_value_error_for_unknown_http_config_key(self, target_api_1_ssm_value_dict):
+     target_api_1_ssm_value_dict["http_config"] = {"dummy_key": 1}
+     with pytest.raises(ValueError):
+        SSMValueDictValidator(TARGET_API_1, target_api_1_ssm_value_dict).execute()
+
+  def test_get_endpoint_prefix(self):
+     assert get_endpoint_prefix("https://www.thecocktaildb.com/api/json/v1/1/search.php?f=a") == "https://www.thecocktaildb.com/"
+
+  def test_capped_retry_caps_retry_after(self):
+     retry = get_retry(dict(DEFAULT_HTTP_CONFIG, retry_after_max=2)).new()
+     assert isinstance(retry, CappedRetry) and retry.retry_after_max == 2
+
+  def test_mount_http_adapter_reuses_adapter_for_same_http_config(self):
+     session = requests.Session()
+     adapter_1 = mount_http_adapter(session, "https://www.thecocktaildb.com/api/json/v1/1/search.php?f=a", dict(DEFAULT_HTTP_CONFIG))
+     adapter_2 = mount_http_adapter(session, "https://www.thecocktaildb.com/api/json/v1/1/search.php?f=b", dict(DEFAULT_HTTP_CONFIG))
+     adapter_3 = mount_http_adapter(session, "https://www.thecocktaildb.com/api/json/v1/1/search.php?f=c", dict(DEFAULT_HTTP_CONFIG, max_retries=1))
+     assert adapter_1 is adapter_2 and adapter_3 is not adapter_1
+
+  def test_adapters_can_be_mounted_while_other_threads_get_adapters(self):
+     session = requests.Session()
+     stop = threading.Event()
+     errors = []
+
+     def get_adapters():
+        while not stop.is_set():
+           try:
+              session.get_adapter("https://www.thecocktaildb.com/api/json/v1/1/search.php?f=a")
+           except RuntimeError as e:
+              errors.append(e)
+
+     threads = [threading.Thread(target=get_adapters) for _ in range(4)]
+     for thread in threads:
+        thread.start()
+     for i in range(500):
+        mount_http_adapter(session, f"https://api-{i}.example.com/", dict(DEFAULT_HTTP_CONFIG))
+     stop.set()
+     for thread in threads:
+        thread.join()
+     assert errors == []
+     assert isinstance(session.get_adapter("https://api-1.example.com/fruit"), requests.adapters.HTTPAdapter)
+     assert session.get_adapter("http://other.example.com/") is session.adapters["http://"]
+
+  def test_scraper_retries_server_errors(self, flaky_api_server, local_scraper_and_ssm_value_dict):
+     scraper, ssm_value_dict = local_scraper_and_ssm_value_dict
+     flaky_api_server.statuses = [503, 429]
+     metrics = UnitMetrics()
+     api_records = scraper.get_api_records_from_endpoint(ssm_value_dict, metrics)
+     assert api_records == [{"name": "Persimmon"}] and flaky_api_server.request_count == 3
+     assert metrics.get_values()["http_retry_count"] == 2
+
+  def test_scraper_raises_once_retries_are_exhausted(self, flaky_api_server, local_scraper_and_ssm_value_dict):
+     scraper, ssm_value_dict = local_scraper_and_ssm_value_dict
+     ssm_value_dict["http_config"]["max_retries"] = 1
+     scraper.mount_http_adapter(ssm_value_dict)
+     flaky_api_server.statuses = [503, 503, 503]
+     with pytest.raises(Exception, match="status code: 503"):
+        scraper.get_api_records_from_endpoint(ssm_value_dict)
+     assert flaky_api_server.request_count == 2
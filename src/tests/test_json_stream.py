@@ -0,0 +1,41 @@
+import pytest
+import simplejson as json
+
+from modules.utils.json_stream import iter_json_records
+from test_sample_records.sample_api_records import cocktail_db_api_records, fruity_vice_api_records
+
+def get_chunks(document, chunk_size):
+   document = document.encode("utf-8")
+   return [document[i:i + chunk_size] for i in range(0, len(document), chunk_size)]
+
+class TestJSONStream:
+
+  @pytest.mark.parametrize("chunk_size", [1, 7, 65536])
+  def test_iter_json_records_for_top_level_list(self, chunk_size):
+     document = json.dumps(fruity_vice_api_records)
+     assert list(iter_json_records(get_chunks(document, chunk_size))) == json.loads(document)
+
+  @pytest.mark.parametrize("chunk_size", [1, 7, 65536])
+  def test_iter_json_records_for_records_key(self, chunk_size):
+     api_records = list(iter_json_records(get_chunks(cocktail_db_api_records, chunk_size), "drinks"))
+     assert api_records == json.loads(cocktail_db_api_records)["drinks"]
+
+  def test_iter_json_records_skips_other_keys(self):
+     document = '{"meta": {"count": [1, 2]}, "note": "drinks", "drinks": [{"strDrink": "Mojito"}], "after": 1}'
+     assert list(iter_json_records(get_chunks(document, 3), "drinks")) == [{"strDrink": "Mojito"}]
+
+  def test_iter_json_records_handles_multibyte_characters_split_across_chunks(self):
+     document = '[{"strDrink": "Café Crème"}, 12345]'
+     assert list(iter_json_records(get_chunks(document, 1))) == [{"strDrink": "Café Crème"}, 12345]
+
+  @pytest.mark.parametrize("document, records_key", [('{"drinks": null}', "drinks"), ('{"drinks": []}', "drinks"), ("[]", ""), ("null", "")])
+  def test_iter_json_records_yields_nothing_for_no_records(self, document, records_key):
+     assert list(iter_json_records(get_chunks(document, 2), records_key)) == []
+
+  def test_iter_json_records_raises_key_error_for_missing_records_key(self):
+     with pytest.raises(KeyError):
+        list(iter_json_records(get_chunks('{"meals": []}', 4), "drinks"))
+
+  def test_iter_json_records_raises_for_truncated_document(self):
+     with pytest.raises(json.JSONDecodeError):
+        list(iter_json_records(get_chunks('[{"name": "Persimmon"}, {"name": "Straw', 4)))
@@ -0,0 +1,56 @@
+import pytest
+import simplejson as json
+
+from modules.utils.metrics import RunMetrics, UnitMetrics, validate_metrics_format
+
+APP = "fruit-project-api-scraper"
+TARGET_API_2 = "the-cocktail-db"
+
+class TestMetrics:
+
+  @pytest.mark.parametrize("metrics_format", ["xml", None, ""])
+  def test_invalid_metrics_format_raises_value_error(self, metrics_format):
+     with pytest.raises(ValueError):
+        validate_metrics_format(metrics_format)
+
+  def test_unit_metrics_add_up(self):
+     unit_metrics = UnitMetrics()
+     unit_metrics.add("record_count", 25)
+     unit_metrics.add("record_count", 5)
+     unit_metrics.add_upload_summary({"batch_count": 2, "request_count": 3, "retry_count": 1, "consumed_capacity_units": 30.0})
+     with unit_metrics.time("fetch_seconds"):
+        pass
+     values = unit_metrics.get_values()
+     assert values["record_count"] == 30 and values["batch_count"] == 2 and values["consumed_capacity_units"] == 30.0
+     assert values["fetch_seconds"] >= 0
+
+  def test_json_unit_metrics_line(self):
+     lines = []
+     run_metrics = RunMetrics(APP, TARGET_API_2, "json", emit=lines.append)
+     run_metrics.get_unit_metrics("a").add("record_count", 25)
+     run_metrics.emit_unit_metrics("a")
+     assert json.loads(lines[0]) == {"app": APP, "source_api": TARGET_API_2, "scope": "unit", "unit": "a", "record_count": 25}
+
+  def test_emf_run_metrics_line(self):
+     lines = []
+     run_metrics = RunMetrics(APP, TARGET_API_2, "emf", emit=lines.append)
+     run_metrics.get_unit_metrics("a").add("record_count", 25)
+     run_metrics.get_unit_metrics("b").add("record_count", 5)
+     run_metrics.get_unit_metrics("b").add("fetch_seconds", 1.5)
+     with run_metrics.time("total_seconds"):
+        pass
+     run_metrics.emit_run_metrics()
+     line = json.loads(lines[0])
+     assert line["scope"] == "run" and line["record_count"] == 30 and line["unit_count"] == 2
+     assert "fetch_seconds" not in line and "total_seconds" in line
+     cloud_watch_metrics = line["_aws"]["CloudWatchMetrics"][0]
+     assert cloud_watch_metrics["Dimensions"] == [["source_api", "scope"]]
+     assert {"Name": "record_count", "Unit": "Count"} in cloud_watch_metrics["Metrics"]
+     assert {"Name": "total_seconds", "Unit": "Seconds"} in cloud_watch_metrics["Metrics"]
+
+  def test_none_metrics_format_emits_nothing(self):
+     lines = []
+     run_metrics = RunMetrics(APP, TARGET_API_2, "none", emit=lines.append)
+     run_metrics.emit_unit_metrics("a")
+     run_metrics.emit_run_metrics()
+     assert lines == []
@@ -0,0 +1,195 @@
+import types
+import simplejson as json
+import pytest
+import threading
+from copy import deepcopy
+from string import ascii_lowercase as alphabet
+
+from config.api_mapping import APIMapping
+from modules.scraper import Scraper
+from modules.orchestrator import Orchestrator, MultiSourceOrchestrator
+from modules.record_manager import RecordManager
+from modules.utils.api_mapping_manager import APIMappingManager
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+APP = "fruit-project-api-scraper"
+TARGET_API_1 = "fruity-vice"
+TARGET_API_2 = "the-cocktail-db"
+TARGET_API_3 = "the-meal-db"
+MISMATCH_MESSAGE = "There's a mismatch between api_record_keys and field_mapping_keys"
+
+@pytest.fixture
+def target_api_2_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+
+@pytest.fixture
+def target_api_2_mapping_manager():
+   api_mapping_manager = APIMappingManager(TARGET_API_2, APIMapping)
+   api_mapping_manager.execute()
+   return api_mapping_manager
+
+class TestOrchestrator:
+
+  def test_max_workers_defaults_to_1(self):
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+     assert orchestrator.max_workers == 1
+
+  @pytest.mark.parametrize("max_workers", [0, -1, "4", True])
+  def test_invalid_max_workers_raises_value_error(self, max_workers):
+     with pytest.raises(ValueError):
+        Orchestrator(APP, TARGET_API_2, max_workers)
+
+  @pytest.mark.parametrize("max_workers", [1, 4])
+  def test_alphabetical_scraping_rule_scrapes_every_letter(self, max_workers, target_api_2_ssm_value_dict, target_api_2_mapping_manager, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2, max_workers)
+     endpoints = []
+     lock = threading.Lock()
+
+     def mock_scrape_and_upload(scraper, ssm_value_dict, unit):
+        with lock:
+           endpoints.append(ssm_value_dict["source_api_endpoint"])
+
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db", mock_scrape_and_upload)
+     base_endpoint = target_api_2_ssm_value_dict["source_api_endpoint"]
+     orchestrator.scrape_and_upload_records_for_scraping_rule(None, target_api_2_mapping_manager.get_scraping_rule(target_api_2_ssm_value_dict, orchestrator.shard))
+
+     assert sorted(endpoints) == [f"{base_endpoint}?f={i}" for i in alphabet]
+     assert target_api_2_ssm_value_dict["source_api_endpoint"] == base_endpoint
+
+  def test_concurrent_scraping_raises_for_field_mapping_mismatch(self, target_api_2_ssm_value_dict, target_api_2_mapping_manager, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2, 4)
+
+     def mock_scrape_and_upload(scraper, ssm_value_dict, unit):
+        if ssm_value_dict["source_api_endpoint"].endswith("=c"):
+           raise ValueError(MISMATCH_MESSAGE)
+
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db", mock_scrape_and_upload)
+     with pytest.raises(ValueError, match=MISMATCH_MESSAGE):
+        orchestrator.scrape_and_upload_records_for_scraping_rule(None, target_api_2_mapping_manager.get_scraping_rule(target_api_2_ssm_value_dict, orchestrator.shard))
+
+  def test_delete_stale_records_is_skipped_when_no_records_were_scraped(self, target_api_2_ssm_value_dict, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+     deleted = []
+     monkeypatch.setattr(RecordManager, "delete_stale_records", lambda self, scraped_hash_keys: deleted.append(scraped_hash_keys))
+     orchestrator.delete_stale_records(target_api_2_ssm_value_dict)
+     orchestrator.scraped_hash_keys.add("Old Cuban")
+     orchestrator.delete_stale_records(target_api_2_ssm_value_dict)
+     assert deleted == [{"Old Cuban"}]
+
+  def test_streamed_records_are_passed_to_record_manager_as_a_generator(self, target_api_2_ssm_value_dict, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+     target_api_2_ssm_value_dict["http_config"] = {"stream_records": True}
+     executed = []
+
+     class MockScraper:
+        def iter_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
+           return ({"strDrink": str(i)} for i in range(120))
+
+        def save_cached_response(self, ssm_value_dict, hash_keys, record_count):
+           pass
+
+     def mock_execute(record_manager):
+        executed.append(isinstance(record_manager.api_records, types.GeneratorType))
+        record_manager.record_count = len(list(record_manager.api_records))
+
+     monkeypatch.setattr(RecordManager, "execute", mock_execute)
+     record_manager = orchestrator.upload_records_to_dynamo_db(MockScraper().iter_api_records_from_endpoint(target_api_2_ssm_value_dict), target_api_2_ssm_value_dict)
+     orchestrator.scrape_and_upload_records_to_dynamo_db(MockScraper(), target_api_2_ssm_value_dict)
+     assert executed == [True, True] and record_manager.record_count == 120
+
+  def test_streamed_letter_with_no_records_is_skipped(self, target_api_2_ssm_value_dict, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+     target_api_2_ssm_value_dict["http_config"] = {"stream_records": True}
+
+     class MockScraper:
+        def iter_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
+           return iter([])
+
+        def save_cached_response(self, ssm_value_dict, hash_keys, record_count):
+           pass
+
+     monkeypatch.setattr(RecordManager, "execute", lambda record_manager: None)
+     orchestrator.scrape_and_upload_records_to_dynamo_db(MockScraper(), target_api_2_ssm_value_dict)
+     assert orchestrator.scraped_hash_keys == set()
+
+  def test_summary_totals_uploads(self, target_api_2_ssm_value_dict, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2)
+
+     def mock_execute(record_manager):
+        record_manager.record_count = 30
+        record_manager.upload_summary = {"batch_count": 4, "request_count": 2, "retry_count": 1, "consumed_capacity_units": 30.0}
+
+     monkeypatch.setattr(RecordManager, "execute", mock_execute)
+     orchestrator.upload_records_to_dynamo_db([], target_api_2_ssm_value_dict)
+     orchestrator.upload_records_to_dynamo_db([], target_api_2_ssm_value_dict)
+     assert orchestrator.summary == {"record_count": 60, "batch_count": 8, "request_count": 4, "retry_count": 2, "consumed_capacity_units": 60.0, "throttle_count": 0,
+                                     "duplicate_record_count": 0, "letter_record_counts": {}}
+
+  def test_shard_scrapes_only_its_letters_and_counts_records(self, target_api_2_ssm_value_dict, target_api_2_mapping_manager, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2, shard="a-c")
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db",
+                         lambda scraper, ssm_value_dict, unit: 0 if ssm_value_dict["source_api_endpoint"].endswith("=b") else 10)
+     orchestrator.scrape_and_upload_records_for_scraping_rule(None, target_api_2_mapping_manager.get_scraping_rule(target_api_2_ssm_value_dict, orchestrator.shard))
+     assert orchestrator.summary["letter_record_counts"] == {"a": 10, "b": 0, "c": 10}
+
+  def test_numbered_shard_uses_letter_record_counts(self, target_api_2_ssm_value_dict, target_api_2_mapping_manager, monkeypatch):
+     target_api_2_ssm_value_dict["letter_record_counts"] = dict({letter: 1 for letter in alphabet}, s=1000)
+     orchestrator = Orchestrator(APP, TARGET_API_2, shard="1/2")
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db", lambda scraper, ssm_value_dict, unit: 1)
+     orchestrator.scrape_and_upload_records_for_scraping_rule(None, target_api_2_mapping_manager.get_scraping_rule(target_api_2_ssm_value_dict, orchestrator.shard))
+     assert list(orchestrator.summary["letter_record_counts"].keys()) == ["s"]
+
+  def test_metrics_are_emitted_for_each_letter(self, target_api_2_ssm_value_dict, target_api_2_mapping_manager, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2, shard="a-b")
+     lines = []
+     orchestrator.metrics.emit = lines.append
+
+     def mock_scrape_and_upload(scraper, ssm_value_dict, unit):
+        orchestrator.metrics.get_unit_metrics(unit).add("record_count", 10)
+        return 10
+
+     monkeypatch.setattr(orchestrator, "scrape_and_upload_records_to_dynamo_db", mock_scrape_and_upload)
+     orchestrator.scrape_and_upload_records_for_scraping_rule(None, target_api_2_mapping_manager.get_scraping_rule(target_api_2_ssm_value_dict, orchestrator.shard))
+     assert sorted(json.loads(line)["unit"] for line in lines) == ["a", "b"]
+     assert orchestrator.metrics.emit_run_metrics()["record_count"] == 20
+
+  def test_invalid_shard_raises_value_error(self):
+     with pytest.raises(ValueError):
+        Orchestrator(APP, TARGET_API_2, shard="9/8")
+
+  def test_stale_records_are_not_deleted_for_a_shard(self, target_api_2_ssm_value_dict, monkeypatch):
+     orchestrator = Orchestrator(APP, TARGET_API_2, shard="2/4")
+     orchestrator.scraped_hash_keys.add("Margarita")
+     monkeypatch.setattr(RecordManager, "delete_stale_records", lambda record_manager, hash_keys: pytest.fail("delete_stale_records was called"))
+     orchestrator.delete_stale_records(target_api_2_ssm_value_dict)
+
+
+class TestMultiSourceOrchestrator:
+
+  @pytest.mark.parametrize("source_api_names", [TARGET_API_1, [], [TARGET_API_1, 1], [TARGET_API_1, TARGET_API_1]])
+  def test_invalid_source_api_names_raises_value_error(self, source_api_names):
+     with pytest.raises(ValueError):
+        MultiSourceOrchestrator(APP, source_api_names)
+
+  def test_sources_are_scraped_concurrently_and_failures_are_isolated(self, monkeypatch):
+     source_api_names = [TARGET_API_1, TARGET_API_2, TARGET_API_3]
+     barrier = threading.Barrier(len(source_api_names), timeout=5)
+     prefetched = []
+
+     def mock_execute(orchestrator):
+        # Each source waits for the others, so this only passes if they run at the same time
+        barrier.wait()
+        if orchestrator.source_api_name == TARGET_API_3:
+           raise ValueError(MISMATCH_MESSAGE)
+        orchestrator.summary["record_count"] = len(orchestrator.source_api_name)
+        return orchestrator.summary
+
+     monkeypatch.setattr(Orchestrator, "execute", mock_execute)
+     monkeypatch.setattr(Scraper, "prefetch_ssm_value_dicts", lambda scraper, names: prefetched.append(list(names)))
+     results = MultiSourceOrchestrator(APP, source_api_names, max_workers=2).execute()
+
+     assert prefetched == [source_api_names]
+     assert list(results.keys()) == source_api_names
+     assert results[TARGET_API_1]["status"] == results[TARGET_API_2]["status"] == "succeeded"
+     assert results[TARGET_API_2]["record_count"] == len(TARGET_API_2)
+     assert results[TARGET_API_3] == {"status": "failed", "error": f"ValueError: {MISMATCH_MESSAGE}", "seconds": results[TARGET_API_3]["seconds"]}
@@ -0,0 +1,121 @@
+import json
+import pytest
+import requests
+import threading
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.scraper import Scraper
+from modules.utils.metrics import UnitMetrics
+from modules.utils.http_session import DEFAULT_HTTP_CONFIG
+from modules.utils.rate_limiter import RATE_LIMIT_CONFIG_KEYS, AdaptiveRateLimiter, get_rate_limiter
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+APP = "fruit-project-api-scraper"
+TARGET_API_1 = "fruity-vice"
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.now += seconds
+
+@pytest.fixture
+def clock():
+   return FakeClock()
+
+def get_rate_limiter_for_test(clock, **rate_limit_config):
+   rate_limit_config = dict({key: DEFAULT_HTTP_CONFIG[key] for key in RATE_LIMIT_CONFIG_KEYS}, **rate_limit_config)
+   return AdaptiveRateLimiter(rate_limit_config, clock=clock, sleep=clock.sleep)
+
+class ThrottlingAPIHandler(BaseHTTPRequestHandler):
+  """
+  Returns a 429 for the first server.throttled_request_count requests, then a list of records
+  """
+  def do_GET(self):
+    self.server.request_count += 1
+    if self.server.request_count <= self.server.throttled_request_count:
+      self.send_response(429)
+      self.send_header("Retry-After", "0")
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+      return
+    body = json.dumps([{"name": "Persimmon", "id": 52}]).encode("utf-8")
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+@pytest.fixture
+def throttling_api_server():
+   server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingAPIHandler)
+   server.request_count = 0
+   server.throttled_request_count = 1
+   thread = threading.Thread(target=server.serve_forever, daemon=True)
+   thread.start()
+   yield server
+   server.shutdown()
+   server.server_close()
+
+class TestAdaptiveRateLimiter:
+
+  def test_burst_is_not_delayed_and_later_requests_wait_for_tokens(self, clock):
+     rate_limiter = get_rate_limiter_for_test(clock, rate_limit_initial_rate=2, rate_limit_burst=2)
+     wait_seconds = [rate_limiter.acquire()[1] for _ in range(4)]
+     assert wait_seconds == [0, 0, 0.5, 0.5]
+     assert clock.now == 1.0
+
+  def test_healthy_responses_raise_the_rate_up_to_max_rate(self, clock):
+     rate_limiter = get_rate_limiter_for_test(clock, rate_limit_initial_rate=5, rate_limit_max_rate=6, rate_limit_increase=0.5)
+     for _ in range(3):
+        sent_at, _ = rate_limiter.acquire()
+        assert not rate_limiter.record_response(sent_at, [200], 0.1)
+     assert rate_limiter.rate == 6
+
+  @pytest.mark.parametrize("status_codes, latency", [([429, 200], 0.1), ([503], 0.1), (None, 0.1), ([200], 3)])
+  def test_unhealthy_responses_cut_the_rate(self, clock, status_codes, latency):
+     rate_limiter = get_rate_limiter_for_test(clock, rate_limit_initial_rate=4, rate_limit_decrease_factor=0.5)
+     sent_at, _ = rate_limiter.acquire()
+     assert rate_limiter.record_response(sent_at, status_codes, latency)
+     assert rate_limiter.rate == 2 and rate_limiter.tokens <= 0
+
+  def test_requests_in_flight_when_the_rate_is_cut_only_cut_it_once(self, clock):
+     rate_limiter = get_rate_limiter_for_test(clock, rate_limit_initial_rate=4, rate_limit_min_rate=1, rate_limit_decrease_factor=0.5)
+     sent_ats = [rate_limiter.acquire()[0] for _ in range(3)]
+     clock.now += 0.1
+     cuts = [rate_limiter.record_response(sent_at, [429], 0.1) for sent_at in sent_ats]
+     assert cuts == [True, False, False] and rate_limiter.rate == 2
+     sent_at, _ = rate_limiter.acquire()
+     assert rate_limiter.record_response(sent_at, [429], 0.1) and rate_limiter.rate == 1
+     sent_at, _ = rate_limiter.acquire()
+     rate_limiter.record_response(sent_at, [429], 0.1)
+     assert rate_limiter.rate == 1
+
+  def test_get_rate_limiter_is_shared_until_config_changes(self):
+     http_config = dict(DEFAULT_HTTP_CONFIG, rate_limit=True)
+     rate_limiter = get_rate_limiter(TARGET_API_1, http_config)
+     assert get_rate_limiter(TARGET_API_1, dict(http_config)) is rate_limiter
+     assert get_rate_limiter(TARGET_API_1, dict(http_config, rate_limit_max_rate=10)) is not rate_limiter
+     assert get_rate_limiter(TARGET_API_1, DEFAULT_HTTP_CONFIG) is None
+
+  def test_scraper_cuts_the_rate_for_a_retried_429(self, throttling_api_server):
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+     ssm_value_dict["source_api_endpoint"] = f"http://127.0.0.1:{throttling_api_server.server_port}/api/fruit/all"
+     ssm_value_dict["http_config"] = {"rate_limit": True, "backoff_factor": 0, "backoff_jitter": 0}
+     scraper = Scraper(APP, TARGET_API_1, requests.Session())
+     scraper.mount_http_adapter(ssm_value_dict)
+     metrics = UnitMetrics()
+     api_records = scraper.get_api_records_from_endpoint(ssm_value_dict, metrics)
+     scraper.session.close()
+     rate_limiter = get_rate_limiter(TARGET_API_1, dict(DEFAULT_HTTP_CONFIG, rate_limit=True))
+     assert api_records == [{"name": "Persimmon", "id": 52}]
+     assert rate_limiter.rate == DEFAULT_HTTP_CONFIG["rate_limit_initial_rate"] * DEFAULT_HTTP_CONFIG["rate_limit_decrease_factor"]
+     assert metrics.get_values()["throttled_count"] == 1
@@ -4,6 +4,8 @@ import pytest
 from copy import deepcopy
 from moto import mock_aws
 from modules.record_manager import RecordManager
+from modules.utils.aws_clients import reset_aws_clients
+from modules.utils.validator import SSMValueDictValidator
 from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
 from test_sample_records.sample_api_records import sample_api_response_dicts
 
@@ -170,3 +172,73 @@ class TestRecordManager:
        response = target_api_1_record_manager.upload_batch_to_dynamo_db(dynamo_db_resource, target_api_1_delete_request_record_batch)
        assert response["ResponseMetadata"]["HTTPStatusCode"] == 200
 
+
+    def test_get_batch_item_group_for_delete_put_write_mode(self, target_api_1_record_manager, target_api_1_record_batch, target_api_1_delete_request_record_batch, target_api_1_put_request_record_batch):
+       batch_item_group = target_api_1_record_manager.get_batch_item_group(target_api_1_record_batch)
+       assert batch_item_group == [target_api_1_delete_request_record_batch, target_api_1_put_request_record_batch]
+
+    def test_get_batch_item_group_for_upsert_write_mode(self, target_api_1_ssm_value_dict, target_api_1_record_batch, target_api_1_put_request_record_batch):
+       target_api_1_ssm_value_dict["upload_config"] = {"write_mode": "upsert"}
+       record_manager = RecordManager([], target_api_1_ssm_value_dict)
+       assert record_manager.get_batch_item_group(target_api_1_record_batch) == [target_api_1_put_request_record_batch]
+
+    @mock_aws
+    def test_delete_stale_records_only_deletes_records_not_scraped(self, target_api_1_ssm_value_dict, monkeypatch):
+       monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+       reset_aws_clients()
+       dynamo_db_resource = boto3.resource('dynamodb', region_name = REGION)
+       table = dynamo_db_resource.create_table(TableName = TARGET_DYNAMO_DB_TABLE_NAME,
+                                               KeySchema = [{'AttributeName': 'name', 'KeyType': 'HASH'}],
+                                               AttributeDefinitions = [{"AttributeName": "name", "AttributeType": "S"}],
+                                               BillingMode = 'PAY_PER_REQUEST')
+       for name in ["Persimmon", "Strawberry", "Durian"]:
+          table.put_item(Item={"name": name})
+       record_manager = RecordManager([], target_api_1_ssm_value_dict)
+       upload_summary = record_manager.delete_stale_records({"Persimmon", "Strawberry"})
+       reset_aws_clients()
+       assert record_manager.get_table_hash_keys(dynamo_db_resource) == {"Persimmon", "Strawberry"}
+       assert upload_summary["batch_count"] == 1
+
+    def test_validator_raises_value_error_for_unknown_write_mode(self, target_api_1_ssm_value_dict):
+       target_api_1_ssm_value_dict["upload_config"] = {"write_mode": "dummy"}
+       with pytest.raises(ValueError):
+          SSMValueDictValidator(TARGET_API_1, target_api_1_ssm_value_dict).execute()
+
+    def test_iter_transformed_records_accepts_generator(self, target_api_2_record_manager, target_api_2_api_records, target_api_2_fields_post_transformation):
+       api_records = target_api_2_record_manager.iter_transformed_records(api_record for api_record in target_api_2_api_records)
+       assert isinstance(api_records, types.GeneratorType)
+       api_records = list(api_records)
+       assert len(api_records) == len(target_api_2_api_records)
+       assert sorted(api_records[0].keys()) == sorted(target_api_2_fields_post_transformation)
+
+    def test_iter_transformed_records_raises_value_error_for_mismatch(self, target_api_1_record_manager, target_api_1_records):
+       for api_record in target_api_1_records:
+          api_record.pop("genus")
+       with pytest.raises(ValueError, match="mismatch between api_record_keys and field_mapping_keys"):
+          next(target_api_1_record_manager.iter_transformed_records(iter(target_api_1_records)))
+
+    @pytest.mark.parametrize("first_api_record", ["junk", None, {"name": "Kiwi", "id": 66}])
+    def test_iter_transformed_records_leaves_out_a_malformed_first_record(self, target_api_1_ssm_value_dict, target_api_1_records, first_api_record):
+       record_manager = RecordManager([], target_api_1_ssm_value_dict)
+       transformed_records = list(record_manager.iter_transformed_records(iter([first_api_record] + target_api_1_records)))
+       assert [record["name"] for record in transformed_records] == [record["name"] for record in target_api_1_records]
+       assert record_manager.api_record_validator.invalid_record_count == 1
+
+    def test_iter_transformed_records_raises_value_error_when_no_record_is_a_dict(self, target_api_1_ssm_value_dict):
+       with pytest.raises(ValueError, match="mismatch"):
+          list(RecordManager([], target_api_1_ssm_value_dict).iter_transformed_records(["junk", 1]))
+       assert list(RecordManager([], target_api_1_ssm_value_dict).iter_transformed_records([])) == []
+
+    def test_iter_transformed_records_leaves_out_malformed_records(self, target_api_1_ssm_value_dict, target_api_1_records):
+       api_records = deepcopy(target_api_1_records) + [{"name": "Kiwi", "id": 66}, "Lemon", dict(target_api_1_records[0], name=None)]
+       record_manager = RecordManager([], target_api_1_ssm_value_dict)
+       transformed_records = list(record_manager.iter_transformed_records(api_records))
+       record_manager.report_invalid_records()
+       report = record_manager.api_record_validator.get_report()
+       assert [record["name"] for record in transformed_records] == [record["name"] for record in target_api_1_records]
+       assert report["invalid_record_count"] == 3 and report["heterogeneous_record_count"] == 2 and report["shape_count"] == 2
+       assert "Kiwi" in record_manager.hash_keys
+
+    def test_get_record_batches_for_generator(self, target_api_1_record_manager):
+       record_batches = list(target_api_1_record_manager.get_record_batches(({"name": str(i)} for i in range(60)), 25))
+       assert [len(record_batch) for record_batch in record_batches] == [25, 25, 10]
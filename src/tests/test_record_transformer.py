@@ -0,0 +1,77 @@
+import pytest
+from copy import deepcopy
+
+from modules.record_manager import RecordManager
+from modules.utils.record_transformer import compile_record_transformer
+from modules.utils.compact_record import CompactRecord, make_compact_record_class
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from test_sample_records.sample_api_records import sample_api_response_dicts
+
+TARGET_API_1 = "fruity-vice"
+TARGET_API_2 = "the-cocktail-db"
+
+def get_api_records(target_api):
+   api_records = deepcopy(sample_api_response_dicts[target_api])
+   return api_records["drinks"] if isinstance(api_records, dict) else api_records
+
+def get_records_from_list_methods(record_manager, api_records, ssm_value_dict):
+   api_records = record_manager.remove_fields_not_needed(api_records, ssm_value_dict["field_mapping"])
+   api_records = record_manager.rename_fields(api_records, ssm_value_dict["field_mapping"])
+   if "ingredient_max_count" in ssm_value_dict["custom_field_info"]:
+      api_records = record_manager.prepare_ingredients_doc(api_records, ssm_value_dict)
+   return api_records
+
+class TestRecordTransformer:
+
+  @pytest.mark.parametrize("target_api", [TARGET_API_1, TARGET_API_2])
+  def test_compiled_transformer_matches_list_methods(self, target_api):
+     ssm_value_dict = sample_ssm_value_dicts[target_api]
+     record_manager = RecordManager([], ssm_value_dict)
+     transform_record = compile_record_transformer(ssm_value_dict["field_mapping"], ssm_value_dict["custom_field_info"], record_manager.timestamp)
+     compiled_records = [transform_record(api_record) for api_record in get_api_records(target_api)]
+     assert compiled_records == get_records_from_list_methods(record_manager, get_api_records(target_api), ssm_value_dict)
+
+  def test_compiled_transformer_does_not_change_api_record(self):
+     ssm_value_dict = sample_ssm_value_dicts[TARGET_API_2]
+     api_record = get_api_records(TARGET_API_2)[0]
+     original_api_record = deepcopy(api_record)
+     compile_record_transformer(ssm_value_dict["field_mapping"], ssm_value_dict["custom_field_info"], "")(api_record)
+     assert api_record == original_api_record
+
+  def test_compiled_transformer_raises_key_error_for_missing_field(self):
+     ssm_value_dict = sample_ssm_value_dicts[TARGET_API_1]
+     api_record = get_api_records(TARGET_API_1)[0]
+     api_record.pop("genus")
+     with pytest.raises(KeyError):
+        compile_record_transformer(ssm_value_dict["field_mapping"], ssm_value_dict["custom_field_info"], "")(api_record)
+
+  def test_compile_raises_key_error_for_missing_ingredient_mapping(self):
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+     ssm_value_dict["custom_field_info"]["ingredient_max_count"] = 16
+     with pytest.raises(KeyError):
+        compile_record_transformer(ssm_value_dict["field_mapping"], ssm_value_dict["custom_field_info"], "")
+
+  def test_compiled_transformer_makes_compact_records(self):
+     ssm_value_dict = sample_ssm_value_dicts[TARGET_API_2]
+     api_record = get_api_records(TARGET_API_2)[0]
+     compact_record = compile_record_transformer(ssm_value_dict["field_mapping"], ssm_value_dict["custom_field_info"], "")(api_record)
+     item = compact_record.to_dict()
+     assert isinstance(compact_record, CompactRecord) and not hasattr(compact_record, "__dict__")
+     assert type(item) is dict and item == dict(compact_record.items())
+     assert item["ingredients"][0] == {"ingredient_1": api_record["strIngredient1"], "measure_1": api_record["strMeasure1"]}
+
+  def test_compact_record_keeps_keys_set_after_it_is_made(self):
+     record_class = make_compact_record_class(("name", "ingredients"), {"ingredients": list})
+     compact_record = record_class("Mojito", ("Rum",))
+     compact_record["content_hash"] = "abc"
+     compact_record["name"] = "Daiquiri"
+     assert compact_record.to_dict() == {"name": "Daiquiri", "ingredients": ["Rum"], "content_hash": "abc"}
+     assert len(compact_record) == 3 and "content_hash" in compact_record
+     with pytest.raises(KeyError):
+        compact_record["glass"]
+
+  def test_put_requests_are_made_with_item_dicts(self):
+     ssm_value_dict = sample_ssm_value_dicts[TARGET_API_1]
+     record_manager = RecordManager([], ssm_value_dict)
+     compact_record = next(record_manager.iter_transformed_records(get_api_records(TARGET_API_1)))
+     assert type(record_manager.get_dynamo_db_put_request_dict(compact_record)["PutRequest"]["Item"]) is dict
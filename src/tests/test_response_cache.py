@@ -0,0 +1,148 @@
+import os
+import json
+import pytest
+import requests
+import threading
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.scraper import Scraper
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from modules.utils.response_cache import ResponseCache, get_config_hash
+
+APP = "fruit-project-api-scraper"
+TARGET_API_1 = "fruity-vice"
+API_RECORDS = [{"name": "Persimmon", "id": 52, "family": "Ebenaceae", "order": "Rosales", "genus": "Diospyros"},
+               {"name": "Strawberry", "id": 3, "family": "Rosaceae", "order": "Rosales", "genus": "Fragaria"}]
+
+class CachingAPIHandler(BaseHTTPRequestHandler):
+  """
+  Serves server.body, with server.etag as the ETag if it is set, and a 304 if If-None-Match matches it
+  """
+  def do_GET(self):
+    self.server.request_headers.append(dict(self.headers))
+    if self.server.etag and self.headers.get("If-None-Match") == self.server.etag:
+      self.send_response(304)
+      self.end_headers()
+      return
+    self.send_response(200)
+    if self.server.etag:
+      self.send_header("ETag", self.server.etag)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(self.server.body)))
+    self.end_headers()
+    self.wfile.write(self.server.body)
+
+  def log_message(self, *args):
+    pass
+
+@pytest.fixture
+def caching_api_server():
+   server = ThreadingHTTPServer(("127.0.0.1", 0), CachingAPIHandler)
+   server.body = json.dumps(API_RECORDS).encode("utf-8")
+   server.etag = '"v1"'
+   server.request_headers = []
+   thread = threading.Thread(target=server.serve_forever, daemon=True)
+   thread.start()
+   yield server
+   server.shutdown()
+   server.server_close()
+
+@pytest.fixture
+def target_api_1_ssm_value_dict(caching_api_server, tmp_path):
+   ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+   ssm_value_dict["source_api_endpoint"] = f"http://127.0.0.1:{caching_api_server.server_port}/api/fruit/all"
+   ssm_value_dict["http_config"] = {"response_cache": True, "response_cache_dir": str(tmp_path)}
+   return ssm_value_dict
+
+@pytest.fixture
+def scraper():
+   scraper = Scraper(APP, TARGET_API_1, requests.Session())
+   yield scraper
+   scraper.session.close()
+
+@pytest.fixture
+def uploaded_record_counts(monkeypatch):
+   """
+   RecordManager.execute is replaced, so records are counted rather than uploaded
+   """
+   uploaded_record_counts = []
+
+   def mock_execute(record_manager):
+      for api_record in record_manager.iter_records_collecting_hash_keys(record_manager.iter_transformed_records(record_manager.api_records)):
+         pass
+      uploaded_record_counts.append(record_manager.record_count)
+
+   monkeypatch.setattr(RecordManager, "execute", mock_execute)
+   return uploaded_record_counts
+
+class TestResponseCache:
+
+  def test_get_returns_entry_for_same_config_hash(self, tmp_path):
+     response_cache = ResponseCache(str(tmp_path), 1024)
+     response_cache.put("https://example.com/a", {"etag": '"v1"', "config_hash": "x"})
+     assert response_cache.get("https://example.com/a", "x") == {"etag": '"v1"', "config_hash": "x"}
+     assert response_cache.get("https://example.com/a", "y") is None
+     assert response_cache.get("https://example.com/b", "x") is None
+
+  def test_endpoints_are_not_written_to_disk(self, tmp_path):
+     ResponseCache(str(tmp_path), 1024).put("https://example.com/?api_key=secret", {"config_hash": "x"})
+     assert all("secret" not in entry_path.name and "secret" not in entry_path.read_text() for entry_path in tmp_path.iterdir())
+
+  def test_least_recently_used_entries_are_evicted(self, tmp_path):
+     response_cache = ResponseCache(str(tmp_path), 10 ** 6)
+     for i, endpoint in enumerate(["a", "b", "c"]):
+        response_cache.put(endpoint, {"config_hash": "x", "hash_keys": ["k" * 40]})
+        os.utime(response_cache.get_entry_path(endpoint), ns=(i, i))
+     response_cache.get("a", "x")
+     response_cache.max_bytes = 2 * os.path.getsize(response_cache.get_entry_path("a"))
+     response_cache.evict()
+     assert response_cache.get("b", "x") is None
+     assert response_cache.get("a", "x") is not None and response_cache.get("c", "x") is not None
+
+  def test_not_modified_response_is_skipped(self, scraper, target_api_1_ssm_value_dict, caching_api_server, uploaded_record_counts):
+     orchestrator = Orchestrator(APP, TARGET_API_1)
+     assert orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict) == 2
+     assert orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict) == 2
+
+     assert uploaded_record_counts == [2]
+     assert caching_api_server.request_headers[1]["If-None-Match"] == '"v1"'
+     rerun_orchestrator = Orchestrator(APP, TARGET_API_1)
+     rerun_orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     assert rerun_orchestrator.scraped_hash_keys == {"Persimmon", "Strawberry"}
+
+  def test_response_with_same_body_is_skipped(self, scraper, target_api_1_ssm_value_dict, caching_api_server, uploaded_record_counts):
+     caching_api_server.etag = None
+     orchestrator = Orchestrator(APP, TARGET_API_1)
+     orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     caching_api_server.body = json.dumps(API_RECORDS[:1]).encode("utf-8")
+     orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     assert uploaded_record_counts == [2, 1]
+
+  def test_changed_config_is_not_skipped(self, scraper, target_api_1_ssm_value_dict, caching_api_server, uploaded_record_counts):
+     orchestrator = Orchestrator(APP, TARGET_API_1)
+     orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     target_api_1_ssm_value_dict["field_mapping"]["genus"] = "genus2"
+     orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     assert uploaded_record_counts == [2, 2]
+     assert "If-None-Match" not in caching_api_server.request_headers[1]
+
+  def test_response_is_not_cached_if_upload_fails(self, scraper, target_api_1_ssm_value_dict, monkeypatch):
+     def mock_execute(record_manager):
+        raise Exception("Error - items are still unprocessed")
+
+     monkeypatch.setattr(RecordManager, "execute", mock_execute)
+     with pytest.raises(Exception):
+        Orchestrator(APP, TARGET_API_1).scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     response_cache = ResponseCache(target_api_1_ssm_value_dict["http_config"]["response_cache_dir"], 1024)
+     assert response_cache.get(target_api_1_ssm_value_dict["source_api_endpoint"], get_config_hash(target_api_1_ssm_value_dict)) is None
+
+  def test_streamed_not_modified_response_is_skipped(self, scraper, target_api_1_ssm_value_dict, uploaded_record_counts):
+     target_api_1_ssm_value_dict["http_config"]["stream_records"] = True
+     orchestrator = Orchestrator(APP, TARGET_API_1)
+     orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict)
+     assert orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_1_ssm_value_dict) == 2
+     assert uploaded_record_counts == [2]
@@ -95,10 +95,35 @@ class TestScraper:
       def mock_get(*args, **kwargs):
          return MockAPIResponse()
 
-      # apply the monkeypatch for requests.get to mock_get
-      monkeypatch.setattr(requests, "get", mock_get)
+      # apply the monkeypatch for requests.Session.get to mock_get
+      monkeypatch.setattr(requests.Session, "get", mock_get)
 
-      # app.get_json, which contains requests.get, uses the monkeypatch
+      # get_api_records_from_endpoint, which contains self.session.get, uses the monkeypatch
       result = target_api_1_scraper_instance.get_api_records_from_endpoint(target_api_1_ssm_value_dict)
 
-      assert result[0].keys() == api_records[0].keys()
\ No newline at end of file
+      assert result[0].keys() == api_records[0].keys()
+
+   def test_iter_api_records_from_endpoint_streams_records(self, target_api_1_scraper_instance, target_api_1_ssm_value_dict, target_api_1_response_dict, monkeypatch):
+      document = json.dumps(target_api_1_response_dict).encode("utf-8")
+
+      class MockStreamedAPIResponse(object):
+        def __init__(self):
+          self.status_code = 200
+
+        def iter_content(self, chunk_size):
+          return (document[i:i + chunk_size] for i in range(0, len(document), chunk_size))
+
+        def __enter__(self):
+          return self
+
+        def __exit__(self, *args):
+          pass
+
+      def mock_get(*args, **kwargs):
+         assert kwargs["stream"] is True
+         return MockStreamedAPIResponse()
+
+      monkeypatch.setattr(requests.Session, "get", mock_get)
+      target_api_1_ssm_value_dict["http_config"] = {"stream_records": True, "stream_chunk_size": 16}
+      api_records = list(target_api_1_scraper_instance.iter_api_records_from_endpoint(target_api_1_ssm_value_dict))
+      assert api_records == target_api_1_response_dict
@@ -0,0 +1,108 @@
+import pytest
+from copy import deepcopy
+from string import ascii_lowercase as alphabet
+
+from config.api_mapping import APIMapping
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from modules.utils.api_mapping_manager import get_api_group_index
+from modules.utils.scraping_rules import SCRAPING_RULES, ScrapingRule, get_scraping_rule, register_scraping_rule
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+APP = "fruit-project-api-scraper"
+TARGET_API_2 = "the-cocktail-db"
+
+@pytest.fixture
+def target_api_2_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+
+def get_endpoints(scraping_rule, record_counts=None):
+   """
+   -> list : endpoints yielded by scraping_rule, with record_counts for each unit passed back to it
+   """
+   endpoints = []
+   for unit, unit_ssm_value_dict in scraping_rule.iter_units():
+      endpoints.append(unit_ssm_value_dict["source_api_endpoint"])
+      if record_counts is not None:
+         scraping_rule.record_unit(unit, record_counts.pop(0))
+   return endpoints
+
+class TestScrapingRules:
+
+  def test_get_api_group_index(self):
+     assert get_api_group_index(APIMapping) == {"fruity-vice": "fruity-vice", "the-cocktail-db": "the-data-db", "the-meal-db": "the-data-db"}
+     assert get_api_group_index(APIMapping) is get_api_group_index(APIMapping)
+
+  def test_unsupported_scraping_rule_type_raises_value_error(self, target_api_2_ssm_value_dict):
+     with pytest.raises(ValueError, match="not supported"):
+        get_scraping_rule({"type": "dummy"}, target_api_2_ssm_value_dict)
+
+  def test_scraping_rules_can_be_registered(self, target_api_2_ssm_value_dict):
+     @register_scraping_rule("fixed_endpoints")
+     class FixedEndpointsScrapingRule(ScrapingRule):
+        def iter_endpoints(self):
+           for endpoint in self.scraping_rule_dict["endpoints"]:
+              yield endpoint, endpoint
+
+     try:
+        scraping_rule = get_scraping_rule({"type": "fixed_endpoints", "endpoints": ["x", "y"]}, target_api_2_ssm_value_dict)
+        assert get_endpoints(scraping_rule) == ["x", "y"]
+     finally:
+        SCRAPING_RULES.pop("fixed_endpoints")
+
+  def test_default_scraping_rule_is_only_applied_by_the_first_shard(self, target_api_2_ssm_value_dict):
+     base_endpoint = target_api_2_ssm_value_dict["source_api_endpoint"]
+     assert get_endpoints(get_scraping_rule({"query": "", "type": "default"}, target_api_2_ssm_value_dict)) == [base_endpoint]
+     assert get_endpoints(get_scraping_rule({"query": "", "type": "default"}, target_api_2_ssm_value_dict, "2/4")) == []
+
+  def test_alphabetical_scraping_rule(self, target_api_2_ssm_value_dict):
+     base_endpoint = target_api_2_ssm_value_dict["source_api_endpoint"]
+     scraping_rule = get_scraping_rule({"query": "?f=", "type": "alphabetical"}, target_api_2_ssm_value_dict)
+     assert get_endpoints(scraping_rule) == [f"{base_endpoint}?f={i}" for i in alphabet]
+
+  def test_numeric_range_scraping_rule_stops_after_a_short_page(self, target_api_2_ssm_value_dict):
+     base_endpoint = target_api_2_ssm_value_dict["source_api_endpoint"]
+     scraping_rule_dict = {"type": "numeric_range", "query": "?page=", "start": 1, "page_size": 50, "page_size_query": "&per_page="}
+     scraping_rule = get_scraping_rule(scraping_rule_dict, target_api_2_ssm_value_dict)
+     assert not scraping_rule.concurrent
+     assert get_endpoints(scraping_rule, [50, 50, 20]) == [f"{base_endpoint}?page={i}&per_page=50" for i in [1, 2, 3]]
+
+  def test_numeric_range_scraping_rule_with_stop_is_concurrent(self, target_api_2_ssm_value_dict):
+     scraping_rule = get_scraping_rule({"type": "numeric_range", "query": "?page=", "start": 1, "stop": 4}, target_api_2_ssm_value_dict)
+     assert scraping_rule.concurrent and len(get_endpoints(scraping_rule)) == 3
+
+  def test_offset_scraping_rule(self, target_api_2_ssm_value_dict):
+     base_endpoint = target_api_2_ssm_value_dict["source_api_endpoint"]
+     scraping_rule = get_scraping_rule({"type": "offset", "query": "?offset=", "page_size": 100, "page_size_query": "&limit="}, target_api_2_ssm_value_dict)
+     assert get_endpoints(scraping_rule, [100, 0]) == [f"{base_endpoint}?offset={i}&limit=100" for i in [0, 100]]
+
+  @pytest.mark.parametrize("scraping_rule_dict", [{"type": "offset", "query": "?offset="},
+                                                  {"type": "numeric_range", "query": "?page=", "step": 0},
+                                                  {"type": "numeric_range", "query": "?page=", "start": "1"},
+                                                  {"type": "cursor", "query": "?cursor="}])
+  def test_invalid_scraping_rule_values_raise_value_error(self, target_api_2_ssm_value_dict, scraping_rule_dict):
+     with pytest.raises(ValueError):
+        get_scraping_rule(scraping_rule_dict, target_api_2_ssm_value_dict)
+
+  def test_cursor_scraping_rule_follows_cursors_from_responses(self, target_api_2_ssm_value_dict, monkeypatch):
+     base_endpoint = target_api_2_ssm_value_dict["source_api_endpoint"]
+     target_api_2_ssm_value_dict["source_api_records_key"] = "drinks"
+     responses = {base_endpoint: {"drinks": [{"strDrink": "A1"}], "next_cursor": "b/2"},
+                  f"{base_endpoint}?cursor=b%2F2": {"drinks": [{"strDrink": "B1"}], "next_cursor": "c"},
+                  f"{base_endpoint}?cursor=c": {"drinks": [{"strDrink": "C1"}], "next_cursor": None}}
+
+     class MockScraper:
+        def get_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
+           return deepcopy(responses[ssm_value_dict["source_api_endpoint"]])
+
+        def save_cached_response(self, ssm_value_dict, hash_keys, record_count):
+           pass
+
+     def mock_execute(record_manager):
+        record_manager.record_count = len(record_manager.api_records)
+
+     monkeypatch.setattr(RecordManager, "execute", mock_execute)
+     orchestrator = Orchestrator(APP, TARGET_API_2, max_workers=4)
+     scraping_rule = get_scraping_rule({"type": "cursor", "query": "?cursor=", "cursor_key": "next_cursor"}, target_api_2_ssm_value_dict)
+     orchestrator.scrape_and_upload_records_for_scraping_rule(MockScraper(), scraping_rule)
+     assert orchestrator.summary["record_count"] == 3
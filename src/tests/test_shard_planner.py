@@ -0,0 +1,42 @@
+import pytest
+from string import ascii_lowercase as alphabet
+
+from modules.utils.shard_planner import parse_shard, plan_shards, get_shard_letters, is_first_shard
+
+class TestShardPlanner:
+
+  @pytest.mark.parametrize("shard, expected", [(None, (list(alphabet), None)),
+                                               ("3/8", (3, 8)),
+                                               ("a-c", (["a", "b", "c"], None)),
+                                               ("x, a-b,z", (["a", "b", "x", "z"], None)),
+                                               ("B", (["b"], None))])
+  def test_parse_shard(self, shard, expected):
+     assert parse_shard(shard) == expected
+
+  @pytest.mark.parametrize("shard", ["0/8", "9/8", "3/", "c-a", "a-", "aa", "", 3])
+  def test_parse_shard_raises_value_error(self, shard):
+     with pytest.raises(ValueError):
+        parse_shard(shard)
+
+  @pytest.mark.parametrize("shard_count", [1, 3, 8, 26, 30])
+  def test_shards_cover_every_letter_once(self, shard_count):
+     shards = plan_shards(shard_count)
+     assert sorted(letter for letters in shards for letter in letters) == list(alphabet)
+     assert max(len(letters) for letters in shards) - min(len(letters) for letters in shards) <= 1
+
+  def test_shards_are_balanced_by_letter_record_counts(self):
+     letter_record_counts = {letter: 10 for letter in alphabet}
+     letter_record_counts.update({"s": 300, "c": 200, "b": 100})
+     shards = plan_shards(4, letter_record_counts)
+     shard_record_counts = [sum(letter_record_counts[letter] for letter in letters) for letters in shards]
+     assert sorted(letter for letters in shards for letter in letters) == list(alphabet)
+     assert ["s"] in shards
+     assert max(shard_record_counts) == 300
+
+  def test_shards_are_planned_the_same_way_by_every_invocation(self):
+     letter_record_counts = {"a": 50, "m": 40, "z": 0}
+     assert [get_shard_letters(f"{i}/5", letter_record_counts) for i in range(1, 6)] == plan_shards(5, dict(letter_record_counts))
+
+  @pytest.mark.parametrize("shard, expected", [(None, True), ("1/4", True), ("2/4", False), ("a-f", True), ("g-z", False)])
+  def test_is_first_shard(self, shard, expected):
+     assert is_first_shard(shard) == expected
@@ -0,0 +1,135 @@
+import os
+import pytest
+from copy import deepcopy
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from modules.utils.response_cache import NOT_MODIFIED_MESSAGE
+from modules.batch_uploader import get_upload_config
+from modules.utils.validator import SSMValueDictValidator
+from modules.utils.sinks import RecordSink, get_sinks
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from test_sample_records.sample_api_records import sample_api_response_dicts
+
+APP = "fruit-project-api-scraper"
+TARGET_API_1 = "fruity-vice"
+TARGET_API_2 = "the-cocktail-db"
+
+class ListSink(RecordSink):
+  def __init__(self, upload_config, ssm_value_dict, export_name):
+    super().__init__(upload_config, ssm_value_dict, export_name)
+    self.records = {}
+
+  def write_unit(self, unit, api_records):
+    self.records[unit] = api_records
+    return len(api_records)
+
+@pytest.fixture
+def target_api_1_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_1])
+
+def get_fruit(name, family="Rosaceae"):
+   return {"id": 1, "name": name, "family": family, "genus": "Fragaria", "order": "Rosales"}
+
+class LetterScraper:
+  """
+  Responds with the records in responses for each letter, or as not modified if a letter has no entry
+  """
+  def __init__(self, responses):
+    self.responses = responses
+
+  def get_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
+    letter = ssm_value_dict["source_api_endpoint"][-1]
+    if letter not in self.responses:
+      raise ValueError(NOT_MODIFIED_MESSAGE)
+    return {"drinks": deepcopy(self.responses[letter])}
+
+  def get_unchanged_response(self, ssm_value_dict):
+    return {"hash_keys": [], "record_count": 1}
+
+  def save_cached_response(self, ssm_value_dict, hash_keys, record_count):
+    pass
+
+def scrape_letters_to_sinks(scraper, ssm_value_dict):
+   orchestrator = Orchestrator(APP, TARGET_API_2)
+   orchestrator.sinks = get_sinks(get_upload_config(ssm_value_dict), ssm_value_dict, TARGET_API_2)
+   for letter in scraper.responses.keys() | {"a", "b", "c"}:
+      letter_ssm_value_dict = dict(ssm_value_dict, source_api_endpoint=f'{ssm_value_dict["source_api_endpoint"]}?f={letter}')
+      orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, letter_ssm_value_dict, letter)
+   orchestrator.close_sinks()
+
+def upload_to_sinks(api_records, ssm_value_dict, sinks, unit="a"):
+   record_manager = RecordManager(api_records, ssm_value_dict, checkpoint_unit=unit, sinks=sinks)
+   for _ in record_manager.get_record_batches_for_upload():
+      pass
+   record_manager.finish_upload(0)
+   return record_manager
+
+class TestSinks:
+
+  @pytest.mark.parametrize("upload_config", [{"sinks": ["csv"]}, {"sinks": "parquet"}, {"sinks": ["parquet"]}])
+  def test_invalid_sinks_raise_value_error(self, target_api_1_ssm_value_dict, upload_config):
+     target_api_1_ssm_value_dict["upload_config"] = upload_config
+     with pytest.raises(ValueError):
+        SSMValueDictValidator(TARGET_API_1, target_api_1_ssm_value_dict).execute()
+
+  def test_no_sinks_by_default(self, target_api_1_ssm_value_dict):
+     assert get_sinks(get_upload_config(target_api_1_ssm_value_dict), target_api_1_ssm_value_dict, TARGET_API_1) == []
+
+  def test_sinks_are_given_the_last_record_for_each_hash_key_in_each_letter(self, target_api_1_ssm_value_dict):
+     sink = ListSink(get_upload_config(target_api_1_ssm_value_dict), target_api_1_ssm_value_dict, TARGET_API_1)
+     upload_to_sinks([get_fruit("Strawberry"), get_fruit("Apple"), get_fruit("Strawberry", "Fragaria")], target_api_1_ssm_value_dict, [sink], "a")
+     upload_to_sinks([get_fruit("Strawberry")], target_api_1_ssm_value_dict, [sink], "s")
+     assert sink.close() == 3
+     assert [api_record["family1"] for api_record in sink.records["a"]] == ["Fragaria", "Rosaceae"]
+     assert [api_record["name"] for api_record in sink.records["s"]] == ["Strawberry"]
+
+  def test_parquet_sink_writes_records_in_a_file_for_each_letter(self, tmp_path):
+     pq = pytest.importorskip("pyarrow.parquet")
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+     ssm_value_dict["upload_config"] = {"sinks": ["parquet"], "parquet_path": str(tmp_path / "exports")}
+     sinks = get_sinks(get_upload_config(ssm_value_dict), ssm_value_dict, TARGET_API_2)
+     api_records = deepcopy(sample_api_response_dicts[TARGET_API_2]["drinks"])
+     upload_to_sinks(api_records, ssm_value_dict, sinks, "m")
+
+     assert sinks[0].close() == len(api_records)
+     assert os.listdir(tmp_path / "exports" / TARGET_API_2) == ["m.parquet"]
+     table = pq.read_table(tmp_path / "exports" / TARGET_API_2)
+     assert sorted(table.column("id").to_pylist()) == sorted(api_record["idDrink"] for api_record in api_records)
+     assert "ingredients" in table.column_names and "content_hash" not in table.column_names
+     assert table.column("ingredients").to_pylist()[0][0] == {"ingredient": api_records[0]["strIngredient1"], "measure": api_records[0]["strMeasure1"]}
+
+  def test_parquet_letters_with_different_nulls_and_ingredients_are_read_as_one_dataset(self, tmp_path):
+     pq = pytest.importorskip("pyarrow.parquet")
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+     ssm_value_dict["upload_config"] = {"sinks": ["parquet"], "parquet_path": str(tmp_path / "exports")}
+     sinks = get_sinks(get_upload_config(ssm_value_dict), ssm_value_dict, TARGET_API_2)
+     drink_a, drink_b = deepcopy(sample_api_response_dicts[TARGET_API_2]["drinks"])
+     for x in range(1, 16):
+        drink_a[f"strIngredient{x}"], drink_a[f"strMeasure{x}"] = (f"Ingredient {x}", None) if x <= 12 else (None, None)
+     drink_a["strImageAttribution"] = None
+     drink_b["strImageAttribution"] = "Attribution"
+     drink_b["idDrink"] = 11000
+     upload_to_sinks([drink_a], ssm_value_dict, sinks, "a")
+     upload_to_sinks([drink_b], ssm_value_dict, sinks, "b")
+
+     table = pq.read_table(tmp_path / "exports" / TARGET_API_2).sort_by("name")
+     records = {api_record["name"]: api_record for api_record in table.to_pylist()}
+     assert table.num_rows == 2 and "content_hash" not in table.column_names
+     assert len(records[drink_a["strDrink"]]["ingredients"]) == 12 and records[drink_a["strDrink"]]["image_attribution"] is None
+     assert records[drink_b["strDrink"]]["image_attribution"] == "Attribution" and records[drink_b["strDrink"]]["id"] == "11000"
+
+  def test_parquet_export_keeps_letters_which_have_not_changed(self, tmp_path, monkeypatch):
+     pq = pytest.importorskip("pyarrow.parquet")
+     ssm_value_dict = deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+     ssm_value_dict["upload_config"] = {"sinks": ["parquet"], "parquet_path": str(tmp_path / "exports")}
+     drink_a, drink_b = sample_api_response_dicts[TARGET_API_2]["drinks"]
+     drink_c = dict(drink_b, strDrink="Caipirinha")
+     monkeypatch.setattr(RecordManager, "upload_batches_to_dynamo_db", lambda record_manager, record_batches: {"batch_count": len(list(record_batches))})
+
+     scrape_letters_to_sinks(LetterScraper({"a": [drink_a], "b": [drink_b], "c": [drink_c]}), ssm_value_dict)
+     scrape_letters_to_sinks(LetterScraper({"b": [dict(drink_b, strGlass="Tumbler")], "c": []}), ssm_value_dict)
+
+     assert sorted(os.listdir(tmp_path / "exports" / TARGET_API_2)) == ["a.parquet", "b.parquet"]
+     table = pq.read_table(tmp_path / "exports" / TARGET_API_2)
+     assert sorted(zip(table.column("name").to_pylist(), table.column("glass").to_pylist())) == sorted([
+       (drink_a["strDrink"], drink_a["strGlass"]), (drink_b["strDrink"], "Tumbler")])
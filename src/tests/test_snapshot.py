@@ -0,0 +1,95 @@
+import os
+import pytest
+from copy import deepcopy
+
+from modules.orchestrator import Orchestrator
+from modules.record_manager import RecordManager
+from modules.utils.scraping_rules import get_scraping_rule
+from modules.utils.snapshot import get_snapshot_path, iter_records_writing_snapshot, iter_snapshot_records, validate_snapshot_mode, write_snapshot
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+from test_sample_records.sample_api_records import sample_api_response_dicts
+
+APP = "fruit-project-api-scraper"
+TARGET_API_2 = "the-cocktail-db"
+
+@pytest.fixture
+def target_api_2_ssm_value_dict():
+    return deepcopy(sample_ssm_value_dicts[TARGET_API_2])
+
+@pytest.fixture
+def uploaded_records(monkeypatch):
+   uploaded_records = []
+
+   def mock_execute(record_manager):
+      api_records = list(record_manager.api_records)
+      uploaded_records.extend(api_records)
+      record_manager.record_count = len(api_records)
+
+   monkeypatch.setattr(RecordManager, "execute", mock_execute)
+   return uploaded_records
+
+class MockScraper:
+   def __init__(self, api_response):
+      self.api_response = api_response
+      self.request_count = 0
+
+   def get_api_records_from_endpoint(self, ssm_value_dict, metrics=None):
+      self.request_count += 1
+      return deepcopy(self.api_response)
+
+   def save_cached_response(self, ssm_value_dict, hash_keys, record_count):
+      pass
+
+class TestSnapshot:
+
+  @pytest.mark.parametrize("snapshot_mode", ["replays", ""])
+  def test_invalid_snapshot_mode_raises_value_error(self, snapshot_mode):
+     with pytest.raises(ValueError):
+        validate_snapshot_mode(snapshot_mode)
+     with pytest.raises(ValueError):
+        Orchestrator(APP, TARGET_API_2, snapshot_mode=snapshot_mode)
+
+  def test_snapshot_path_is_made_for_each_source_api_and_unit(self, tmp_path):
+     assert get_snapshot_path(str(tmp_path), TARGET_API_2, "a") == os.path.join(str(tmp_path), TARGET_API_2, "a.jsonl.gz")
+     assert get_snapshot_path(str(tmp_path), TARGET_API_2, "page-1/2") == os.path.join(str(tmp_path), TARGET_API_2, "page-1%2F2.jsonl.gz")
+
+  def test_records_are_read_back_as_they_were_written(self, tmp_path):
+     api_records = sample_api_response_dicts[TARGET_API_2]["drinks"]
+     snapshot_path = get_snapshot_path(str(tmp_path), TARGET_API_2, "a")
+     assert write_snapshot(api_records, snapshot_path) == len(api_records)
+     assert list(iter_snapshot_records(snapshot_path)) == api_records
+
+  def test_snapshot_is_not_written_until_every_record_has_been_read(self, tmp_path):
+     snapshot_path = get_snapshot_path(str(tmp_path), TARGET_API_2, "a")
+     api_records = iter_records_writing_snapshot(({"strDrink": str(i)} for i in range(3)), snapshot_path)
+     next(api_records)
+     api_records.close()
+     assert os.listdir(os.path.dirname(snapshot_path)) == []
+
+  def test_missing_snapshot_raises_file_not_found_error(self, tmp_path):
+     with pytest.raises(FileNotFoundError):
+        list(iter_snapshot_records(get_snapshot_path(str(tmp_path), TARGET_API_2, "a")))
+
+  def test_recorded_letter_is_replayed_without_the_source_api(self, tmp_path, target_api_2_ssm_value_dict, uploaded_records):
+     api_response = sample_api_response_dicts[TARGET_API_2]
+     scraper = MockScraper(api_response)
+     Orchestrator(APP, TARGET_API_2, snapshot_mode="record", snapshot_dir=str(tmp_path)).scrape_and_upload_records_to_dynamo_db(scraper, target_api_2_ssm_value_dict, "a")
+     assert os.path.exists(get_snapshot_path(str(tmp_path), TARGET_API_2, "a"))
+
+     orchestrator = Orchestrator(APP, TARGET_API_2, snapshot_mode="replay", snapshot_dir=str(tmp_path))
+     assert orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_2_ssm_value_dict, "a") == len(api_response["drinks"])
+     assert scraper.request_count == 1
+     assert uploaded_records == api_response["drinks"] * 2
+
+  def test_recorded_letter_with_no_records_is_replayed_as_empty(self, tmp_path, target_api_2_ssm_value_dict, uploaded_records):
+     scraper = MockScraper({"drinks": None})
+     Orchestrator(APP, TARGET_API_2, snapshot_mode="record", snapshot_dir=str(tmp_path)).scrape_and_upload_records_to_dynamo_db(scraper, target_api_2_ssm_value_dict, "x")
+     orchestrator = Orchestrator(APP, TARGET_API_2, snapshot_mode="replay", snapshot_dir=str(tmp_path))
+     assert orchestrator.scrape_and_upload_records_to_dynamo_db(scraper, target_api_2_ssm_value_dict, "x") == 0
+     assert uploaded_records == []
+
+  def test_cursor_scraping_rule_can_not_be_replayed(self, target_api_2_ssm_value_dict):
+     orchestrator = Orchestrator(APP, TARGET_API_2, snapshot_mode="replay")
+     scraping_rule = get_scraping_rule({"type": "cursor", "query": "?cursor=", "cursor_key": "next_cursor"}, target_api_2_ssm_value_dict)
+     with pytest.raises(ValueError, match="can't be replayed"):
+        list(orchestrator.get_units_to_scrape(scraping_rule))
@@ -0,0 +1,151 @@
+import json
+import pytest
+import botocore.session
+from moto import mock_aws
+
+from modules.scraper import Scraper
+from modules.utils.aws_clients import reset_aws_clients
+from modules.utils.ssm_config_cache import SSMConfigCache, GET_PARAMETERS_MAX_NAMES, get_ssm_config_cache
+from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
+
+APP = "fruit-project-api-scraper"
+REGION = "eu-west-2"
+TARGET_API_1 = "fruity-vice"
+TARGET_API_2 = "the-cocktail-db"
+TARGET_API_1_SSM_PARAM = f"{APP}--{TARGET_API_1}-config"
+TARGET_API_2_SSM_PARAM = f"{APP}--{TARGET_API_2}-config"
+
+
+class Clock:
+   def __init__(self):
+      self.now = 0
+
+   def __call__(self):
+      return self.now
+
+
+class CountingSSMClient:
+   """
+   Serves parameters from a dict and counts calls
+   """
+   def __init__(self, parameters):
+      self.parameters = parameters
+      self.calls = []
+
+   def get_parameter(self, Name, WithDecryption):
+      self.calls.append(("get_parameter", Name))
+      return {"Parameter": self.parameters[Name]}
+
+   def get_parameters(self, Names, WithDecryption):
+      self.calls.append(("get_parameters", tuple(Names)))
+      return {"Parameters": [self.parameters[name] for name in Names if name in self.parameters],
+              "InvalidParameters": [name for name in Names if name not in self.parameters]}
+
+
+def get_parameter(name, value, version=1):
+   return {"Name": name, "Value": json.dumps(value), "Version": version}
+
+@pytest.fixture
+def ssm_client():
+   return CountingSSMClient({TARGET_API_1_SSM_PARAM: get_parameter(TARGET_API_1_SSM_PARAM, sample_ssm_value_dicts[TARGET_API_1]),
+                             TARGET_API_2_SSM_PARAM: get_parameter(TARGET_API_2_SSM_PARAM, sample_ssm_value_dicts[TARGET_API_2])})
+
+@pytest.fixture
+def clock():
+   return Clock()
+
+@pytest.fixture
+def aws_clients(monkeypatch):
+   monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+   reset_aws_clients()
+   yield
+   reset_aws_clients()
+
+class TestSSMConfigCache:
+  def test_get_fetches_once_within_ttl(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     first = cache.get(ssm_client, TARGET_API_1_SSM_PARAM, ttl=300)
+     clock.now = 299
+     second = cache.get(ssm_client, TARGET_API_1_SSM_PARAM, ttl=300)
+     assert first == second == sample_ssm_value_dicts[TARGET_API_1]
+     assert ssm_client.calls == [("get_parameter", TARGET_API_1_SSM_PARAM)]
+
+  def test_get_fetches_again_after_ttl(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM, ttl=300)
+     clock.now = 300
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM, ttl=300)
+     assert len(ssm_client.calls) == 2
+
+  def test_ttl_0_always_fetches(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM, ttl=0)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM, ttl=0)
+     assert cache.prefetch(ssm_client, [TARGET_API_2_SSM_PARAM], ttl=0) == []
+     assert len(ssm_client.calls) == 2
+
+  def test_get_fetches_again_for_newer_min_version(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM, min_version=1)
+     assert len(ssm_client.calls) == 1
+     ssm_client.parameters[TARGET_API_1_SSM_PARAM] = get_parameter(TARGET_API_1_SSM_PARAM, dict(sample_ssm_value_dicts[TARGET_API_1], source_api_endpoint="https://example.com"), 2)
+     ssm_value_dict = cache.get(ssm_client, TARGET_API_1_SSM_PARAM, min_version=2)
+     assert ssm_value_dict["source_api_endpoint"] == "https://example.com"
+     assert len(ssm_client.calls) == 2
+
+  def test_invalidate(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM)
+     cache.invalidate(TARGET_API_1_SSM_PARAM)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM)
+     assert len(ssm_client.calls) == 2
+
+  def test_get_returns_a_copy(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM)["field_mapping"].clear()
+     assert cache.get(ssm_client, TARGET_API_1_SSM_PARAM) == sample_ssm_value_dicts[TARGET_API_1]
+
+  def test_prefetch_uses_one_get_parameters_call(self, ssm_client, clock):
+     cache = SSMConfigCache(clock)
+     missing_ssm_param = f"{APP}--the-meal-db-config"
+     fetched = cache.prefetch(ssm_client, [TARGET_API_1_SSM_PARAM, TARGET_API_2_SSM_PARAM, missing_ssm_param])
+     assert fetched == [TARGET_API_1_SSM_PARAM, TARGET_API_2_SSM_PARAM, missing_ssm_param]
+     cache.get(ssm_client, TARGET_API_1_SSM_PARAM)
+     cache.get(ssm_client, TARGET_API_2_SSM_PARAM)
+     assert ssm_client.calls == [("get_parameters", (TARGET_API_1_SSM_PARAM, TARGET_API_2_SSM_PARAM, missing_ssm_param))]
+     assert cache.prefetch(ssm_client, [TARGET_API_1_SSM_PARAM, TARGET_API_2_SSM_PARAM]) == []
+
+  def test_prefetch_splits_names_into_get_parameters_calls(self, clock):
+     names = [f"{APP}--api-{i}-config" for i in range(GET_PARAMETERS_MAX_NAMES + 1)]
+     ssm_client = CountingSSMClient({name: get_parameter(name, {}) for name in names})
+     SSMConfigCache(clock).prefetch(ssm_client, names)
+     assert [len(names) for _, names in ssm_client.calls] == [GET_PARAMETERS_MAX_NAMES, 1]
+
+  def test_invalid_json_only_raises_on_get(self, ssm_client, clock):
+     ssm_client.parameters[TARGET_API_2_SSM_PARAM]["Value"] = "{not json"
+     cache = SSMConfigCache(clock)
+     cache.prefetch(ssm_client, [TARGET_API_1_SSM_PARAM, TARGET_API_2_SSM_PARAM])
+     assert cache.get(ssm_client, TARGET_API_1_SSM_PARAM) == sample_ssm_value_dicts[TARGET_API_1]
+     with pytest.raises(ValueError):
+        cache.get(ssm_client, TARGET_API_2_SSM_PARAM)
+
+  @pytest.mark.parametrize("ttl", [-1, "300", True])
+  def test_invalid_ttl_raises_value_error(self, ttl):
+     with pytest.raises(ValueError):
+        Scraper(APP, TARGET_API_1, config_cache_ttl=ttl)
+
+  @mock_aws
+  def test_scrapers_share_cached_ssm_value_dicts(self, aws_clients):
+     client = botocore.session.get_session().create_client("ssm", region_name=REGION)
+     for ssm_param, target_api in [(TARGET_API_1_SSM_PARAM, TARGET_API_1), (TARGET_API_2_SSM_PARAM, TARGET_API_2)]:
+        client.put_parameter(Name=ssm_param, Value=json.dumps(sample_ssm_value_dicts[target_api]), Type="String")
+
+     Scraper(APP, TARGET_API_1).prefetch_ssm_value_dicts([TARGET_API_1, TARGET_API_2, "the-meal-db"])
+     client.delete_parameter(Name=TARGET_API_2_SSM_PARAM)
+     ssm_value_dict = Scraper(APP, TARGET_API_2).get_validated_ssm_value_dict()
+     assert ssm_value_dict == sample_ssm_value_dicts[TARGET_API_2]
+     assert get_ssm_config_cache().get_fresh_entry(TARGET_API_2_SSM_PARAM, 300)["version"] == 1
+
+     with pytest.raises(ValueError):
+        Scraper(APP, "the-meal-db").get_ssm_value_dict(client, f"{APP}--the-meal-db-config")
@@ -5,7 +5,7 @@ from datetime import datetime
 
 from test_sample_records.sample_api_records import sample_api_response_dicts
 from test_sample_records.sample_ssm_records import sample_ssm_value_dicts
-from modules.utils.validator import SSMValueDictValidator, validate_timestamp, validate_api_records_exist, validate_api_record_keys
+from modules.utils.validator import SSMValueDictValidator, APIRecordValidator, validate_timestamp, validate_api_records_exist, validate_api_record_keys
 
 TARGET_API_1 = "fruity-vice"
 TARGET_API_2 = "the-cocktail-db"
@@ -83,6 +83,26 @@ class TestUtils:
      with pytest.raises(KeyError):
         ssm_value_dict_validator.validate_ssm_value_dict_types(target_api_1_ssm_value_dict)
 
+  @pytest.mark.parametrize("http_config", [{"rate_limit_burst": 0}, {"rate_limit_increase": "1"}, {"rate_limit_decrease_factor": 1},
+                                           {"rate_limit_initial_rate": 30}, {"rate_limit_min_rate": 10}])
+  def test_validate_ssm_value_dict_rate_limit_raises_value_error(self, ssm_value_dict_validator, target_api_1_ssm_value_dict, http_config):
+     target_api_1_ssm_value_dict["http_config"] = http_config
+     with pytest.raises(ValueError):
+        ssm_value_dict_validator.validate_ssm_value_dict_rate_limit(target_api_1_ssm_value_dict)
+
+  @pytest.mark.parametrize("upload_config", [{"write_capacity_units": -1}, {"write_capacity_units": "10"}, {"write_capacity_utilisation": 0},
+                                             {"write_capacity_utilisation": 1.5}])
+  def test_validate_ssm_value_dict_write_capacity_raises_value_error(self, ssm_value_dict_validator, target_api_1_ssm_value_dict, upload_config):
+     target_api_1_ssm_value_dict["upload_config"] = upload_config
+     with pytest.raises(ValueError):
+        ssm_value_dict_validator.validate_ssm_value_dict_write_capacity(target_api_1_ssm_value_dict)
+
+  @pytest.mark.parametrize("letter_record_counts", [{"ab": 1}, {"a": -1}, {"a": "1"}, {"A": 1}])
+  def test_validate_ssm_value_dict_letter_record_counts_raises_value_error(self, ssm_value_dict_validator, target_api_1_ssm_value_dict, letter_record_counts):
+     target_api_1_ssm_value_dict["letter_record_counts"] = letter_record_counts
+     with pytest.raises(ValueError):
+        ssm_value_dict_validator.validate_ssm_value_dict_letter_record_counts(target_api_1_ssm_value_dict)
+
   def test_validate_timestamp(self):
      try:
         timestamp = str(datetime.now(pytz.timezone('Europe/London')))
@@ -124,4 +144,13 @@ class TestUtils:
      target_api_1_records[0].pop('nutritions')
      with pytest.raises(ValueError):
          target_api_1_field_mapping["extra_field"] = 'x'
-         validate_api_record_keys(target_api_1_records, target_api_1_field_mapping)
\ No newline at end of file
+         validate_api_record_keys(target_api_1_records, target_api_1_field_mapping)
+
+  def test_api_record_validator_only_works_out_each_key_set_once(self, target_api_1_ssm_value_dict, target_api_1_records):
+     api_record_validator = APIRecordValidator(target_api_1_ssm_value_dict["field_mapping"], "name")
+     api_records = target_api_1_records * 50 + [{"name": "Kiwi"}, dict(target_api_1_records[0], name=3.5), dict(target_api_1_records[0], name=True)]
+     valid_records = list(api_record_validator.iter_valid_records(api_records))
+     assert len(valid_records) == 101 and len(api_record_validator.valid_shapes) == 2
+     assert api_record_validator.get_report()["invalid_record_count"] == 2
+     assert api_record_validator.invalid_hash_keys == {"Kiwi"}
+
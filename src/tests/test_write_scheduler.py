@@ -0,0 +1,121 @@
+import boto3
+import pytest
+import botocore.exceptions
+from moto import mock_aws
+
+from modules.batch_uploader import BatchUploader, DEFAULT_UPLOAD_CONFIG
+from modules.utils.aws_clients import reset_aws_clients
+from modules.utils.write_scheduler import WriteScheduler, get_write_scheduler
+
+REGION = "eu-west-2"
+TARGET_DYNAMO_DB_TABLE_NAME = "fruit"
+FAST_UPLOAD_CONFIG = dict(DEFAULT_UPLOAD_CONFIG, backoff_base=0, backoff_max=0)
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.now += seconds
+
+@pytest.fixture
+def clock():
+   return FakeClock()
+
+def get_write_scheduler_for_test(clock, write_capacity_units, max_in_flight=4):
+   write_scheduler_config = {"max_in_flight": max_in_flight, "write_capacity_units": write_capacity_units, "write_capacity_utilisation": 1}
+   return WriteScheduler(write_scheduler_config, write_capacity_units, clock=clock, sleep=clock.sleep)
+
+def get_put_batch_items(names):
+   return [{"PutRequest": {"Item": {"name": name}}} for name in names]
+
+class TestWriteScheduler:
+
+  def test_requests_are_paced_to_the_write_capacity(self, clock):
+     write_scheduler = get_write_scheduler_for_test(clock, 50)
+     for _ in range(4):
+        sent_at, estimated_units = write_scheduler.acquire(25)
+        write_scheduler.record_response(sent_at, estimated_units, 25, 25.0, False)
+     assert clock.now == 1.0
+
+  def test_capacity_per_item_is_learnt_from_consumed_capacity(self, clock):
+     write_scheduler = get_write_scheduler_for_test(clock, 100)
+     for _ in range(20):
+        sent_at, estimated_units = write_scheduler.acquire(25)
+        write_scheduler.record_response(sent_at, estimated_units, 25, 50.0, False)
+     assert write_scheduler.units_per_item == pytest.approx(2, rel=0.05)
+
+  def test_throttling_halves_requests_in_flight_once_for_requests_sent_together(self, clock):
+     write_scheduler = get_write_scheduler_for_test(clock, 0, max_in_flight=4)
+     sent = [write_scheduler.acquire(25) for _ in range(4)]
+     clock.now += 1
+     cuts = [write_scheduler.record_response(sent_at, estimated_units, 25, 0, True) for sent_at, estimated_units in sent]
+     assert cuts == [True, False, False, False]
+     assert write_scheduler.in_flight_limit == 2 and write_scheduler.in_flight == 0 and write_scheduler.capacity_rate is None
+
+  def test_requests_in_flight_and_capacity_rate_recover_after_throttling(self, clock):
+     write_scheduler = get_write_scheduler_for_test(clock, 100, max_in_flight=4)
+     sent_at, estimated_units = write_scheduler.acquire(25)
+     write_scheduler.record_response(sent_at, estimated_units, 25, 25.0, True)
+     assert write_scheduler.in_flight_limit == 2 and write_scheduler.capacity_rate == 50
+     for _ in range(5):
+        sent_at, estimated_units = write_scheduler.acquire(25)
+        write_scheduler.record_response(sent_at, estimated_units, 25, 25.0, False)
+     assert write_scheduler.in_flight_limit == 4 and write_scheduler.capacity_rate == 70
+
+  def test_throttled_requests_are_sent_again(self):
+     responses = []
+
+     def upload_batch(batch_items):
+        responses.append(batch_items)
+        if len(responses) == 1:
+           raise botocore.exceptions.ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "Throttled"}}, "BatchWriteItem")
+        return {"ConsumedCapacity": [{"TableName": TARGET_DYNAMO_DB_TABLE_NAME, "CapacityUnits": 2.0}]}
+
+     write_scheduler = WriteScheduler({"max_in_flight": 4, "write_capacity_units": 0, "write_capacity_utilisation": 1}, 0)
+     batch_uploader = BatchUploader(upload_batch, TARGET_DYNAMO_DB_TABLE_NAME, FAST_UPLOAD_CONFIG, write_scheduler)
+     summary = batch_uploader.execute([[get_put_batch_items(["Persimmon", "Strawberry"])]])
+     assert summary["throttle_count"] == 1 and summary["retry_count"] == 1 and summary["batch_count"] == 1
+     assert write_scheduler.in_flight_limit == 2 and write_scheduler.in_flight == 0
+
+  def test_other_client_errors_are_raised(self):
+     def upload_batch(batch_items):
+        raise botocore.exceptions.ClientError({"Error": {"Code": "ValidationException", "Message": "Invalid"}}, "BatchWriteItem")
+
+     write_scheduler = WriteScheduler({"max_in_flight": 4, "write_capacity_units": 0, "write_capacity_utilisation": 1}, 0)
+     with pytest.raises(botocore.exceptions.ClientError):
+        BatchUploader(upload_batch, TARGET_DYNAMO_DB_TABLE_NAME, FAST_UPLOAD_CONFIG, write_scheduler).execute([[get_put_batch_items(["Persimmon"])]])
+     assert write_scheduler.in_flight == 0
+
+  def test_connection_errors_give_back_their_slot(self):
+     def upload_batch(batch_items):
+        raise botocore.exceptions.EndpointConnectionError(endpoint_url="https://dynamodb.eu-west-2.amazonaws.com")
+
+     write_scheduler = WriteScheduler({"max_in_flight": 2, "write_capacity_units": 0, "write_capacity_utilisation": 1}, 0)
+     for _ in range(3):
+        with pytest.raises(botocore.exceptions.EndpointConnectionError):
+           BatchUploader(upload_batch, TARGET_DYNAMO_DB_TABLE_NAME, FAST_UPLOAD_CONFIG, write_scheduler).execute([[get_put_batch_items(["Persimmon"])]])
+     assert write_scheduler.in_flight == 0
+
+  @pytest.mark.parametrize("billing_mode, expected_capacity_rate", [("PROVISIONED", 9.0), ("PAY_PER_REQUEST", None)])
+  def test_get_write_scheduler_reads_provisioned_capacity(self, monkeypatch, billing_mode, expected_capacity_rate):
+     monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+     with mock_aws():
+        reset_aws_clients()
+        dynamo_db_resource = boto3.resource("dynamodb", region_name=REGION)
+        create_table_kwargs = {"TableName": TARGET_DYNAMO_DB_TABLE_NAME,
+                               "KeySchema": [{"AttributeName": "name", "KeyType": "HASH"}],
+                               "AttributeDefinitions": [{"AttributeName": "name", "AttributeType": "S"}],
+                               "BillingMode": billing_mode}
+        if billing_mode == "PROVISIONED":
+           create_table_kwargs["ProvisionedThroughput"] = {"ReadCapacityUnits": 5, "WriteCapacityUnits": 10}
+        dynamo_db_resource.create_table(**create_table_kwargs)
+        upload_config = dict(DEFAULT_UPLOAD_CONFIG, adaptive_writes=True)
+        write_scheduler = get_write_scheduler(dynamo_db_resource, TARGET_DYNAMO_DB_TABLE_NAME, upload_config)
+        assert write_scheduler.capacity_rate == expected_capacity_rate
+        assert get_write_scheduler(dynamo_db_resource, TARGET_DYNAMO_DB_TABLE_NAME, upload_config) is write_scheduler
+        assert get_write_scheduler(dynamo_db_resource, TARGET_DYNAMO_DB_TABLE_NAME, DEFAULT_UPLOAD_CONFIG) is None
+        reset_aws_clients()